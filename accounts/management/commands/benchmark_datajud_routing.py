@@ -0,0 +1,124 @@
+import logging
+import random
+from collections import defaultdict
+from unittest.mock import patch
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from accounts.services import datajud
+from accounts.services.datajud import DataJudService, TRIBUNAL_ROUTES
+
+
+# Mapa anterior, que considerava apenas o TR e sempre apontava para um TJ
+LEGACY_TRIBUNAL_MAPPING = {
+    "01": "tjac", "02": "tjal", "03": "tjam", "04": "tjap",
+    "05": "tjba", "06": "tjce", "07": "tjdft", "08": "tjes",
+    "09": "tjgo", "10": "tjma", "11": "tjmt", "12": "tjms",
+    "13": "tjmg", "14": "tjpa", "15": "tjpb", "16": "tjpe",
+    "17": "tjpi", "18": "tjpr", "19": "tjrj", "20": "tjrn",
+    "21": "tjro", "22": "tjrr", "23": "tjrs", "24": "tjsc",
+    "25": "tjsp", "26": "tjse", "27": "tjto"
+}
+LEGACY_FALLBACK = ['tjsp', 'tjrj', 'tjmg', 'tjrs', 'tjpr', 'tjsc', 'tjba', 'tjce', 'tjpe', 'tjgo']
+
+SEGMENTS = {
+    '3': 'Superior Tribunal de Justiça',
+    '4': 'Justiça Federal',
+    '5': 'Justiça do Trabalho',
+    '6': 'Justiça Eleitoral',
+    '7': 'Justiça Militar da União',
+    '8': 'Justiça Estadual',
+    '9': 'Justiça Militar Estadual',
+}
+
+# Distribuição aproximada das buscas por segmento de justiça
+DEFAULT_MIX = {'8': 70, '5': 15, '4': 10, '6': 2, '3': 1, '7': 1, '9': 1}
+
+
+class Command(BaseCommand):
+    help = 'Compara o número de chamadas ao DataJud por busca entre o roteamento antigo e o atual'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=1000, help='Quantidade de números de processo gerados')
+        parser.add_argument('--seed', type=int, default=42, help='Semente do gerador aleatório')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        routes_by_segment = defaultdict(list)
+        for (segment, tribunal_code), tribunal in TRIBUNAL_ROUTES.items():
+            routes_by_segment[segment].append((tribunal_code, tribunal))
+
+        segments = list(DEFAULT_MIX)
+        weights = [DEFAULT_MIX[segment] for segment in segments]
+        samples = []
+        for index in range(options['samples']):
+            segment = rng.choices(segments, weights)[0]
+            tribunal_code, tribunal = rng.choice(routes_by_segment[segment])
+            number = f"{index:07d}-{rng.randint(0, 99):02d}.2023.{segment}.{tribunal_code}.{rng.randint(0, 9999):04d}"
+            samples.append((segment, number, tribunal))
+
+        legacy = defaultdict(lambda: [0, 0, 0])
+        current = defaultdict(lambda: [0, 0, 0])
+
+        for segment, number, tribunal in samples:
+            calls, found = self._legacy_lookup(number, tribunal)
+            self._add(legacy[segment], calls, found)
+
+        service = DataJudService()
+        # Os logs por busca do serviço poluiriam o relatório
+        logging.disable(logging.ERROR)
+        try:
+            for segment, number, tribunal in samples:
+                calls, found = self._current_lookup(service, number, tribunal)
+                self._add(current[segment], calls, found)
+        finally:
+            logging.disable(logging.NOTSET)
+
+        self.stdout.write(f"{'Segmento':<28}{'Buscas':>8}{'Antes (chamadas)':>18}{'Depois (chamadas)':>19}{'Antes (achados)':>17}{'Depois (achados)':>18}")
+        totals = [[0, 0, 0], [0, 0, 0]]
+        for segment in sorted(legacy):
+            before, after = legacy[segment], current[segment]
+            self.stdout.write(self._row(SEGMENTS[segment], before, after))
+            for total, stats in zip(totals, (before, after)):
+                for position in range(3):
+                    total[position] += stats[position]
+        self.stdout.write(self._row('Total', *totals))
+
+    def _legacy_lookup(self, number, tribunal):
+        digits = ''.join(char for char in number if char.isdigit())
+        primary = LEGACY_TRIBUNAL_MAPPING.get(digits[14:16], 'tjsp')
+        if primary == tribunal:
+            return 1, True
+        if tribunal in LEGACY_FALLBACK:
+            return 2 + LEGACY_FALLBACK.index(tribunal), True
+        return 1 + len(LEGACY_FALLBACK), False
+
+    def _current_lookup(self, service, number, tribunal):
+        calls = []
+
+        def search(code, data, deadline=None):
+            calls.append(code)
+            return {'numeroProcesso': number} if code == tribunal else None
+
+        # Cache isolado para que o benchmark não use nem polua o cache da aplicação
+        with patch.object(datajud, 'cache', LocMemCache('datajud-benchmark', {})), \
+                patch.object(service, '_search_in_tribunal', side_effect=search):
+            try:
+                service.search_process_by_number(number)
+                found = True
+            except Exception:
+                found = False
+        return len(calls), found
+
+    def _add(self, stats, calls, found):
+        stats[0] += 1
+        stats[1] += calls
+        stats[2] += int(found)
+
+    def _row(self, label, before, after):
+        count = before[0] or 1
+        return (
+            f"{label:<28}{before[0]:>8}{before[1] / count:>18.2f}{after[1] / count:>19.2f}"
+            f"{before[2] / count:>16.0%}{after[2] / count:>18.0%}"
+        )
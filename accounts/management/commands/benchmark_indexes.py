@@ -0,0 +1,179 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from chat.models import ChatSession
+from notifications.models import Notification
+from processes.models import ProcessSearch
+from subscriptions.models import Plan, Subscription, SubscriptionStatus
+
+
+# Índices avaliados: (modelo, nome do índice em Meta.indexes)
+BENCHMARK_INDEXES = [
+    (ProcessSearch, 'search_user_date_idx'),
+    (Notification, 'notification_user_created_idx'),
+    (Notification, 'notification_unread_idx'),
+    (ChatSession, 'chatsession_user_active_idx'),
+    (Subscription, 'subscription_user_status_idx'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Popula dados de teste e compara planos e tempos das consultas por usuário sem e com os índices. '
+        'Tudo é desfeito ao final (rollback); não execute em produção, pois os índices são removidos durante a medição.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Quantidade de usuários gerados')
+        parser.add_argument('--rows-per-user', type=int, default=100, help='Buscas, notificações e sessões por usuário')
+        parser.add_argument('--repeat', type=int, default=20, help='Execuções de cada consulta para a mediana')
+        parser.add_argument('--seed', type=int, default=42, help='Semente do gerador aleatório')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        with transaction.atomic():
+            user = self._seed(rng, options['users'], options['rows_per_user'])
+            self._analyze()
+
+            cases = self._cases(user)
+            self._drop_indexes()
+            before = self._measure(cases, options['repeat'])
+            self._create_indexes()
+            after = self._measure(cases, options['repeat'])
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'Consulta':<28}{'Sem índices (ms)':>18}{'Com índices (ms)':>18}")
+        for label, _, _ in cases:
+            self.stdout.write(f"{label:<28}{before[label][0]:>18.3f}{after[label][0]:>18.3f}")
+
+        for label, _, _ in cases:
+            self.stdout.write(f"\n{label}")
+            self.stdout.write('  Sem índices:')
+            self.stdout.write(self._indent(before[label][1]))
+            self.stdout.write('  Com índices:')
+            self.stdout.write(self._indent(after[label][1]))
+
+    def _seed(self, rng, user_count, rows_per_user):
+        """
+        Cria usuários com buscas, notificações, sessões de chat e assinaturas e retorna um deles
+        """
+        now = timezone.now()
+        prefix = uuid.uuid4().hex[:8]
+        users = CustomUser.objects.bulk_create([
+            CustomUser(email=f'benchmark-{prefix}-{index}@example.com', password='!')
+            for index in range(user_count)
+        ])
+
+        ProcessSearch.objects.bulk_create([
+            ProcessSearch(
+                user=user,
+                process_number=f'{rng.randint(0, 10 ** 20 - 1):020d}',
+                success=rng.random() < 0.8
+            )
+            for user in users for _ in range(rows_per_user)
+        ], batch_size=1000)
+
+        Notification.objects.bulk_create([
+            Notification(
+                user=user,
+                title='Notificação',
+                message='Mensagem de teste',
+                # A maior parte das notificações já foi lida
+                is_read=rng.random() < 0.9,
+                expires_at=now + timedelta(days=rng.randint(-30, 30))
+            )
+            for user in users for _ in range(rows_per_user)
+        ], batch_size=1000)
+
+        ChatSession.objects.bulk_create([
+            ChatSession(user=user, title='Sessão', is_active=rng.random() < 0.3)
+            for user in users for _ in range(rows_per_user)
+        ], batch_size=1000)
+
+        statuses = {
+            name: SubscriptionStatus.objects.get_or_create(name=name)[0]
+            for name in ('active', 'canceled', 'past_due')
+        }
+        plan = Plan.objects.create(
+            name=f'benchmark-{prefix}',
+            stripe_price_id=f'price_benchmark_{prefix}',
+            price=10
+        )
+        Subscription.objects.bulk_create([
+            Subscription(
+                user=user,
+                plan=plan,
+                status=statuses['active' if index == 0 else rng.choice(['canceled', 'past_due'])],
+                stripe_subscription_id=f'sub_benchmark_{prefix}_{user.id}_{index}',
+                stripe_customer_id=f'cus_benchmark_{prefix}_{user.id}'
+            )
+            for user in users for index in range(max(1, rows_per_user // 20))
+        ], batch_size=1000)
+
+        return users[len(users) // 2]
+
+    def _cases(self, user):
+        """
+        Consultas das views: (rótulo, queryset, se a view apenas conta as linhas)
+        """
+        now = timezone.now()
+        return [
+            ('Histórico de buscas', ProcessSearch.objects.filter(user=user).order_by('-search_date')[:50], False),
+            ('Notificações do usuário', Notification.objects.filter(user=user, expires_at__gt=now).order_by('-created_at'), False),
+            ('Notificações não lidas', Notification.objects.filter(user=user, is_read=False, expires_at__gt=now).order_by(), True),
+            ('Sessões de chat ativas', ChatSession.objects.filter(user=user, is_active=True).order_by('-updated_at'), False),
+            ('Assinatura ativa', Subscription.objects.filter(user=user, status__name='active'), False),
+        ]
+
+    def _measure(self, cases, repeat):
+        """
+        Retorna, por consulta, a mediana do tempo (ms) e o plano de execução
+        """
+        results = {}
+        for label, queryset, count_only in cases:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                # all() cria um novo queryset, sem o cache de resultados da execução anterior
+                if count_only:
+                    queryset.all().count()
+                else:
+                    list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            results[label] = (statistics.median(timings), queryset.explain())
+        return results
+
+    def _analyze(self):
+        # Estatísticas atualizadas para o planejador considerar os dados gerados
+        if connection.vendor in ('postgresql', 'sqlite'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def _drop_indexes(self):
+        self._execute_index_sql(lambda index, model, editor: index.remove_sql(model, editor))
+
+    def _create_indexes(self):
+        self._execute_index_sql(lambda index, model, editor: index.create_sql(model, editor))
+        self._analyze()
+
+    def _execute_index_sql(self, build):
+        # O editor não é aberto como context manager: o do SQLite não pode ser usado dentro de transaction.atomic()
+        editor = connection.schema_editor(collect_sql=True)
+        editor.deferred_sql = []
+        with connection.cursor() as cursor:
+            for model, name in BENCHMARK_INDEXES:
+                index = next(index for index in model._meta.indexes if index.name == name)
+                cursor.execute(str(build(index, model, editor)))
+
+    def _indent(self, text):
+        return '\n'.join(f'    {line}' for line in str(text).splitlines())
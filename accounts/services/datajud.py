@@ -1,13 +1,71 @@
 import requests
 import logging
+import os
+import random
 import re
-from typing import Dict, List, Optional, Any
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Any, Tuple
 from django.conf import settings
 from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 
+from .singleflight import SingleFlight
+
 logger = logging.getLogger(__name__)
 
+
+# Unidades federativas na ordem do código TR da numeração única (Resolução CNJ 65/2008)
+STATE_CODES = [
+    'ac', 'al', 'ap', 'am', 'ba', 'ce', 'df', 'es', 'go',
+    'ma', 'mt', 'ms', 'mg', 'pa', 'pb', 'pr', 'pe', 'pi',
+    'rj', 'rn', 'rs', 'ro', 'rr', 'sc', 'se', 'sp', 'to',
+]
+
+
+def _build_tribunal_routes() -> Dict[Tuple[str, str], str]:
+    """
+    Monta a tabela (J, TR) -> índice do DataJud para todos os segmentos de justiça
+    
+    J: 3 STJ, 4 Federal, 5 Trabalho, 6 Eleitoral, 7 Militar da União,
+    8 Estadual, 9 Militar Estadual. STF (1) e CNJ (2) não estão no DataJud.
+    """
+    routes = {
+        ('3', '00'): 'stj',
+        ('5', '00'): 'tst',
+        ('6', '00'): 'tse',
+        ('7', '00'): 'stm',
+        # Tribunais de Justiça Militar estaduais
+        ('9', '13'): 'tjmmg',
+        ('9', '21'): 'tjmrs',
+        ('9', '26'): 'tjmsp',
+    }
+    
+    for region in range(1, 7):
+        routes[('4', f'{region:02d}')] = f'trf{region}'
+    
+    for region in range(1, 25):
+        routes[('5', f'{region:02d}')] = f'trt{region}'
+    
+    # Circunscrições Judiciárias Militares são julgadas em grau de recurso pelo STM
+    for region in range(1, 13):
+        routes[('7', f'{region:02d}')] = 'stm'
+    
+    for index, state in enumerate(STATE_CODES, start=1):
+        routes[('8', f'{index:02d}')] = 'tjdft' if state == 'df' else f'tj{state}'
+        routes[('6', f'{index:02d}')] = f'tre-{state}'
+    
+    return routes
+
+
+TRIBUNAL_ROUTES = _build_tribunal_routes()
+
+# Respostas transitórias repetidas com backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
 class DataJudService:
     """
     Serviço para integração com a API do DataJud (CNJ)
@@ -22,28 +80,99 @@ class DataJudService:
             'Content-Type': 'application/json',
             'Accept': 'application/json'
         }
+        
+        # Tribunais consultados quando não é possível identificar o tribunal pelo número
+        self.fallback_tribunals = ['tjsp', 'tjrj', 'tjmg', 'tjrs', 'tjpr', 'tjsc', 'tjba', 'tjce', 'tjpe', 'tjgo']
+        self.fallback_parallel = getattr(settings, 'DATAJUD_FALLBACK_PARALLEL', True)
+        self.fallback_max_workers = getattr(settings, 'DATAJUD_FALLBACK_MAX_WORKERS', 5)
+        self.search_deadline = getattr(settings, 'DATAJUD_SEARCH_DEADLINE', 20)
+        
+        # Conexões HTTP reutilizadas entre requisições (keep-alive)
+        self.connect_timeout = getattr(settings, 'DATAJUD_CONNECT_TIMEOUT', 5)
+        self.read_timeout = getattr(settings, 'DATAJUD_READ_TIMEOUT', 30)
+        self.pool_connections = getattr(settings, 'DATAJUD_POOL_CONNECTIONS', 4)
+        self.pool_maxsize = getattr(settings, 'DATAJUD_POOL_MAXSIZE', 10)
+        self.max_retries = getattr(settings, 'DATAJUD_MAX_RETRIES', 2)
+        self.retry_backoff = getattr(settings, 'DATAJUD_RETRY_BACKOFF', 0.5)
+        self.retry_jitter = getattr(settings, 'DATAJUD_RETRY_JITTER', 0.5)
+        self._sessions = {}
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+        
+        # Uma única consulta em andamento por chave de cache, no processo e entre workers
+        self.single_flight = SingleFlight(
+            lock_timeout=getattr(settings, 'DATAJUD_SINGLE_FLIGHT_TIMEOUT', 60)
+        )
     
-    def _make_request(self, endpoint: str, data: Dict = None, method: str = 'POST') -> Dict[str, Any]:
+    def _get_session(self, transport_retries: bool = True) -> requests.Session:
+        """
+        Retorna a sessão HTTP compartilhada, criando-a na primeira chamada
+        
+        A sessão é recriada após um fork (gunicorn com preload_app) para que
+        cada worker tenha seu próprio pool de conexões.
+        
+        Args:
+            transport_retries: Sessão com retentativas do urllib3; consultas com prazo usam a
+                sessão sem retentativas e repetem apenas o que cabe no prazo (ver _make_request)
+        """
+        pid = os.getpid()
+        session = self._sessions.get(transport_retries) if self._session_pid == pid else None
+        if session is not None:
+            return session
+        
+        with self._session_lock:
+            if self._session_pid != pid:
+                self._sessions = {}
+                self._session_pid = pid
+            session = self._sessions.get(transport_retries)
+            if session is None:
+                retry = Retry(
+                    total=self.max_retries,
+                    backoff_factor=self.retry_backoff,
+                    backoff_jitter=self.retry_jitter,
+                    status_forcelist=RETRY_STATUSES,
+                    allowed_methods=frozenset(['GET', 'POST']),
+                    respect_retry_after_header=True,
+                    raise_on_status=False
+                ) if transport_retries else Retry(total=0, raise_on_status=False)
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                    max_retries=retry
+                )
+                session = requests.Session()
+                session.headers.update(self.headers)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._sessions[transport_retries] = session
+        
+        return session
+    
+    def _make_request(self, endpoint: str, data: Dict = None, method: str = 'POST', deadline: float = None) -> Dict[str, Any]:
         """
         Faz uma requisição para a API do DataJud
+        
+        Args:
+            endpoint: Caminho relativo à URL base
+            data: Corpo (POST) ou parâmetros (GET) da requisição
+            method: Método HTTP
+            deadline: Instante limite opcional (time.monotonic). Cada tentativa usa o tempo
+                restante como timeout e só há nova tentativa se o backoff couber no prazo
         """
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        session = self._get_session(transport_retries=deadline is None)
         
         try:
-            if method.upper() == 'POST':
-                response = requests.post(
-                    url,
-                    headers=self.headers,
-                    json=data or {},
-                    timeout=30
-                )
-            else:
-                response = requests.get(
-                    url,
-                    headers=self.headers,
-                    params=data or {},
-                    timeout=30
-                )
+            attempt = 0
+            while True:
+                response = self._send(session, url, data, method, deadline)
+                if deadline is None or response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    break
+                delay = self._retry_delay(attempt, response)
+                if time.monotonic() + delay >= deadline:
+                    break
+                time.sleep(delay)
+                attempt += 1
             
             response.raise_for_status()
             return response.json()
@@ -66,6 +195,31 @@ class DataJudService:
             else:
                 raise Exception(f"Erro de conexão com a API do DataJud: {str(e)}")
     
+    def _send(self, session: requests.Session, url: str, data: Dict, method: str, deadline: float = None) -> requests.Response:
+        """
+        Envia uma tentativa da requisição, com timeouts limitados ao tempo restante até deadline
+        """
+        connect_timeout, read_timeout = self.connect_timeout, self.read_timeout
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.exceptions.Timeout(f"Prazo de {self.search_deadline}s esgotado")
+            connect_timeout, read_timeout = min(connect_timeout, remaining), min(read_timeout, remaining)
+        
+        if method.upper() == 'POST':
+            return session.post(url, json=data or {}, timeout=(connect_timeout, read_timeout))
+        return session.get(url, params=data or {}, timeout=(connect_timeout, read_timeout))
+    
+    def _retry_delay(self, attempt: int, response: requests.Response) -> float:
+        """
+        Espera antes da próxima tentativa: backoff exponencial com jitter, ou o Retry-After da resposta se maior
+        """
+        delay = self.retry_backoff * 2 ** attempt + random.uniform(0, self.retry_jitter)
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        return delay
+    
     def search_process_by_number(self, process_number: str) -> Dict[str, Any]:
         """
         Busca um processo pelo número
@@ -83,11 +237,30 @@ class DataJudService:
             logger.info(f"Processo {process_number} encontrado no cache")
             return cached_result
         
+        # Buscas simultâneas pelo mesmo número compartilham uma única consulta ao DataJud
+        return self.single_flight.do(cache_key, lambda: self._search_process_by_number(process_number))
+    
+    def _search_process_by_number(self, process_number: str) -> Dict[str, Any]:
+        """
+        Busca um processo pelo número no DataJud (executada sob single-flight)
+        """
+        # O resultado pode ter sido obtido por quem detinha o lock
+        cache_key = f"datajud_process_{process_number}"
+        cached_result = cache.get(cache_key)
+        if cached_result:
+            logger.info(f"Processo {process_number} encontrado no cache")
+            return cached_result
+        
+        # Números sabidamente inexistentes não geram novas chamadas ao DataJud
+        miss_key = f"datajud_process_miss_{process_number}"
+        if cache.get(miss_key):
+            logger.info(f"Processo {process_number} inexistente (cache negativo)")
+            raise Exception(f"Não foi possível consultar o processo {process_number}. Verifique se o número está correto e tente novamente.")
+        
+        # Prazo total da busca nos tribunais alternativos
+        deadline = time.monotonic() + self.search_deadline
+        
         try:
-            # Primeiro, tenta no tribunal extraído do número
-            tribunal_code = self._extract_tribunal_code(process_number)
-            endpoint = f"/api_publica_{tribunal_code.lower()}/_search"
-            
             data = {
                 "query": {
                     "match": {
@@ -96,37 +269,45 @@ class DataJudService:
                 }
             }
             
-            try:
-                result = self._make_request(endpoint, data, 'POST')
+            # O segmento de justiça (J) e o tribunal (TR) do número indicam o índice exato no DataJud
+            tribunal_code = self._extract_tribunal_code(process_number)
+            
+            if tribunal_code:
+                process_data = self._search_in_tribunal(tribunal_code, data, deadline=deadline)
+                if process_data:
+                    cache.set(cache_key, process_data, settings.DATAJUD_PROCESS_CACHE_TTL)
+                    logger.info(f"Processo {process_number} encontrado no tribunal {tribunal_code.upper()}")
+                    return process_data
                 
-                if result and isinstance(result, dict) and "hits" in result:
-                    hits = result["hits"].get("hits", [])
-                    if hits and "_source" in hits[0]:
-                        process_data = hits[0]["_source"]
-                        cache.set(cache_key, process_data, 3600)  # Cache por 1 hora
-                        logger.info(f"Processo {process_number} encontrado no tribunal {tribunal_code.upper()}")
-                        return process_data
-            except Exception as e:
-                logger.warning(f"Processo não encontrado no tribunal {tribunal_code.upper()}: {e}")
-            
-            # Se não encontrou no tribunal extraído, busca nos principais tribunais
-            main_tribunals = ['tjsp', 'tjrj', 'tjmg', 'tjrs', 'tjpr', 'tjsc', 'tjba', 'tjce', 'tjpe', 'tjgo']
-            
-            for tribunal in main_tribunals:
-                try:
-                    endpoint = f"/api_publica_{tribunal}/_search"
-                    result = self._make_request(endpoint, data, 'POST')
-                    
-                    if result and isinstance(result, dict) and "hits" in result:
-                        hits = result["hits"].get("hits", [])
-                        if hits and "_source" in hits[0]:
-                            process_data = hits[0]["_source"]
-                            cache.set(cache_key, process_data, 3600)  # Cache por 1 hora
-                            logger.info(f"Processo {process_number} encontrado no tribunal {tribunal.upper()}")
-                            return process_data
-                except Exception as e:
-                    logger.warning(f"Erro ao buscar no tribunal {tribunal.upper()}: {e}")
-                    continue
+                cache.set(miss_key, True, settings.DATAJUD_NEGATIVE_CACHE_TTL)
+                raise Exception(f"Processo {process_number} não encontrado no tribunal {tribunal_code.upper()}")
+            
+            # Número sem tribunal identificável: busca nos principais tribunais,
+            # pulando os que já responderam que o processo não existe
+            memo_keys = {
+                f"datajud_tribunal_miss_{tribunal}_{process_number}": tribunal
+                for tribunal in self.fallback_tribunals
+            }
+            known_misses = {memo_keys[key] for key in cache.get_many(list(memo_keys))}
+            tribunals = [t for t in self.fallback_tribunals if t not in known_misses]
+            
+            misses = []
+            process_data, tribunal = self._search_fallback_tribunals(tribunals, data, deadline, misses)
+            
+            if process_data:
+                cache.set(cache_key, process_data, settings.DATAJUD_PROCESS_CACHE_TTL)
+                logger.info(f"Processo {process_number} encontrado no tribunal {tribunal.upper()}")
+                return process_data
+            
+            if misses:
+                cache.set_many(
+                    {f"datajud_tribunal_miss_{t}_{process_number}": True for t in misses},
+                    settings.DATAJUD_TRIBUNAL_MISS_TTL
+                )
+            
+            # Só é uma ausência definitiva se todos os tribunais responderam (sem erros ou prazo esgotado)
+            if known_misses.union(misses) >= set(self.fallback_tribunals):
+                cache.set(miss_key, True, settings.DATAJUD_NEGATIVE_CACHE_TTL)
             
             # Se não encontrou em nenhum tribunal
             raise Exception(f"Processo {process_number} não encontrado em nenhum tribunal consultado")
@@ -135,6 +316,321 @@ class DataJudService:
             logger.error(f"Erro ao buscar processo {process_number}: {e}")
             raise Exception(f"Não foi possível consultar o processo {process_number}. Verifique se o número está correto e tente novamente.")
     
+    def search_processes_by_numbers(self, process_numbers: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Busca vários processos, com uma consulta ao DataJud por tribunal
+        
+        Os números são agrupados pelo tribunal extraído da numeração e cada grupo
+        é consultado em uma única requisição, em paralelo entre tribunais.
+        Números sem tribunal identificável usam a busca individual, também em
+        paralelo. Toda a busca respeita um único prazo (DATAJUD_SEARCH_DEADLINE);
+        números sem resposta dentro dele voltam com status 'error'.
+        
+        Args:
+            process_numbers: Números dos processos (com ou sem formatação)
+        
+        Returns:
+            Dict número -> {'status': 'found' | 'not_found' | 'error', 'data'?, 'message'?}
+        """
+        results = {}
+        
+        # Cache positivo e negativo, em uma ida ao cache para cada família
+        cached = cache.get_many([f"datajud_process_{n}" for n in process_numbers])
+        known_misses = cache.get_many([f"datajud_process_miss_{n}" for n in process_numbers])
+        
+        groups = {}
+        unrouted = []
+        for process_number in process_numbers:
+            if f"datajud_process_{process_number}" in cached:
+                results[process_number] = {'status': 'found', 'data': cached[f"datajud_process_{process_number}"]}
+            elif f"datajud_process_miss_{process_number}" in known_misses:
+                results[process_number] = {'status': 'not_found'}
+            else:
+                tribunal_code = self._extract_tribunal_code(process_number)
+                if tribunal_code:
+                    groups.setdefault(tribunal_code, []).append(process_number)
+                else:
+                    unrouted.append(process_number)
+        
+        deadline = time.monotonic() + self.search_deadline
+        
+        # As buscas individuais começam antes e correm junto com as buscas em lote
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, min(self.fallback_max_workers, len(unrouted))),
+            thread_name_prefix='datajud-unrouted'
+        ) if unrouted else None
+        try:
+            futures = {
+                executor.submit(self._search_unrouted_number, process_number): process_number
+                for process_number in unrouted
+            }
+            
+            if groups:
+                results.update(self._search_grouped_numbers(groups, deadline))
+            
+            if futures:
+                done, _ = wait(futures, timeout=max(0, deadline - time.monotonic()))
+                for future, process_number in futures.items():
+                    if future in done:
+                        results[process_number] = future.result()
+                    else:
+                        results[process_number] = {
+                            'status': 'error',
+                            'message': f"Tempo esgotado ao consultar o processo {process_number}"
+                        }
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+        
+        return results
+    
+    def _search_unrouted_number(self, process_number: str) -> Dict[str, Any]:
+        """
+        Busca individual de um número sem tribunal identificável, no formato de search_processes_by_numbers
+        """
+        try:
+            return {'status': 'found', 'data': self.search_process_by_number(process_number)}
+        except Exception as e:
+            if cache.get(f"datajud_process_miss_{process_number}"):
+                return {'status': 'not_found'}
+            return {'status': 'error', 'message': str(e)}
+    
+    def _search_grouped_numbers(self, groups: Dict[str, List[str]], deadline: float) -> Dict[str, Dict[str, Any]]:
+        """
+        Consulta cada tribunal uma vez com todos os seus números e atualiza o cache
+        
+        Args:
+            groups: Números por código do tribunal
+            deadline: Instante (time.monotonic()) limite de toda a busca
+        """
+        results = {}
+        found = {}
+        misses = {}
+        
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, min(self.fallback_max_workers, len(groups))),
+            thread_name_prefix='datajud-batch'
+        )
+        try:
+            futures = {
+                executor.submit(self._search_numbers_in_tribunal, tribunal, numbers, deadline): tribunal
+                for tribunal, numbers in groups.items()
+            }
+            for future, tribunal in futures.items():
+                try:
+                    by_digits, complete = future.result()
+                except Exception as e:
+                    logger.warning(f"Erro na busca em lote no tribunal {tribunal.upper()}: {e}")
+                    for process_number in groups[tribunal]:
+                        results[process_number] = {
+                            'status': 'error',
+                            'message': f"Não foi possível consultar o tribunal {tribunal.upper()}"
+                        }
+                    continue
+                
+                for process_number in groups[tribunal]:
+                    process_data = by_digits.get(re.sub(r'[^\d]', '', process_number))
+                    if process_data:
+                        found[f"datajud_process_{process_number}"] = process_data
+                        results[process_number] = {'status': 'found', 'data': process_data}
+                    elif not complete:
+                        # Resposta truncada: a ausência não foi confirmada e não vai para o cache negativo
+                        results[process_number] = {
+                            'status': 'error',
+                            'message': f"Não foi possível confirmar o processo no tribunal {tribunal.upper()}"
+                        }
+                    else:
+                        misses[f"datajud_process_miss_{process_number}"] = True
+                        results[process_number] = {'status': 'not_found'}
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        if found:
+            cache.set_many(found, settings.DATAJUD_PROCESS_CACHE_TTL)
+        if misses:
+            cache.set_many(misses, settings.DATAJUD_NEGATIVE_CACHE_TTL)
+        
+        logger.info(f"Busca em lote: {len(found)} encontrados, {len(misses)} inexistentes em {len(groups)} tribunais")
+        return results
+    
+    def _search_numbers_in_tribunal(self, tribunal: str, process_numbers: List[str], deadline: float = None) -> Tuple[Dict[str, Dict[str, Any]], bool]:
+        """
+        Busca vários números em um único tribunal, em uma requisição quando a resposta cabe em size
+        
+        Um processo com muitos documentos pode ocupar o limite de hits e deixar
+        outros números fora da resposta. Nesse caso os números ainda não
+        encontrados são consultados de novo, enquanto houver progresso.
+        
+        Returns:
+            (dict número (apenas dígitos) -> dados do primeiro documento encontrado,
+             True se a última resposta não foi truncada, ou seja, os números ausentes não existem)
+        """
+        digits = list(dict.fromkeys(re.sub(r'[^\d]', '', n) for n in process_numbers))
+        endpoint = f"/api_publica_{tribunal.lower()}/_search"
+        
+        by_digits = {}
+        remaining = digits
+        while remaining:
+            size = len(remaining) * 3
+            data = {
+                # Um processo pode ter mais de um documento (ex: um por grau de jurisdição)
+                "size": size,
+                "track_total_hits": True,
+                "query": {
+                    "bool": {
+                        "should": [{"match": {"numeroProcesso": number}} for number in remaining],
+                        "minimum_should_match": 1
+                    }
+                }
+            }
+            result = self._make_request(endpoint, data, 'POST', deadline=deadline)
+            
+            hits = []
+            total = None
+            if result and isinstance(result, dict) and "hits" in result:
+                hits = result["hits"].get("hits", [])
+                total = result["hits"].get("total")
+                if isinstance(total, dict):
+                    total = total.get("value")
+            
+            before = len(by_digits)
+            for hit in hits:
+                source = hit.get("_source")
+                if source:
+                    by_digits.setdefault(re.sub(r'[^\d]', '', str(source.get("numeroProcesso", ''))), source)
+            
+            # Sem o total, uma resposta com size hits pode ter sido cortada
+            truncated = total > len(hits) if isinstance(total, int) else len(hits) >= size
+            if not truncated:
+                return by_digits, True
+            
+            remaining = [number for number in remaining if number not in by_digits]
+            if len(by_digits) == before:
+                break
+        
+        return by_digits, not remaining
+    
+    def _get_or_fetch(self, cache_key: str, fetch, timeout: int, refresh: bool = False) -> Any:
+        """
+        Retorna o valor em cache ou o obtém com fetch, sob single-flight, salvando no cache
+        
+        Args:
+            cache_key: Chave do resultado no cache
+            fetch: Função que consulta o DataJud
+            timeout: Tempo de vida do resultado no cache, em segundos
+            refresh: Ignora o valor em cache e consulta o DataJud (o resultado substitui o cache)
+        """
+        if not refresh:
+            cached_result = cache.get(cache_key)
+            if cached_result:
+                return cached_result
+        
+        def load():
+            # O resultado pode ter sido obtido por quem detinha o lock
+            cached_result = None if refresh else cache.get(cache_key)
+            if cached_result:
+                return cached_result
+            
+            result = fetch()
+            cache.set(cache_key, result, timeout)
+            return result
+        
+        return self.single_flight.do(cache_key, load)
+    
+    def _search_in_tribunal(self, tribunal: str, data: Dict, deadline: float = None) -> Optional[Dict[str, Any]]:
+        """
+        Executa a busca em um único tribunal
+        
+        Args:
+            tribunal: Código do tribunal (ex: tjsp)
+            data: Query Elasticsearch enviada ao DataJud
+            deadline: Instante limite opcional (time.monotonic) da consulta, retentativas incluídas
+        
+        Returns:
+            Dados do primeiro processo encontrado ou None
+        """
+        endpoint = f"/api_publica_{tribunal.lower()}/_search"
+        result = self._make_request(endpoint, data, 'POST', deadline=deadline)
+        
+        if result and isinstance(result, dict) and "hits" in result:
+            hits = result["hits"].get("hits", [])
+            if hits and "_source" in hits[0]:
+                return hits[0]["_source"]
+        
+        return None
+    
+    def _search_fallback_tribunals(self, tribunals: List[str], data: Dict, deadline: float, misses: List[str] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Busca o processo em uma lista de tribunais até o prazo informado
+        
+        No modo paralelo (DATAJUD_FALLBACK_PARALLEL) os tribunais são consultados
+        ao mesmo tempo e a primeira resposta com resultado é retornada; as
+        consultas pendentes são canceladas.
+        
+        Args:
+            tribunals: Códigos dos tribunais a consultar
+            data: Query Elasticsearch enviada ao DataJud
+            deadline: Instante limite (time.monotonic) para obter uma resposta
+            misses: Lista preenchida com os tribunais que responderam sem resultado
+        
+        Returns:
+            Tupla (dados do processo, tribunal) ou (None, None)
+        """
+        if not tribunals:
+            return None, None
+        
+        if misses is None:
+            misses = []
+        
+        if not self.fallback_parallel:
+            for tribunal in tribunals:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"Prazo de {self.search_deadline}s esgotado na busca em tribunais alternativos")
+                    break
+                try:
+                    process_data = self._search_in_tribunal(tribunal, data, deadline=deadline)
+                    if process_data:
+                        return process_data, tribunal
+                    misses.append(tribunal)
+                except Exception as e:
+                    logger.warning(f"Erro ao buscar no tribunal {tribunal.upper()}: {e}")
+            return None, None
+        
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, min(self.fallback_max_workers, len(tribunals))),
+            thread_name_prefix='datajud-fallback'
+        )
+        futures = {
+            executor.submit(self._search_in_tribunal, tribunal, data, deadline): tribunal
+            for tribunal in tribunals
+        }
+        pending = set(futures)
+        
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"Prazo de {self.search_deadline}s esgotado na busca em tribunais alternativos")
+                    break
+                
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tribunal = futures[future]
+                    try:
+                        process_data = future.result()
+                    except Exception as e:
+                        logger.warning(f"Erro ao buscar no tribunal {tribunal.upper()}: {e}")
+                        continue
+                    if process_data:
+                        return process_data, tribunal
+                    misses.append(tribunal)
+        finally:
+            # Não aguarda as consultas em andamento e descarta as que ainda não começaram
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        return None, None
+    
     def search_processes_by_court(self, court_code: str, limit: int = 100) -> Dict[str, Any]:
         """
         Busca processos por tribunal
@@ -147,9 +643,6 @@ class DataJudService:
             Dict com lista de processos
         """
         cache_key = f"datajud_court_{court_code}_{limit}"
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            return cached_result
         
         try:
             # Converter código do tribunal para lowercase
@@ -162,39 +655,36 @@ class DataJudService:
                 }
             }
             
-            result = self._make_request(f'/api_publica_{tribunal_endpoint}/_search', data, 'POST')
-            
-            # Salvar no cache por 30 minutos
-            cache.set(cache_key, result, 1800)
-            
-            return result
+            return self._get_or_fetch(
+                cache_key,
+                lambda: self._make_request(f'/api_publica_{tribunal_endpoint}/_search', data, 'POST'),
+                settings.DATAJUD_COURT_CACHE_TTL
+            )
             
         except Exception as e:
             logger.error(f"Erro ao buscar processos do tribunal {court_code}: {e}")
             raise Exception(f"Não foi possível consultar processos do tribunal {court_code}. Verifique se o código do tribunal está correto e tente novamente.")
     
-    def get_process_details(self, process_id: str) -> Dict[str, Any]:
+    def get_process_details(self, process_id: str, refresh: bool = False) -> Dict[str, Any]:
         """
         Obtém detalhes completos de um processo
         
         Args:
             process_id: ID único do processo
+            refresh: Consulta o DataJud mesmo com os detalhes em cache (atualização de processos desatualizados)
         
         Returns:
             Dict com detalhes completos do processo
         """
         cache_key = f"datajud_details_{process_id}"
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            return cached_result
         
         try:
-            result = self._make_request(f'/processos/{process_id}')
-            
-            # Salvar no cache por 2 horas
-            cache.set(cache_key, result, 7200)
-            
-            return result
+            return self._get_or_fetch(
+                cache_key,
+                lambda: self._make_request(f'/processos/{process_id}'),
+                settings.DATAJUD_DETAILS_CACHE_TTL,
+                refresh=refresh
+            )
             
         except Exception as e:
             logger.error(f"Erro ao obter detalhes do processo {process_id}: {e}")
@@ -309,8 +799,7 @@ class DataJudService:
             {"code": "tjgo", "name": "Tribunal de Justiça de Goiás", "type": "estadual"},
         ]
         
-        # Salvar no cache por 24 horas
-        cache.set(cache_key, courts, 86400)
+        cache.set(cache_key, courts, settings.DATAJUD_COURTS_LIST_CACHE_TTL)
         return courts
     
     def get_process_movements(self, process_id: str) -> List[Dict[str, Any]]:
@@ -389,37 +878,24 @@ class DataJudService:
         
         return formatted
     
-    def _extract_tribunal_code(self, process_number: str) -> str:
+    def _extract_tribunal_code(self, process_number: str) -> Optional[str]:
         """
-        Extrai o código do tribunal do número do processo
+        Extrai o código do tribunal (índice do DataJud) do número do processo
         
         Args:
-            process_number: Número do processo formatado
+            process_number: Número do processo (com ou sem formatação)
         
         Returns:
-            Código do tribunal (ex: TJSP, STF, etc.)
+            Código do tribunal (ex: tjsp, trf3, trt2, tre-sp) ou None se não identificado
         """
         # Remove caracteres não numéricos
         numbers_only = re.sub(r'[^\d]', '', process_number)
         
         if len(numbers_only) != 20:
-            return "tjsp"  # Default
-        
-        # Extrair código do tribunal (posições 14-16)
-        tribunal_code = numbers_only[14:16]
-        
-        # Mapear códigos para nomes de tribunais (em lowercase para URLs)
-        tribunal_mapping = {
-            "01": "tjac", "02": "tjal", "03": "tjam", "04": "tjap",
-            "05": "tjba", "06": "tjce", "07": "tjdft", "08": "tjes",
-            "09": "tjgo", "10": "tjma", "11": "tjmt", "12": "tjms",
-            "13": "tjmg", "14": "tjpa", "15": "tjpb", "16": "tjpe",
-            "17": "tjpi", "18": "tjpr", "19": "tjrj", "20": "tjrn",
-            "21": "tjro", "22": "tjrr", "23": "tjrs", "24": "tjsc",
-            "25": "tjsp", "26": "tjse", "27": "tjto"
-        }
+            return None
         
-        return tribunal_mapping.get(tribunal_code, "tjsp")
+        # Segmento de justiça (posição 13) e tribunal (posições 14-16)
+        return TRIBUNAL_ROUTES.get((numbers_only[13], numbers_only[14:16]))
 
 
 # Instância global do serviço
@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """
+    Chamada em andamento compartilhada pelas threads do processo
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Garante no máximo uma execução em andamento por chave
+
+    Dentro do processo, as threads concorrentes aguardam o resultado da
+    primeira. Entre workers, um lock no cache compartilhado (cache.add)
+    serializa as execuções: quem não obtém o lock aguarda sua liberação e
+    então executa a função, que deve consultar o cache antes de ir à origem.
+    """
+
+    def __init__(self, lock_timeout: float = 60, poll_interval: float = 0.1):
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Executa fn uma única vez para as chamadas simultâneas com a mesma chave
+
+        Args:
+            key: Chave que identifica a chamada (ex: chave do cache do resultado)
+            fn: Função que produz o resultado
+
+        Returns:
+            Resultado de fn, compartilhado entre as chamadas concorrentes
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise self._copy_error(call.error) from call.error
+            return call.result
+
+        try:
+            call.result = self._run_exclusive(key, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    @staticmethod
+    def _copy_error(error: Exception) -> Exception:
+        """
+        Nova instância do erro da execução compartilhada para cada thread que aguardava
+
+        Relançar o mesmo objeto em várias threads faria o traceback de uma
+        ser acumulado no das outras.
+        """
+        try:
+            return type(error)(*error.args)
+        except Exception:
+            # Exceções cujo construtor não aceita os próprios args
+            return Exception(str(error))
+
+    def _run_exclusive(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Executa fn segurando o lock da chave no cache compartilhado
+        """
+        lock_key = f"singleflight_{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+
+        while not cache.add(lock_key, token, self.lock_timeout):
+            if time.monotonic() >= deadline:
+                logger.warning(f"Lock {lock_key} não liberado em {self.lock_timeout}s, executando sem lock")
+                return fn()
+            time.sleep(self.poll_interval)
+
+        try:
+            return fn()
+        finally:
+            # Só libera o lock se ele ainda for nosso (pode ter expirado e sido obtido por outro worker)
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
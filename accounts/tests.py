@@ -3,8 +3,21 @@ from rest_framework.test import APITestCase
 from django.http import HttpResponse
 from .models import CustomUser
 from django.conf import settings
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest.mock import patch
 import json
+import threading
+import time
+
+from cloudpharma_backend.cache import TieredCache
+
+from .services.datajud import DataJudService
+from .services.singleflight import SingleFlight
 
 
 USER     : str = 'Luca'
@@ -139,4 +152,584 @@ class ApiTests(APITestCase):
             'token'     : self.token
         }
         check_auth_response : HttpResponse = self.client.post(check_auth_url, check_auth_data, format='json')
-        self.assertEqual(check_auth_response.status_code, status.HTTP_200_OK, 'Get user auth failed!')
\ No newline at end of file
+        self.assertEqual(check_auth_response.status_code, status.HTTP_200_OK, 'Get user auth failed!')
+
+# STF (J=1) is not indexed by DataJud, so the lookup falls back to the main tribunals
+UNROUTED_NUMBER : str = '0001234-56.2023.1.00.0001'
+
+
+class DataJudRoutingTests(TestCase):
+    """
+    Ensure process numbers are routed to the DataJud index of their justice segment.
+    """
+
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.service = DataJudService()
+
+
+    def test_routes_every_segment(self) -> None:
+        """
+        Ensure the J.TR digits select the right tribunal.
+        """
+        expected : dict = {
+            '0001234-56.2023.8.26.0100' : 'tjsp',
+            '0001234-56.2023.8.21.0001' : 'tjrs',
+            '0001234-56.2023.8.07.0001' : 'tjdft',
+            '0001234-56.2023.4.03.6100' : 'trf3',
+            '0001234-56.2023.5.02.0001' : 'trt2',
+            '0001234-56.2023.5.00.0000' : 'tst',
+            '0001234-56.2023.6.26.0001' : 'tre-sp',
+            '0001234-56.2023.7.00.0000' : 'stm',
+            '0001234-56.2023.9.13.0001' : 'tjmmg',
+            '00012345620233000000'      : 'stj',
+        }
+        for process_number, tribunal in expected.items():
+            self.assertEqual(self.service._extract_tribunal_code(process_number), tribunal, process_number)
+        self.assertIsNone(self.service._extract_tribunal_code(UNROUTED_NUMBER))
+        self.assertIsNone(self.service._extract_tribunal_code('123'))
+
+
+    def test_routed_lookup_uses_single_request(self) -> None:
+        """
+        Ensure a routed number costs exactly one upstream call, hit or miss.
+        """
+        with patch.object(self.service, '_search_in_tribunal', return_value=None) as search:
+            with self.assertRaises(Exception):
+                self.service.search_process_by_number('0001234-56.2023.5.02.0001')
+        self.assertEqual(search.call_count, 1)
+        self.assertEqual(search.call_args[0][0], 'trt2')
+
+
+    def test_routing_benchmark(self) -> None:
+        """
+        Ensure the routing benchmark reports one call per search.
+        """
+        output = StringIO()
+        call_command('benchmark_datajud_routing', samples=50, stdout=output)
+        total  = output.getvalue().strip().splitlines()[-1].split()
+        self.assertEqual(total[0], 'Total')
+        self.assertEqual(float(total[3]), 1.0)
+
+
+class DataJudFallbackTests(TestCase):
+    """
+    Ensure the DataJud tribunal fallback runs concurrently and respects its deadline.
+    """
+
+
+    def setUp(self) -> None:
+        cache.clear()
+
+
+    def _fake_search(self, hit_tribunal: str, delay: float):
+        calls : list = []
+
+        def search(tribunal, data, deadline=None):
+            calls.append(tribunal)
+            time.sleep(delay)
+            return {'numeroProcesso': 'ok', 'tribunal': tribunal.upper()} if tribunal == hit_tribunal else None
+
+        return search, calls
+
+
+    @override_settings(DATAJUD_FALLBACK_PARALLEL=True, DATAJUD_FALLBACK_MAX_WORKERS=10, DATAJUD_SEARCH_DEADLINE=5)
+    def test_fallback_returns_first_hit_in_parallel(self) -> None:
+        """
+        Ensure fallback tribunals are queried at the same time.
+        """
+        service        = DataJudService()
+        search, calls  = self._fake_search('tjgo', 0.2)
+        started        = time.monotonic()
+        with patch.object(service, '_search_in_tribunal', side_effect=search):
+            result = service.search_process_by_number(UNROUTED_NUMBER)
+        elapsed = time.monotonic() - started
+        self.assertEqual(result['tribunal'], 'TJGO')
+        self.assertLess(elapsed, 1.5, 'Fallback tribunals were queried sequentially!')
+
+
+    @override_settings(DATAJUD_FALLBACK_PARALLEL=True, DATAJUD_FALLBACK_MAX_WORKERS=10, DATAJUD_SEARCH_DEADLINE=0.3)
+    def test_fallback_deadline(self) -> None:
+        """
+        Ensure a slow fallback gives up after the overall deadline.
+        """
+        service        = DataJudService()
+        search, calls  = self._fake_search('tjgo', 2)
+        started        = time.monotonic()
+        with patch.object(service, '_search_in_tribunal', side_effect=search):
+            with self.assertRaises(Exception):
+                service.search_process_by_number(UNROUTED_NUMBER)
+        self.assertLess(time.monotonic() - started, 1.5, 'Fallback deadline was not enforced!')
+
+
+class DataJudStubHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the DataJud API: fails with 503 a configurable number of times.
+    """
+    protocol_version : str = 'HTTP/1.1'
+
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        server.connections.add(self.client_address)
+        server.requests += 1
+
+        if server.failures > 0:
+            server.failures -= 1
+            status_code, body = 503, b'{}'
+        else:
+            status_code, body = 200, json.dumps({'hits': {'hits': [{'_source': {'numeroProcesso': '1'}}]}}).encode()
+
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class DataJudSessionTests(TestCase):
+    """
+    Ensure DataJud requests reuse pooled connections and retry transient errors.
+    """
+
+
+    def setUp(self) -> None:
+        self.server             = ThreadingHTTPServer(('127.0.0.1', 0), DataJudStubHandler)
+        self.server.connections = set()
+        self.server.requests    = 0
+        self.server.failures    = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def test_connections_are_reused(self) -> None:
+        """
+        Ensure consecutive requests share one keep-alive connection.
+        """
+        with override_settings(DATAJUD_BASE_URL=self.base_url):
+            service = DataJudService()
+        for _ in range(3):
+            service._make_request('/api_publica_tjsp/_search', {})
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(len(self.server.connections), 1, 'Connections were not reused!')
+
+
+    def test_retry_on_server_error(self) -> None:
+        """
+        Ensure 5xx responses are retried with backoff.
+        """
+        self.server.failures = 2
+        with override_settings(DATAJUD_BASE_URL=self.base_url, DATAJUD_MAX_RETRIES=2, DATAJUD_RETRY_BACKOFF=0.01, DATAJUD_RETRY_JITTER=0):
+            service = DataJudService()
+        result = service._make_request('/api_publica_tjsp/_search', {})
+        self.assertEqual(self.server.requests, 3)
+        self.assertIn('hits', result)
+
+
+    def test_retries_exhausted(self) -> None:
+        """
+        Ensure the error surfaces once retries are exhausted.
+        """
+        self.server.failures = 5
+        with override_settings(DATAJUD_BASE_URL=self.base_url, DATAJUD_MAX_RETRIES=1, DATAJUD_RETRY_BACKOFF=0.01, DATAJUD_RETRY_JITTER=0):
+            service = DataJudService()
+        with self.assertRaises(Exception):
+            service._make_request('/api_publica_tjsp/_search', {})
+        self.assertEqual(self.server.requests, 2)
+
+
+    def test_retry_within_deadline(self) -> None:
+        """
+        Ensure deadline-bounded requests still retry 5xx responses when the backoff fits.
+        """
+        self.server.failures = 2
+        with override_settings(DATAJUD_BASE_URL=self.base_url, DATAJUD_MAX_RETRIES=2, DATAJUD_RETRY_BACKOFF=0.01, DATAJUD_RETRY_JITTER=0):
+            service = DataJudService()
+        result = service._make_request('/api_publica_tjsp/_search', {}, deadline=time.monotonic() + 5)
+        self.assertEqual(self.server.requests, 3)
+        self.assertIn('hits', result)
+
+
+    def test_retries_bounded_by_deadline(self) -> None:
+        """
+        Ensure retries and backoff never run past the caller's deadline.
+        """
+        self.server.failures = 10
+        with override_settings(DATAJUD_BASE_URL=self.base_url, DATAJUD_MAX_RETRIES=5, DATAJUD_RETRY_BACKOFF=0.2, DATAJUD_RETRY_JITTER=0):
+            service = DataJudService()
+        started = time.monotonic()
+        with self.assertRaises(Exception):
+            service._make_request('/api_publica_tjsp/_search', {}, deadline=started + 0.5)
+        self.assertLess(time.monotonic() - started, 0.5, 'Retries ran past the deadline!')
+        self.assertEqual(self.server.requests, 2)
+
+
+class DataJudNegativeCacheTests(TestCase):
+    """
+    Ensure lookups of missing processes are remembered.
+    """
+
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.service = DataJudService()
+
+
+    def test_missing_process_is_cached(self) -> None:
+        """
+        Ensure retrying a missing number costs no upstream calls.
+        """
+        with patch.object(self.service, '_search_in_tribunal', return_value=None) as search:
+            for _ in range(3):
+                with self.assertRaises(Exception):
+                    self.service.search_process_by_number('0001234-56.2023.8.26.0100')
+        self.assertEqual(search.call_count, 1)
+
+
+    def test_fallback_skips_known_misses(self) -> None:
+        """
+        Ensure a retried fallback only queries the tribunals that failed before.
+        """
+        calls  : list = []
+        failed : list = []
+
+        def search(tribunal, data, deadline=None):
+            calls.append(tribunal)
+            if tribunal == 'tjgo' and not failed:
+                failed.append(tribunal)
+                raise Exception('timeout')
+            return None
+
+        with patch.object(self.service, '_search_in_tribunal', side_effect=search):
+            with self.assertRaises(Exception):
+                self.service.search_process_by_number(UNROUTED_NUMBER)
+            self.assertEqual(len(calls), len(self.service.fallback_tribunals))
+
+            calls.clear()
+            with self.assertRaises(Exception):
+                self.service.search_process_by_number(UNROUTED_NUMBER)
+            self.assertEqual(calls, ['tjgo'])
+
+            calls.clear()
+            with self.assertRaises(Exception):
+                self.service.search_process_by_number(UNROUTED_NUMBER)
+            self.assertEqual(calls, [])
+
+
+class DataJudBatchTests(TestCase):
+    """
+    Ensure batch lookups cost one DataJud request per tribunal.
+    """
+
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.service = DataJudService()
+
+
+    def _fake_request(self, endpoint, data=None, method='POST', deadline=None) -> dict:
+        if 'trf3' in endpoint:
+            raise Exception('Erro HTTP 503 na API do DataJud')
+        numbers = [clause['match']['numeroProcesso'] for clause in data['query']['bool']['should']]
+        return {'hits': {'hits': [
+            {'_source': {'numeroProcesso': number, 'tribunal': 'TJSP'}}
+            for number in numbers if number != '00012345620238260003'
+        ]}}
+
+
+    def test_numbers_grouped_by_tribunal(self) -> None:
+        """
+        Ensure each tribunal is queried once and every number gets a status.
+        """
+        numbers : list = [
+            '0001234-56.2023.8.26.0001',
+            '00012345620238260002',
+            '0001234-56.2023.8.26.0003',
+            '0001234-56.2023.4.03.6100',
+        ]
+        with patch.object(self.service, '_make_request', side_effect=self._fake_request) as request:
+            results = self.service.search_processes_by_numbers(numbers)
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(results[numbers[0]]['status'], 'found')
+        self.assertEqual(results[numbers[1]]['data']['numeroProcesso'], '00012345620238260002')
+        self.assertEqual(results[numbers[2]]['status'], 'not_found')
+        self.assertEqual(results[numbers[3]]['status'], 'error')
+
+        with patch.object(self.service, '_make_request', side_effect=self._fake_request) as request:
+            results = self.service.search_processes_by_numbers(numbers)
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(request.call_args[0][0], '/api_publica_trf3/_search')
+        self.assertEqual(results[numbers[2]]['status'], 'not_found')
+
+
+    def _truncating_request(self, endpoint, data=None, method='POST', deadline=None) -> dict:
+        # The first number has more documents than the requested size allows
+        numbers : list = [clause['match']['numeroProcesso'] for clause in data['query']['bool']['should']]
+        sources : list = []
+        for number in numbers:
+            copies = 10 if number == '00012345620238260001' else 1
+            sources += [{'numeroProcesso': number, 'tribunal': 'TJSP'}] * copies
+        return {'hits': {
+            'total' : {'value': len(sources), 'relation': 'eq'},
+            'hits'  : [{'_source': source} for source in sources[:data['size']]],
+        }}
+
+
+    def test_truncated_response_requeries_missing_numbers(self) -> None:
+        """
+        Ensure numbers crowded out of a truncated response are queried again, not cached as misses.
+        """
+        numbers : list = ['0001234-56.2023.8.26.0001', '0001234-56.2023.8.26.0002']
+        with patch.object(self.service, '_make_request', side_effect=self._truncating_request) as request:
+            results = self.service.search_processes_by_numbers(numbers)
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(request.call_args_list[1][0][1]['query']['bool']['should'], [{'match': {'numeroProcesso': '00012345620238260002'}}])
+        self.assertEqual(results[numbers[0]]['status'], 'found')
+        self.assertEqual(results[numbers[1]]['status'], 'found')
+
+
+    def test_unconfirmed_numbers_not_cached_as_misses(self) -> None:
+        """
+        Ensure a number still missing after a truncated response is an error and stays out of the negative cache.
+        """
+        always_truncated = lambda endpoint, data=None, method='POST', deadline=None: {'hits': {
+            'total' : {'value': 100, 'relation': 'eq'},
+            'hits'  : [{'_source': {'numeroProcesso': '00012345620238260001'}}] * data['size'],
+        }}
+        numbers : list = ['0001234-56.2023.8.26.0001', '0001234-56.2023.8.26.0002']
+        with patch.object(self.service, '_make_request', side_effect=always_truncated) as request:
+            results = self.service.search_processes_by_numbers(numbers)
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(results[numbers[0]]['status'], 'found')
+        self.assertEqual(results[numbers[1]]['status'], 'error')
+        self.assertIsNone(cache.get(f'datajud_process_miss_{numbers[1]}'))
+
+
+    def test_unrouted_numbers_bounded_by_deadline(self) -> None:
+        """
+        Ensure numbers without a tribunal are searched in parallel within the batch deadline.
+        """
+        self.service.search_deadline = 0.3
+        numbers : list = ['0001234-56.2023.1.00.0001', '0001234-56.2023.1.00.0002', '0001234-56.2023.1.00.0003']
+
+        def search(process_number):
+            time.sleep(1 if process_number == numbers[2] else 0.1)
+            return {'numeroProcesso': process_number}
+
+        started = time.monotonic()
+        with patch.object(self.service, 'search_process_by_number', side_effect=search):
+            results = self.service.search_processes_by_numbers(numbers)
+        self.assertLess(time.monotonic() - started, 0.8)
+        self.assertEqual(results[numbers[0]]['status'], 'found')
+        self.assertEqual(results[numbers[1]]['status'], 'found')
+        self.assertEqual(results[numbers[2]]['status'], 'error')
+
+
+class IndexBenchmarkTests(TestCase):
+    """
+    Ensure the index benchmark reports plans without leaving data behind.
+    """
+
+
+    def test_benchmark_uses_indexes_and_rolls_back(self) -> None:
+        """
+        Ensure every query uses its index and the seeded rows are discarded.
+        """
+        users  : int = CustomUser.objects.count()
+        output = StringIO()
+        call_command('benchmark_indexes', users=10, rows_per_user=20, repeat=1, stdout=output)
+        report = output.getvalue()
+        for index in ('search_user_date_idx', 'notification_unread_idx', 'chatsession_user_active_idx', 'subscription_user_status_idx'):
+            self.assertIn(index, report)
+        self.assertEqual(CustomUser.objects.count(), users)
+
+
+# SQLite locks the cache table while the test transaction is open, so threaded
+# tests share an in-memory L2 instead of the database cache.
+LOCMEM_CACHES : dict = {
+    'default' : {
+        'BACKEND'  : 'cloudpharma_backend.cache.TieredCache',
+        'LOCATION' : 'shared',
+        'OPTIONS'  : {'L1_KEY_PREFIXES': ['datajud_']},
+    },
+    'shared'  : {
+        'BACKEND'  : 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DataJudSingleFlightTests(TestCase):
+    """
+    Ensure concurrent identical DataJud lookups share one upstream call.
+    """
+
+
+    def setUp(self) -> None:
+        cache.clear()
+
+
+    def _run_concurrently(self, target, count : int = 5) -> list:
+        results : list = []
+        threads = [threading.Thread(target=lambda: results.append(target())) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+
+    def test_concurrent_lookups_are_coalesced(self) -> None:
+        """
+        Ensure threads searching the same number trigger a single request.
+        """
+        service = DataJudService()
+
+        def search(tribunal, data, deadline=None):
+            time.sleep(0.2)
+            return {'numeroProcesso': '1'}
+
+        with patch.object(service, '_search_in_tribunal', side_effect=search) as mocked:
+            results = self._run_concurrently(lambda: service.search_process_by_number('0001234-56.2023.8.26.0100'))
+        self.assertEqual(mocked.call_count, 1)
+        self.assertEqual(results, [{'numeroProcesso': '1'}] * 5)
+
+
+    def test_followers_get_their_own_error(self) -> None:
+        """
+        Ensure each waiting thread raises a fresh copy of the leader's error, chained to it.
+        """
+        flight = SingleFlight()
+        leader_error = ValueError('DataJud indisponível')
+
+        def fail():
+            time.sleep(0.2)
+            raise leader_error
+
+        def call():
+            try:
+                flight.do('key', fail)
+            except ValueError as e:
+                return e
+
+        errors = self._run_concurrently(call, count=4)
+        self.assertEqual(len(errors), 4)
+        self.assertEqual(len({id(error) for error in errors}), 4)
+        self.assertTrue(all(str(error) == 'DataJud indisponível' for error in errors))
+        self.assertEqual(sum(error is leader_error for error in errors), 1)
+        self.assertTrue(all(error.__cause__ is leader_error for error in errors if error is not leader_error))
+
+
+    def test_lookups_are_coalesced_across_workers(self) -> None:
+        """
+        Ensure separate workers wait on the shared cache lock instead of calling DataJud.
+        """
+        workers = [DataJudService() for _ in range(3)]
+        calls   : list = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'hits': {'hits': []}}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda worker=worker: results.append(worker._get_or_fetch('datajud_court_tjsp_10', fetch, 60)))
+            for worker in workers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 3)
+
+
+class TieredCacheTests(TestCase):
+    """
+    Ensure the L1/L2 cache serves DataJud keys from memory on top of the database cache.
+    """
+
+
+    def setUp(self) -> None:
+        self.cache = TieredCache('shared', {
+            'OPTIONS' : {
+                'L1_MAX_ENTRIES'      : 2,
+                'L1_TIMEOUT'          : 60,
+                'L1_KEY_PREFIXES'     : ['datajud_'],
+            },
+        })
+        self.cache.clear()
+
+
+    def test_l2_is_database_cache(self) -> None:
+        """
+        Ensure the shared tier is the database cache in tests.
+        """
+        self.assertIsInstance(self.cache.l2, DatabaseCache)
+
+
+    def test_l1_hit_after_set(self) -> None:
+        """
+        Ensure DataJud keys are served from memory after being written.
+        """
+        self.cache.set('datajud_process_1', {'numeroProcesso': '1'})
+        with patch.object(self.cache.l2, 'get') as l2_get:
+            self.assertEqual(self.cache.get('datajud_process_1'), {'numeroProcesso': '1'})
+        l2_get.assert_not_called()
+        self.assertEqual(self.cache.get_stats()['l1_hits'], 1)
+
+
+    def test_other_keys_skip_l1(self) -> None:
+        """
+        Ensure keys outside the L1 families always read the shared tier.
+        """
+        self.cache.set('singleflight_lock', 'token', 30)
+        self.assertEqual(self.cache.get('singleflight_lock'), 'token')
+        self.assertEqual(self.cache.get_stats().get('l1_hits', 0), 0)
+        self.assertEqual(self.cache.get_stats()['l1_entries'], 0)
+
+
+    def test_l1_is_size_bounded(self) -> None:
+        """
+        Ensure the least recently used entry is evicted from L1.
+        """
+        for index in range(3):
+            self.cache.set(f'datajud_process_{index}', index)
+        stats = self.cache.get_stats()
+        self.assertEqual(stats['l1_entries'], 2)
+        self.assertEqual(stats['l1_evictions'], 1)
+        self.assertEqual(self.cache.get('datajud_process_0'), 0)
+
+
+    def test_caller_timeouts(self) -> None:
+        """
+        Ensure the caller's TTL applies to both tiers.
+        """
+        self.cache.set_many({'datajud_process_miss_1': True}, 1)
+        self.cache.set('datajud_process_1', {'numeroProcesso': '1'}, 3600)
+        time.sleep(1.1)
+        self.assertIsNone(self.cache.get('datajud_process_miss_1'))
+        self.assertIsNotNone(self.cache.l2.get('datajud_process_1'))
+
+
+    def test_values_are_isolated(self) -> None:
+        """
+        Ensure callers mutating a cached value do not change the cache.
+        """
+        value = {'movimentos': []}
+        self.cache.set('datajud_process_1', value)
+        value['movimentos'].append('x')
+        self.cache.get('datajud_process_1')['movimentos'].append('y')
+        self.assertEqual(self.cache.get('datajud_process_1'), {'movimentos': []})
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ChatSession, ChatMessage, ChatContext
+from .models import ChatSession, ChatMessage, ChatContext, ProcessAnalysis, AnalysisJob
 
 
 @admin.register(ChatSession)
@@ -30,4 +30,22 @@ class ChatContextAdmin(admin.ModelAdmin):
     list_filter = ['created_at', 'updated_at']
     search_fields = ['session__user__email', 'session__title']
     readonly_fields = ['created_at', 'updated_at']
-    ordering = ['-updated_at']
\ No newline at end of file
+    ordering = ['-updated_at']
+
+
+@admin.register(ProcessAnalysis)
+class ProcessAnalysisAdmin(admin.ModelAdmin):
+    list_display = ['id', 'process', 'model_name', 'prompt_version', 'created_at']
+    list_filter = ['model_name', 'prompt_version', 'created_at']
+    search_fields = ['process__process_number']
+    readonly_fields = ['content_hash', 'created_at']
+    ordering = ['-created_at']
+
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'process', 'status', 'attempts', 'run_after', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['user__email', 'process__process_number']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
+    ordering = ['-created_at']
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from chat.services import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa os jobs de análise de processos pendentes (inclusive retentativas e jobs abandonados). '
+        'Pode rodar como worker dedicado ou agendado com --once, complementando o pool da aplicação.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Esvazia a fila uma vez e encerra')
+        parser.add_argument('--interval', type=float, default=5, help='Pausa (segundos) entre verificações da fila')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            executed = run_pending_jobs()
+            if executed:
+                self.stdout.write(f'{executed} job(s) de análise executado(s)')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
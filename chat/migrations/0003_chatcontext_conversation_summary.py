@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_chatsession_chatsession_user_active_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatcontext',
+            name='conversation_summary',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='chatcontext',
+            name='summary_last_message_id',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
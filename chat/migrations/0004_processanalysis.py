@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_chatcontext_conversation_summary'),
+        ('processes', '0006_processsearch_search_user_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('prompt_version', models.CharField(max_length=20)),
+                ('model_name', models.CharField(max_length=100)),
+                ('analysis', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('process', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analyses', to='processes.processdata')),
+            ],
+            options={
+                'verbose_name': 'Análise de Processo',
+                'verbose_name_plural': 'Análises de Processos',
+                'constraints': [models.UniqueConstraint(fields=('process', 'content_hash', 'prompt_version', 'model_name'), name='unique_process_analysis')],
+            },
+        ),
+    ]
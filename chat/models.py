@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from processes.models import ProcessData
 
@@ -18,6 +19,14 @@ class ChatSession(models.Model):
     
     class Meta:
         ordering = ['-updated_at']
+        # Sessões ativas do usuário (get_chat_sessions): índice parcial, só com as ativas
+        indexes = [
+            models.Index(
+                fields=['user', '-updated_at'],
+                condition=models.Q(is_active=True),
+                name='chatsession_user_active_idx'
+            ),
+        ]
         verbose_name = 'Sessão de Chat'
         verbose_name_plural = 'Sessões de Chat'
     
@@ -59,6 +68,9 @@ class ChatContext(models.Model):
     legal_analysis = models.TextField(blank=True)
     key_points = models.JSONField(default=list, blank=True)
     recommendations = models.TextField(blank=True)
+    # Resumo incremental das mensagens que já não cabem no histórico do prompt
+    conversation_summary = models.TextField(blank=True)
+    summary_last_message_id = models.BigIntegerField(default=0)  # Última mensagem incorporada ao resumo
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -67,4 +79,76 @@ class ChatContext(models.Model):
         verbose_name_plural = 'Contextos do Chat'
     
     def __str__(self):
-        return f"Contexto - {self.session}"
\ No newline at end of file
+        return f"Contexto - {self.session}"
+
+class ProcessAnalysis(models.Model):
+    """
+    Análise de processo gerada pela IA, reaproveitada enquanto os dados enviados ao modelo não mudam
+    
+    A chave é o hash do conteúdo analisado (processo, partes e movimentações),
+    a versão do prompt e o modelo: qualquer mudança nas movimentações gera
+    um novo hash e, portanto, uma nova análise.
+    """
+    process = models.ForeignKey(ProcessData, on_delete=models.CASCADE, related_name='analyses')
+    content_hash = models.CharField(max_length=64)
+    prompt_version = models.CharField(max_length=20)
+    model_name = models.CharField(max_length=100)
+    analysis = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['process', 'content_hash', 'prompt_version', 'model_name'],
+                name='unique_process_analysis'
+            ),
+        ]
+        verbose_name = 'Análise de Processo'
+        verbose_name_plural = 'Análises de Processos'
+    
+    def __str__(self):
+        return f"Análise - {self.process.process_number} ({self.model_name}, v{self.prompt_version})"
+
+
+class AnalysisJob(models.Model):
+    """
+    Análise de processo enfileirada, executada fora da requisição (chat.services.analysis_jobs)
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUSES = [
+        (STATUS_QUEUED, 'Na fila'),
+        (STATUS_RUNNING, 'Em execução'),
+        (STATUS_SUCCEEDED, 'Concluída'),
+        (STATUS_FAILED, 'Falhou'),
+    ]
+    ACTIVE_STATUSES = [STATUS_QUEUED, STATUS_RUNNING]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='analysis_jobs')
+    process = models.ForeignKey(ProcessData, on_delete=models.CASCADE, related_name='analysis_jobs')
+    status = models.CharField(max_length=20, choices=STATUSES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)  # Próxima tentativa (backoff)
+    result = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Próximo job da fila: índice parcial, só com os ativos
+            models.Index(
+                fields=['status', 'run_after'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='analysisjob_queue_idx'
+            ),
+        ]
+        verbose_name = 'Job de Análise'
+        verbose_name_plural = 'Jobs de Análise'
+    
+    def __str__(self):
+        return f"Análise {self.process.process_number} - {self.get_status_display()}"
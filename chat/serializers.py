@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import ChatSession, ChatMessage, ChatContext
+from .models import ChatSession, ChatMessage, ChatContext, AnalysisJob
 from processes.serializers import ProcessDataSerializer
 
 
@@ -78,5 +78,17 @@ class ChatResponseSerializer(serializers.Serializer):
     suggestions = serializers.ListField(child=serializers.CharField(), required=False)
 
 
-
-
+class AnalysisJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer para jobs de análise de processos
+    """
+    job_id = serializers.IntegerField(source='id', read_only=True)
+    analysis = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = AnalysisJob
+        fields = ['job_id', 'process_id', 'status', 'attempts', 'analysis', 'error', 'created_at', 'finished_at']
+        read_only_fields = fields
+    
+    def get_analysis(self, obj):
+        return obj.result if obj.status == AnalysisJob.STATUS_SUCCEEDED else None
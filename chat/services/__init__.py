@@ -1,7 +1,22 @@
-from .gemini_service import GeminiService
-
-__all__ = ['GeminiService']
-
-
-
+from .gemini_service import ANALYSIS_PROMPT_VERSION, GeminiService
+from .gemini_client import get_generative_model, reset_gemini_clients
+from .suggestions import SuggestionsTask, normalize_suggestions, suggestions_cache_key
+from .prompt_builder import PromptBuilder
+from .process_digest import build_process_digest, get_process_digest
+from .tokens import estimate_tokens
+from .analysis_jobs import (
+    analysis_cache_key, build_analysis_data, check_queue, enqueue_analysis, get_saved_analysis, run_pending_jobs,
+    start_queue_sweeper
+)
+from .conversation import load_conversation, schedule_summary_update, update_conversation_summary
 
+__all__ = [
+    'ANALYSIS_PROMPT_VERSION', 'GeminiService',
+    'get_generative_model', 'reset_gemini_clients',
+    'SuggestionsTask', 'normalize_suggestions', 'suggestions_cache_key',
+    'PromptBuilder', 'estimate_tokens',
+    'build_process_digest', 'get_process_digest',
+    'analysis_cache_key', 'build_analysis_data', 'check_queue', 'enqueue_analysis', 'get_saved_analysis',
+    'run_pending_jobs', 'start_queue_sweeper',
+    'load_conversation', 'schedule_summary_update', 'update_conversation_summary',
+]
@@ -0,0 +1,294 @@
+"""
+Fila de análises de processos pela IA, persistida no banco (chat.models.AnalysisJob).
+
+A requisição apenas cria o job e retorna; os jobs são executados no pool
+'analysis' (BACKGROUND_POOL_WORKERS), de tamanho limitado, para que
+chamadas longas ao Gemini não ocupem as threads que atendem a API. Cada
+job é reservado com um UPDATE condicional, então vários workers (threads,
+processos ou o comando process_analysis_jobs) podem consumir a mesma fila.
+Falhas são repetidas com backoff exponencial e o usuário recebe uma
+notificação ao final.
+
+Retentativas agendadas e jobs de um worker que parou não dependem de um
+novo enfileiramento: cada worker do gunicorn verifica a fila a cada
+CHAT_ANALYSIS_SWEEP_INTERVAL segundos (start_queue_sweeper).
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from cloudpharma_backend import background
+from notifications.models import Notification
+from ..models import AnalysisJob, ProcessAnalysis
+from .gemini_service import ANALYSIS_PROMPT_VERSION, GeminiService
+from .process_digest import get_process_digest
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_POOL = 'analysis'
+
+_sweeper_pid = None
+_sweeper_lock = threading.Lock()
+
+
+def build_analysis_data(process):
+    """
+    Dados do processo enviados para análise
+    """
+    return {
+        'process_number': process.process_number,
+        'court_name': process.court_name,
+        'case_class': process.case_class,
+        'subject': process.subject,
+        'status': process.status,
+        'value': process.value,
+        'distribution_date': process.distribution_date,
+        'parties': list(process.parties.values('name', 'party_type', 'document')),
+        'movements': list(process.movements.values('description', 'date', 'movement_type').order_by('-date', '-id'))
+    }
+
+
+def analysis_cache_key(process, process_data):
+    """
+    Chave da análise salva: hash do conteúdo, versão do prompt e modelo
+    """
+    canonical = json.dumps(process_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return {
+        'process': process,
+        'content_hash': hashlib.sha256(canonical.encode('utf-8')).hexdigest(),
+        'prompt_version': ANALYSIS_PROMPT_VERSION,
+        'model_name': settings.GEMINI_MODEL
+    }
+
+
+def get_saved_analysis(cache_key):
+    """
+    Retorna o texto da análise já gerada para a chave, ou None
+    """
+    return ProcessAnalysis.objects.filter(**cache_key).values_list('analysis', flat=True).first()
+
+
+def save_process_analysis(cache_key, analysis: str):
+    """
+    Salva a análise e descarta as anteriores do processo, geradas para um conteúdo que já mudou
+    """
+    try:
+        with transaction.atomic():
+            ProcessAnalysis.objects.update_or_create(**cache_key, defaults={'analysis': analysis})
+            ProcessAnalysis.objects.filter(
+                process=cache_key['process'],
+                prompt_version=cache_key['prompt_version'],
+                model_name=cache_key['model_name']
+            ).exclude(content_hash=cache_key['content_hash']).delete()
+    except Exception as e:
+        # A análise é entregue mesmo que não possa ser reaproveitada
+        logger.error(f"Erro ao salvar análise do processo {cache_key['process'].id}: {str(e)}")
+
+
+def enqueue_analysis(user, process):
+    """
+    Enfileira a análise do processo para o usuário
+
+    Um job ativo do mesmo usuário para o mesmo processo é reaproveitado.
+
+    Returns:
+        O job, ou None se o usuário atingiu CHAT_ANALYSIS_MAX_ACTIVE_JOBS_PER_USER
+    """
+    with transaction.atomic():
+        # Serializa os enfileiramentos do usuário: sem o lock, requisições simultâneas passariam do limite
+        get_user_model().objects.select_for_update().filter(pk=user.pk).first()
+        active_jobs = AnalysisJob.objects.filter(user=user, status__in=AnalysisJob.ACTIVE_STATUSES)
+        job = active_jobs.filter(process=process).first()
+        if job is not None:
+            return job
+        if active_jobs.count() >= settings.CHAT_ANALYSIS_MAX_ACTIVE_JOBS_PER_USER:
+            return None
+        job = AnalysisJob.objects.create(user=user, process=process)
+        background.submit_to_pool(ANALYSIS_POOL, run_pending_jobs)
+    return job
+
+
+def run_pending_jobs():
+    """
+    Executa os jobs disponíveis da fila até esvaziá-la
+
+    Returns:
+        Quantidade de jobs executados
+    """
+    _fail_abandoned_jobs()
+    executed = 0
+    while True:
+        job = _claim_next_job()
+        if job is None:
+            return executed
+        _run_job(job)
+        executed += 1
+
+
+def start_queue_sweeper():
+    """
+    Inicia, uma vez por processo, a thread que verifica a fila periodicamente
+
+    Chamado por cada worker do gunicorn (post_worker_init em gunicorn.conf.py).
+    """
+    global _sweeper_pid
+    with _sweeper_lock:
+        if _sweeper_pid == os.getpid():
+            return
+        _sweeper_pid = os.getpid()
+    threading.Thread(target=_sweep_queue, name='analysis-sweeper', daemon=True).start()
+
+
+def _sweep_queue():
+    while True:
+        time.sleep(settings.CHAT_ANALYSIS_SWEEP_INTERVAL)
+        close_old_connections()
+        try:
+            check_queue()
+        except Exception as e:
+            logger.error(f"Erro ao verificar a fila de análises: {str(e)}")
+        finally:
+            connections.close_all()
+
+
+def check_queue():
+    """
+    Agenda run_pending_jobs no pool se há jobs disponíveis ou abandonados na fila
+
+    Returns:
+        True se a execução foi agendada
+    """
+    if not AnalysisJob.objects.filter(_claimable() | _abandoned()).exists():
+        return False
+    background.submit_to_pool(ANALYSIS_POOL, run_pending_jobs)
+    return True
+
+
+def _stale_running():
+    stale = timezone.now() - timedelta(seconds=settings.CHAT_ANALYSIS_JOB_TIMEOUT)
+    # Jobs "em execução" há mais que o timeout pertenciam a um worker que parou
+    return Q(status=AnalysisJob.STATUS_RUNNING, started_at__lt=stale)
+
+
+def _claimable():
+    return (
+        Q(status=AnalysisJob.STATUS_QUEUED, run_after__lte=timezone.now())
+        | _stale_running() & Q(attempts__lt=settings.CHAT_ANALYSIS_MAX_ATTEMPTS)
+    )
+
+
+def _abandoned():
+    # Abandonados na última tentativa: não são retomados
+    return _stale_running() & Q(attempts__gte=settings.CHAT_ANALYSIS_MAX_ATTEMPTS)
+
+
+def _fail_abandoned_jobs():
+    """
+    Marca como falhos os jobs abandonados após a última tentativa e avisa os usuários
+    """
+    for job in AnalysisJob.objects.filter(_abandoned()).select_related('process'):
+        failed = AnalysisJob.objects.filter(_abandoned(), pk=job.pk).update(
+            status=AnalysisJob.STATUS_FAILED,
+            error='Tempo limite excedido na última tentativa',
+            finished_at=timezone.now()
+        )
+        if failed:
+            _notify(job, succeeded=False)
+
+
+def _claim_next_job():
+    """
+    Reserva o próximo job disponível; a condição repetida no UPDATE impede que dois workers reservem o mesmo
+    """
+    candidates = AnalysisJob.objects.filter(_claimable()).order_by('run_after').values_list('id', flat=True)[:10]
+    for job_id in candidates:
+        claimed = AnalysisJob.objects.filter(_claimable(), pk=job_id).update(
+            status=AnalysisJob.STATUS_RUNNING,
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1
+        )
+        if claimed:
+            return AnalysisJob.objects.select_related('process').get(pk=job_id)
+    return None
+
+
+def _run_job(job):
+    try:
+        process_data = build_analysis_data(job.process)
+        cache_key = analysis_cache_key(job.process, process_data)
+        analysis = get_saved_analysis(cache_key)
+        if analysis is None:
+            # O prompt leva o resumo compacto, não os dados completos
+            digest = get_process_digest(cache_key['content_hash'], process_data)
+            response = GeminiService().analyze_process(digest)
+            if not response.get('success', True):
+                raise RuntimeError(response.get('error') or 'Falha na análise')
+            analysis = response.get('analysis', '')
+            save_process_analysis(cache_key, analysis)
+    except Exception as e:
+        logger.warning(f"Erro no job de análise {job.id} (tentativa {job.attempts}): {str(e)}")
+        _retry_or_fail(job, str(e))
+        return
+
+    AnalysisJob.objects.filter(pk=job.pk).update(
+        status=AnalysisJob.STATUS_SUCCEEDED,
+        result=analysis,
+        error='',
+        finished_at=timezone.now()
+    )
+    _notify(job, succeeded=True)
+
+
+def _retry_or_fail(job, error: str):
+    if job.attempts < settings.CHAT_ANALYSIS_MAX_ATTEMPTS:
+        delay = settings.CHAT_ANALYSIS_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+        AnalysisJob.objects.filter(pk=job.pk).update(
+            status=AnalysisJob.STATUS_QUEUED,
+            run_after=timezone.now() + timedelta(seconds=delay),
+            error=error
+        )
+        _schedule_retry(delay)
+        return
+
+    AnalysisJob.objects.filter(pk=job.pk).update(
+        status=AnalysisJob.STATUS_FAILED,
+        error=error,
+        finished_at=timezone.now()
+    )
+    _notify(job, succeeded=False)
+
+
+def _schedule_retry(delay):
+    if settings.BACKGROUND_TASKS_SYNC:
+        # Execução síncrona (testes): a próxima tentativa fica para run_pending_jobs
+        return
+    timer = threading.Timer(delay, background.submit_to_pool, args=(ANALYSIS_POOL, run_pending_jobs))
+    timer.daemon = True
+    timer.start()
+
+
+def _notify(job, succeeded: bool):
+    """
+    Avisa o usuário (notificação e stream SSE) do fim da análise
+    """
+    number = job.process.process_number
+    Notification.objects.create(
+        user_id=job.user_id,
+        title='Análise do processo concluída' if succeeded else 'Não foi possível analisar o processo',
+        message=(
+            f"A análise do processo {number} está pronta." if succeeded
+            else f"A análise do processo {number} falhou após {job.attempts} tentativas. Tente novamente mais tarde."
+        ),
+        notification_type='success' if succeeded else 'error',
+        expires_at=timezone.now() + timedelta(days=30)
+    )
@@ -0,0 +1,106 @@
+import logging
+from typing import Any, Dict, List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from cloudpharma_backend import background
+from ..models import ChatContext, ChatMessage
+from .gemini_service import GeminiService
+from .prompt_builder import format_message
+from .tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Pool de segundo plano dos resumos (chamadas ao Gemini), separado das tarefas curtas do pool padrão
+SUMMARY_POOL = 'chat'
+
+
+def _split_by_budget(messages: List[Dict[str, Any]], budget: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Separa mensagens (da mais recente para a mais antiga) entre as que cabem no orçamento e as excedentes
+
+    Returns:
+        Tupla (mantidas, excedentes), ambas da mais antiga para a mais recente
+    """
+    kept = []
+    for index, message in enumerate(messages):
+        cost = estimate_tokens(format_message(message))
+        if cost > budget:
+            return list(reversed(kept)), list(reversed(messages[index:]))
+        kept.append(message)
+        budget -= cost
+    return list(reversed(kept)), []
+
+
+def load_conversation(session, exclude_message_id=None) -> Dict[str, Any]:
+    """
+    Carrega o resumo da conversa e apenas as mensagens recentes que cabem em CHAT_HISTORY_TOKEN_BUDGET
+
+    São lidas no máximo CHAT_HISTORY_FETCH_LIMIT mensagens, todas posteriores
+    ao trecho já resumido, independentemente do tamanho da sessão.
+
+    Returns:
+        Dict com summary, messages (da mais antiga para a mais recente) e
+        overflow (mensagens lidas que não couberam no histórico e ainda não foram resumidas)
+    """
+    context = ChatContext.objects.filter(session=session).values(
+        'conversation_summary', 'summary_last_message_id'
+    ).first() or {'conversation_summary': '', 'summary_last_message_id': 0}
+
+    recent = ChatMessage.objects.filter(
+        session=session,
+        id__gt=context['summary_last_message_id']
+    )
+    if exclude_message_id is not None:
+        recent = recent.exclude(id=exclude_message_id)
+    recent = list(recent.order_by('-id').values('id', 'message_type', 'content')[:settings.CHAT_HISTORY_FETCH_LIMIT])
+
+    messages, overflow = _split_by_budget(recent, settings.CHAT_HISTORY_TOKEN_BUDGET)
+    return {
+        'summary': context['conversation_summary'],
+        'messages': messages,
+        'overflow': bool(overflow)
+    }
+
+
+def schedule_summary_update(session_id, conversation: Dict[str, Any]):
+    """
+    Agenda a atualização do resumo quando o histórico excedeu o orçamento
+    """
+    if conversation['overflow']:
+        background.submit_to_pool(SUMMARY_POOL, update_conversation_summary, session_id)
+
+
+def update_conversation_summary(session_id):
+    """
+    Incorpora ao resumo da conversa as mensagens que não cabem mais no histórico
+
+    Apenas as mensagens excedentes são enviadas ao modelo, junto com o resumo
+    anterior, e o ponto até onde a conversa foi resumida avança. Em sessões
+    antigas, mensagens além de CHAT_HISTORY_FETCH_LIMIT não lidas ficam fora
+    do resumo.
+    """
+    lock_key = f"chat_summary_lock_{session_id}"
+    if not cache.add(lock_key, True, settings.CHAT_SUMMARY_LOCK_TIMEOUT):
+        # Outra atualização do resumo desta sessão em andamento
+        return
+
+    try:
+        context, _ = ChatContext.objects.get_or_create(session_id=session_id)
+        recent = list(
+            ChatMessage.objects.filter(session_id=session_id, id__gt=context.summary_last_message_id)
+            .order_by('-id')
+            .values('id', 'message_type', 'content')[:settings.CHAT_HISTORY_FETCH_LIMIT]
+        )
+        _, overflow = _split_by_budget(recent, settings.CHAT_HISTORY_TOKEN_BUDGET)
+        if not overflow:
+            return
+
+        summary = GeminiService().summarize_conversation(context.conversation_summary, overflow)
+        ChatContext.objects.filter(pk=context.pk).update(
+            conversation_summary=summary,
+            summary_last_message_id=overflow[-1]['id']
+        )
+    finally:
+        cache.delete(lock_key)
@@ -0,0 +1,60 @@
+"""
+Registro dos clientes do Gemini, compartilhados pelas requisições de um processo.
+
+genai.configure e a criação dos GenerativeModel acontecem uma única vez por
+processo e modelo, na primeira utilização, e não a cada GeminiService(). O
+registro guarda o pid em que foi configurado: com preload_app=True o master
+do gunicorn pode importar este módulo antes do fork, e cada worker refaz a
+configuração em vez de herdar conexões (gRPC) abertas no master. Reusar o
+mesmo cliente mantém a conexão com o endpoint do Gemini aberta entre as
+requisições.
+"""
+import os
+import threading
+
+import google.generativeai as genai
+from django.conf import settings
+
+_lock = threading.Lock()
+_configured = None  # (pid, api_key, transport)
+_models = {}
+
+
+def _configure_if_needed():
+    global _configured, _models
+    state = (os.getpid(), settings.GEMINI_API_KEY, settings.GEMINI_TRANSPORT or None)
+    if _configured == state:
+        return
+
+    with _lock:
+        if _configured == state:
+            return
+        pid, api_key, transport = state
+        genai.configure(api_key=api_key, transport=transport)
+        _models = {}
+        _configured = state
+
+
+def get_generative_model(model_name: str):
+    """
+    Retorna o GenerativeModel do processo atual para o modelo informado
+    """
+    _configure_if_needed()
+    model = _models.get(model_name)
+    if model is None:
+        with _lock:
+            model = _models.get(model_name)
+            if model is None:
+                model = genai.GenerativeModel(model_name)
+                _models[model_name] = model
+    return model
+
+
+def reset_gemini_clients():
+    """
+    Descarta a configuração e os modelos (ex: testes que substituem o genai)
+    """
+    global _configured, _models
+    with _lock:
+        _configured = None
+        _models = {}
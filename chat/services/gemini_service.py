@@ -1,11 +1,18 @@
-import google.generativeai as genai
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 import logging
 import json
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any
+
+from .gemini_client import get_generative_model
+from .prompt_builder import PromptBuilder, format_message
+from .tokens import estimate_tokens, truncate_to_tokens
 
 logger = logging.getLogger(__name__)
 
+# Incrementar ao alterar _build_process_analysis_prompt: invalida as análises salvas (chat.models.ProcessAnalysis)
+ANALYSIS_PROMPT_VERSION = '2'
+
 
 class GeminiService:
     """
@@ -19,16 +26,16 @@ class GeminiService:
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY não configurada nas configurações do Django")
         
-        # Configurar a API do Gemini
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel(self.model_name)
+        # Cliente configurado uma vez por processo e compartilhado entre as requisições
+        self.model = get_generative_model(self.model_name)
     
     def generate_response(
         self, 
         user_message: str, 
         chat_history: List[Dict[str, str]] = None,
         process_context: Dict[str, Any] = None,
-        system_prompt: str = None
+        system_prompt: str = None,
+        conversation_summary: str = ''
     ) -> Dict[str, Any]:
         """
         Gera uma resposta da IA baseada na mensagem do usuário e contexto
@@ -38,23 +45,15 @@ class GeminiService:
             chat_history: Histórico de mensagens da conversa
             process_context: Contexto específico do processo (se houver)
             system_prompt: Prompt do sistema personalizado
+            conversation_summary: Resumo das mensagens anteriores ao histórico
         
         Returns:
             Dict com a resposta da IA e metadados
         """
         try:
-            # Construir o prompt do sistema
-            system_prompt = system_prompt or self._get_default_system_prompt()
-            
-            # Adicionar contexto do processo se disponível
-            if process_context:
-                system_prompt += self._build_process_context_prompt(process_context)
-            
-            # Construir histórico de conversa
-            conversation_history = self._build_conversation_history(chat_history or [])
-            
-            # Construir prompt final
-            full_prompt = f"{system_prompt}\n\n{conversation_history}\nUsuário: {user_message}\nAssistente:"
+            full_prompt = self._build_chat_prompt(
+                user_message, chat_history, process_context, system_prompt, conversation_summary
+            )
             
             # Gerar resposta
             response = self.model.generate_content(full_prompt)
@@ -76,19 +75,64 @@ class GeminiService:
                 'error': str(e)
             }
     
-    def analyze_process(self, process_data: Dict[str, Any]) -> Dict[str, Any]:
+    def stream_response(
+        self, 
+        user_message: str, 
+        chat_history: List[Dict[str, str]] = None,
+        process_context: Dict[str, Any] = None,
+        system_prompt: str = None,
+        conversation_summary: str = ''
+    ) -> Iterator[str]:
+        """
+        Gera a resposta da IA em partes, à medida que o Gemini as produz
+        
+        Erros são propagados ao chamador, que decide o que enviar ao cliente.
+        
+        Yields:
+            Trechos do texto da resposta
+        
+        Returns:
+            Dict com os metadados da resposta (valor de StopIteration)
+        """
+        full_prompt = self._build_chat_prompt(
+            user_message, chat_history, process_context, system_prompt, conversation_summary
+        )
+        response = self.model.generate_content(full_prompt, stream=True)
+        
+        content = ''
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Parte sem texto (ex: apenas metadados de segurança)
+                continue
+            if text:
+                content += text
+                yield text
+        
+        return {
+            'tokens_used': self._estimate_tokens(full_prompt + content),
+            'model_used': self.model_name,
+            'success': True
+        }
+    
+    def analyze_process(self, process_digest: str) -> Dict[str, Any]:
         """
         Analisa um processo jurídico e fornece insights
         
         Args:
-            process_data: Dados do processo
+            process_digest: Resumo textual do processo (ver process_digest.get_process_digest)
         
         Returns:
             Dict com análise do processo
         """
         try:
-            process_prompt = self._build_process_analysis_prompt(process_data)
-            response = self.model.generate_content(process_prompt)
+            process_prompt = self._build_process_analysis_prompt(process_digest)
+            # Abaixo de CHAT_ANALYSIS_JOB_TIMEOUT: uma chamada travada não mantém o job "em execução" até ser retomado
+            response = self.model.generate_content(
+                process_prompt,
+                request_options={'timeout': settings.CHAT_ANALYSIS_REQUEST_TIMEOUT}
+            )
             
             return {
                 'analysis': response.text,
@@ -103,13 +147,19 @@ class GeminiService:
                 'error': str(e)
             }
     
-    def generate_suggestions(self, user_message: str, process_context: Dict[str, Any] = None) -> List[str]:
+    def generate_suggestions(
+        self,
+        user_message: str,
+        process_context: Dict[str, Any] = None,
+        raise_errors: bool = False
+    ) -> List[str]:
         """
         Gera sugestões de perguntas baseadas na mensagem do usuário
         
         Args:
             user_message: Mensagem do usuário
             process_context: Contexto do processo
+            raise_errors: Propaga falhas em vez de retornar lista vazia (para quem guarda o resultado em cache)
         
         Returns:
             Lista de sugestões
@@ -120,7 +170,7 @@ class GeminiService:
             
             Mensagem: {user_message}
             
-            Contexto do processo: {json.dumps(process_context, ensure_ascii=False) if process_context else 'Nenhum'}
+            Contexto do processo: {json.dumps(process_context, ensure_ascii=False, cls=DjangoJSONEncoder) if process_context else 'Nenhum'}
             
             Retorne apenas as sugestões, uma por linha, sem numeração.
             """
@@ -131,9 +181,40 @@ class GeminiService:
             return suggestions[:3]  # Limitar a 3 sugestões
             
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Erro ao gerar sugestões: {str(e)}")
             return []
     
+    def summarize_conversation(self, previous_summary: str, messages: List[Dict[str, str]]) -> str:
+        """
+        Atualiza o resumo da conversa com mensagens que saíram do histórico
+        
+        Args:
+            previous_summary: Resumo atual (pode ser vazio)
+            messages: Mensagens a incorporar, da mais antiga para a mais recente
+        
+        Returns:
+            Novo resumo, limitado a CHAT_SUMMARY_MAX_TOKENS
+        """
+        max_tokens = settings.CHAT_SUMMARY_MAX_TOKENS
+        conversation = ''.join(format_message(message) for message in messages)
+        summary_prompt = f"""
+        Atualize o resumo de uma conversa entre um usuário e uma assistente jurídica.
+        
+        Resumo atual:
+        {previous_summary or 'Nenhum'}
+        
+        Novas mensagens:
+        {conversation}
+        
+        Escreva um único resumo, em português, com os fatos, dúvidas e conclusões
+        relevantes para continuar a conversa, em no máximo {max_tokens * 3 // 4} palavras.
+        """
+        
+        response = self.model.generate_content(summary_prompt)
+        return truncate_to_tokens(response.text.strip(), max_tokens)
+    
     def _get_default_system_prompt(self) -> str:
         """Retorna o prompt padrão do sistema"""
         return """
@@ -153,6 +234,24 @@ class GeminiService:
         - Mantenha um tom profissional mas amigável
         """
     
+    def _build_chat_prompt(
+        self,
+        user_message: str,
+        chat_history: List[Dict[str, str]] = None,
+        process_context: Dict[str, Any] = None,
+        system_prompt: str = None,
+        conversation_summary: str = ''
+    ) -> str:
+        """Constrói o prompt completo de uma mensagem do chat, dentro do orçamento de tokens"""
+        # Construir o prompt do sistema
+        system_prompt = system_prompt or self._get_default_system_prompt()
+        
+        # Adicionar contexto do processo se disponível
+        if process_context:
+            system_prompt += self._build_process_context_prompt(process_context)
+        
+        return PromptBuilder().build(system_prompt, user_message, chat_history, conversation_summary)
+    
     def _build_process_context_prompt(self, process_context: Dict[str, Any]) -> str:
         """Constrói prompt com contexto do processo"""
         context_parts = []
@@ -170,7 +269,7 @@ class GeminiService:
             context_parts.append(f"Assunto: {process_context['subject']}")
         
         if process_context.get('parties'):
-            parties_text = ", ".join([f"{p.get('name', 'N/A')} ({p.get('role', 'N/A')})" for p in process_context['parties']])
+            parties_text = ", ".join([f"{p.get('name', 'N/A')} ({p.get('party_type', 'N/A')})" for p in process_context['parties']])
             context_parts.append(f"Partes envolvidas: {parties_text}")
         
         if process_context.get('movements'):
@@ -183,26 +282,13 @@ class GeminiService:
         
         return ""
     
-    def _build_conversation_history(self, chat_history: List[Dict[str, str]]) -> str:
-        """Constrói histórico de conversa para o prompt"""
-        if not chat_history:
-            return ""
-        
-        history_text = ""
-        for msg in chat_history[-10:]:  # Últimas 10 mensagens
-            role = "Usuário" if msg.get('message_type') == 'user' else "Assistente"
-            content = msg.get('content', '')
-            history_text += f"{role}: {content}\n"
-        
-        return f"HISTÓRICO DA CONVERSA:\n{history_text}"
-    
-    def _build_process_analysis_prompt(self, process_data: Dict[str, Any]) -> str:
+    def _build_process_analysis_prompt(self, process_digest: str) -> str:
         """Constrói prompt para análise de processo"""
         return f"""
         Analise o seguinte processo jurídico e forneça insights relevantes:
 
         DADOS DO PROCESSO:
-        {json.dumps(process_data, ensure_ascii=False, indent=2)}
+        {process_digest}
 
         Forneça:
         1. Resumo do caso
@@ -216,8 +302,7 @@ class GeminiService:
     
     def _estimate_tokens(self, text: str) -> int:
         """Estima o número de tokens usados (aproximação)"""
-        # Aproximação: 1 token ≈ 4 caracteres para português
-        return len(text) // 4
+        return estimate_tokens(text)
 
 
 
@@ -0,0 +1,179 @@
+"""
+Resumo textual compacto de um processo para prompts da IA.
+
+Processos longos acumulam centenas de movimentações, muitas repetidas
+(ex: sequências de "Conclusos para despacho"). Em vez do JSON completo, o
+resumo traz os dados principais, as partes agrupadas por tipo e as
+movimentações em ordem cronológica, com repetições consecutivas reunidas em
+uma linha. Acima de CHAT_PROCESS_DIGEST_MAX_TOKENS são mantidas a primeira
+movimentação e as mais recentes.
+
+O resumo depende apenas do conteúdo do processo, então fica em cache pelo
+hash do conteúdo (a revisão do processo): uma nova movimentação gera uma
+nova chave.
+"""
+import re
+from datetime import datetime
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from processes.models import ProcessParty
+from .tokens import estimate_tokens, truncate_to_tokens
+
+# Incrementar ao alterar o formato do resumo: invalida os resumos em cache
+DIGEST_VERSION = '1'
+
+# Partes listadas por tipo e tokens por movimentação, para que nenhum item ocupe o orçamento sozinho
+MAX_PARTIES_PER_TYPE = 10
+MAX_MOVEMENT_TOKENS = 60
+
+_PARTY_TYPE_LABELS = dict(ProcessParty.PARTY_TYPES)
+
+
+def digest_cache_key(content_hash: str, max_tokens: int) -> str:
+    return f"process_digest_{DIGEST_VERSION}_{max_tokens}_{content_hash}"
+
+
+def get_process_digest(content_hash: str, process_data: Dict[str, Any]) -> str:
+    """
+    Resumo do processo, em cache pelo hash do conteúdo (ver analysis_cache_key)
+    """
+    max_tokens = settings.CHAT_PROCESS_DIGEST_MAX_TOKENS
+    key = digest_cache_key(content_hash, max_tokens)
+    digest = cache.get(key)
+    if digest is None:
+        digest = build_process_digest(process_data, max_tokens)
+        cache.set(key, digest, settings.CHAT_PROCESS_DIGEST_CACHE_TTL)
+    return digest
+
+
+def build_process_digest(process_data: Dict[str, Any], max_tokens: int = None) -> str:
+    """
+    Gera o resumo textual do processo
+
+    Args:
+        process_data: Dados do processo (build_analysis_data), com as movimentações da mais recente para a mais antiga
+        max_tokens: Limite estimado de tokens do resumo (padrão: CHAT_PROCESS_DIGEST_MAX_TOKENS)
+    """
+    if max_tokens is None:
+        max_tokens = settings.CHAT_PROCESS_DIGEST_MAX_TOKENS
+
+    movements = list(reversed(process_data.get('movements') or []))
+    header = _header_lines(process_data, movements)
+    entries = [_format_entry(entry) for entry in _collapse_movements(movements)]
+
+    if entries:
+        header.append(f"Movimentações ({len(movements)}, em ordem cronológica; repetições consecutivas agrupadas):")
+
+    header_text = "\n".join(header)
+    available = max_tokens - estimate_tokens(header_text)
+    lines = _fit_entries(entries, available)
+
+    return truncate_to_tokens("\n".join([header_text] + lines), max_tokens)
+
+
+def _header_lines(process_data: Dict[str, Any], movements: List[Dict[str, Any]]) -> List[str]:
+    lines = []
+    fields = [
+        ('Número', process_data.get('process_number')),
+        ('Tribunal', process_data.get('court_name')),
+        ('Classe', process_data.get('case_class')),
+        ('Assunto', process_data.get('subject')),
+        ('Situação', process_data.get('status')),
+        ('Valor da causa', process_data.get('value')),
+        ('Distribuição', process_data.get('distribution_date')),
+    ]
+    for label, value in fields:
+        if value not in (None, ''):
+            lines.append(f"{label}: {_format_date(value)}")
+
+    if movements:
+        lines.append(
+            f"Primeira movimentação: {_format_date(movements[0].get('date'))}; "
+            f"última: {_format_date(movements[-1].get('date'))}"
+        )
+
+    parties_by_type = {}
+    for party in process_data.get('parties') or []:
+        parties_by_type.setdefault(party.get('party_type'), []).append(party.get('name') or 'N/A')
+    for party_type, names in parties_by_type.items():
+        label = _PARTY_TYPE_LABELS.get(party_type, party_type or 'Parte')
+        text = ", ".join(names[:MAX_PARTIES_PER_TYPE])
+        if len(names) > MAX_PARTIES_PER_TYPE:
+            text += f" e mais {len(names) - MAX_PARTIES_PER_TYPE}"
+        lines.append(f"{label}: {text}")
+
+    return lines
+
+
+def _normalize(description: str) -> str:
+    return re.sub(r'\s+', ' ', description or '').strip().rstrip('.;').casefold()
+
+
+def _collapse_movements(movements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Reúne movimentações consecutivas com a mesma descrição em uma entrada com contagem e período
+    """
+    entries = []
+    for movement in movements:
+        description = re.sub(r'\s+', ' ', movement.get('description') or movement.get('movement_type') or '').strip()
+        key = _normalize(description)
+        date = movement.get('date')
+        if entries and entries[-1]['key'] == key:
+            entries[-1]['count'] += 1
+            entries[-1]['last_date'] = date
+        else:
+            entries.append({'key': key, 'description': description, 'first_date': date, 'last_date': date, 'count': 1})
+    return entries
+
+
+def _format_entry(entry: Dict[str, Any]) -> str:
+    description = truncate_to_tokens(entry['description'], MAX_MOVEMENT_TOKENS) or 'N/A'
+    first_date = _format_date(entry['first_date'])
+    if entry['count'] == 1:
+        return f"- {first_date} {description}"
+    last_date = _format_date(entry['last_date'])
+    period = first_date if first_date == last_date else f"{first_date} a {last_date}"
+    return f"- {period} {description} ({entry['count']}x)"
+
+
+def _fit_entries(entries: List[str], available: int) -> List[str]:
+    """
+    Mantém todas as entradas se couberem; senão a primeira, as mais recentes e um aviso das omitidas
+    """
+    if sum(estimate_tokens(line) for line in entries) <= available:
+        return entries
+
+    first = entries[0]
+    # Reserva para o aviso de omissão
+    available -= estimate_tokens(first) + estimate_tokens(_omitted_line(len(entries)))
+    recent = []
+    for line in reversed(entries[1:]):
+        cost = estimate_tokens(line)
+        if cost > available:
+            break
+        recent.append(line)
+        available -= cost
+    recent.reverse()
+
+    omitted = len(entries) - 1 - len(recent)
+    return [first, _omitted_line(omitted)] + recent if omitted else [first] + recent
+
+
+def _omitted_line(count: int) -> str:
+    return f"- ... {count} entradas intermediárias omitidas"
+
+
+def _format_date(value) -> str:
+    if value is None:
+        return 's/d'
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%d/%m/%Y')
+    if hasattr(value, 'strftime'):
+        return value.strftime('%d/%m/%Y')
+    return str(value)
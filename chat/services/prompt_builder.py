@@ -0,0 +1,61 @@
+from typing import Dict, List
+
+from django.conf import settings
+
+from .tokens import estimate_tokens
+
+
+def format_message(message: Dict[str, str]) -> str:
+    """
+    Formata uma mensagem do histórico como linha do prompt
+    """
+    role = "Usuário" if message.get('message_type') == 'user' else "Assistente"
+    return f"{role}: {message.get('content', '')}\n"
+
+
+class PromptBuilder:
+    """
+    Monta o prompt do chat dentro de um orçamento de tokens
+
+    O prompt do sistema, o resumo da conversa e a mensagem atual entram
+    sempre; o histórico recebe o que sobra do orçamento, da mensagem mais
+    recente para a mais antiga. omitted indica quantas mensagens do
+    histórico ficaram de fora no último build().
+    """
+
+    def __init__(self, token_budget: int = None):
+        self.token_budget = token_budget or settings.CHAT_PROMPT_TOKEN_BUDGET
+        self.omitted = 0
+
+    def build(
+        self,
+        system_prompt: str,
+        user_message: str,
+        chat_history: List[Dict[str, str]] = None,
+        conversation_summary: str = ''
+    ) -> str:
+        """
+        Args:
+            system_prompt: Prompt do sistema (já com o contexto do processo)
+            user_message: Mensagem atual do usuário
+            chat_history: Mensagens anteriores, da mais antiga para a mais recente
+            conversation_summary: Resumo das mensagens anteriores ao histórico
+        """
+        chat_history = chat_history or []
+        summary_text = f"RESUMO DA CONVERSA ATÉ AQUI:\n{conversation_summary}\n\n" if conversation_summary else ""
+        history_header = "HISTÓRICO DA CONVERSA:\n"
+        tail = f"\nUsuário: {user_message}\nAssistente:"
+
+        remaining = self.token_budget - estimate_tokens(system_prompt + summary_text + history_header + tail)
+        lines = []
+        for message in reversed(chat_history):
+            line = format_message(message)
+            cost = estimate_tokens(line)
+            if cost > remaining:
+                break
+            lines.append(line)
+            remaining -= cost
+
+        self.omitted = len(chat_history) - len(lines)
+        history_text = history_header + ''.join(reversed(lines)) if lines else ""
+        return f"{system_prompt}\n\n{summary_text}{history_text}{tail}"
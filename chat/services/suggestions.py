@@ -0,0 +1,77 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+MAX_SUGGESTIONS = 3
+
+_THREAD_PREFIX = 'chat-suggestions'
+
+
+def suggestions_cache_key(message_id) -> str:
+    return f"chat_suggestions_{message_id}"
+
+
+def normalize_suggestions(value) -> List[str]:
+    """
+    Garante uma lista de até MAX_SUGGESTIONS textos não vazios
+    """
+    if not isinstance(value, (list, tuple)):
+        return []
+    return [item.strip() for item in value if isinstance(item, str) and item.strip()][:MAX_SUGGESTIONS]
+
+
+class SuggestionsTask:
+    """
+    Geração das sugestões de perguntas em paralelo com a resposta principal
+
+    A chamada ao Gemini começa na criação da tarefa, em uma thread própria.
+    result() aguarda no máximo CHAT_SUGGESTIONS_TIMEOUT segundos após a
+    resposta; se o prazo esgotar, as sugestões são omitidas e, quando
+    ficarem prontas, salvas no cache da mensagem para o endpoint sob demanda.
+    """
+
+    def __init__(self, gemini_service, user_message: str, process_context: Dict[str, Any] = None):
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=_THREAD_PREFIX)
+        # Falhas chegam como exceção em result(): uma lista vazia por erro não deve ir para o cache
+        self._future = executor.submit(gemini_service.generate_suggestions, user_message, process_context, raise_errors=True)
+        # A thread termina sozinha após a chamada; não há o que aguardar aqui
+        executor.shutdown(wait=False)
+
+    def result(self, message_id) -> Dict[str, Any]:
+        """
+        Retorna {'suggestions': [...], 'pending': bool} para a mensagem da IA
+        """
+        try:
+            suggestions = normalize_suggestions(self._future.result(timeout=settings.CHAT_SUGGESTIONS_TIMEOUT))
+        except TimeoutError:
+            logger.info(f"Sugestões da mensagem {message_id} omitidas: prazo de {settings.CHAT_SUGGESTIONS_TIMEOUT}s esgotado")
+            self._future.add_done_callback(lambda future: self._store_late(future, message_id))
+            return {'suggestions': [], 'pending': True}
+        except Exception as e:
+            logger.error(f"Erro ao gerar sugestões: {str(e)}")
+            return {'suggestions': [], 'pending': False}
+
+        cache.set(suggestions_cache_key(message_id), suggestions, settings.CHAT_SUGGESTIONS_CACHE_TTL)
+        return {'suggestions': suggestions, 'pending': False}
+
+    def _store_late(self, future, message_id):
+        try:
+            if future.exception() is None:
+                cache.set(
+                    suggestions_cache_key(message_id),
+                    normalize_suggestions(future.result()),
+                    settings.CHAT_SUGGESTIONS_CACHE_TTL
+                )
+        except Exception as e:
+            logger.warning(f"Erro ao salvar sugestões da mensagem {message_id}: {str(e)}")
+        finally:
+            if threading.current_thread().name.startswith(_THREAD_PREFIX):
+                # O cache pode usar o banco; a thread da tarefa não deve deixar conexões abertas
+                connections.close_all()
@@ -0,0 +1,45 @@
+import math
+import re
+
+# Palavras (incluindo acentuadas), números e sinais de pontuação
+_TOKEN_PATTERN = re.compile(r"[^\W\d_]+|\d+|[^\w\s]|_", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estima o número de tokens do Gemini sem chamada à API
+
+    Aproxima a segmentação do tokenizador (SentencePiece): palavras são quebradas
+    em subpalavras de ~4 caracteres, cada dígito é um token e cada sinal de
+    pontuação também. Espaços não contam. Mais fiel que len(text) // 4 para
+    textos com números (ex: números de processo) e muita pontuação.
+    """
+    if not text:
+        return 0
+
+    total = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        if piece.isdigit():
+            total += len(piece)
+        elif piece[0].isalpha():
+            total += math.ceil(len(piece) / 4)
+        else:
+            total += 1
+    return total
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Corta o texto (pelo fim) para caber em max_tokens
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low].rstrip()
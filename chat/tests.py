@@ -4,9 +4,18 @@ from rest_framework.test import APITestCase
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from unittest.mock import patch, MagicMock
+from django.core.cache import cache
 import json
+import threading
+import time
 
-from .models import ChatSession, ChatMessage, ChatContext
+from .models import AnalysisJob, ChatSession, ChatMessage, ChatContext, ProcessAnalysis
+from .services import (
+    PromptBuilder, build_process_digest, estimate_tokens, get_process_digest, load_conversation, reset_gemini_clients, run_pending_jobs, schedule_summary_update, update_conversation_summary
+)
+from .services.gemini_client import get_generative_model
+from .services.tokens import truncate_to_tokens
+from notifications.models import Notification
 from processes.models import ProcessData, ProcessParty, ProcessMovement
 
 User = get_user_model()
@@ -312,7 +321,12 @@ class ProcessAnalysisTests(APITestCase):
         self.access_token = str(refresh.access_token)
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
     
-    @patch('chat.views.GeminiService')
+    def _analyze(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/chat/analyze/process/{self.process.id}/')
+    
+    @override_settings(BACKGROUND_TASKS_SYNC=True)
+    @patch('chat.services.analysis_jobs.GeminiService')
     def test_analyze_process(self, mock_gemini_service):
         """Testa análise de processo com IA"""
         # Configurar mock do Gemini
@@ -323,13 +337,703 @@ class ProcessAnalysisTests(APITestCase):
         }
         mock_gemini_service.return_value = mock_service
         
-        response = self.client.post(f'/chat/analyze/process/{self.process.id}/')
+        response = self._analyze()
         
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
         self.assertTrue(response.data['success'])
-        self.assertIn('Análise jurídica', response.data['analysis'])
+        
+        job = self.client.get(f"/chat/analyze/jobs/{response.data['job_id']}/")
+        
+        self.assertEqual(job.status_code, status.HTTP_200_OK)
+        self.assertEqual(job.data['data']['status'], AnalysisJob.STATUS_SUCCEEDED)
+        self.assertIn('Análise jurídica', job.data['data']['analysis'])
+        # O prompt recebe o resumo textual do processo
+        digest = mock_service.analyze_process.call_args.args[0]
+        self.assertIn('Número: 12345678901234567890', digest)
+        self.assertIn('Distribuição', digest)
+        # O usuário é avisado do fim da análise
+        self.assertTrue(Notification.objects.filter(user=self.user, notification_type='success').exists())
     
     def test_analyze_nonexistent_process(self):
         """Testa análise de processo inexistente"""
         response = self.client.post('/chat/analyze/process/99999/')
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_analysis_job_of_other_user(self):
+        """Testa que um usuário não acessa o job de outro"""
+        other = User.objects.create_user(email='other@example.com', password='testpass123')
+        job = AnalysisJob.objects.create(user=other, process=self.process)
+        
+        response = self.client.get(f'/chat/analyze/jobs/{job.id}/')
+        
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    @override_settings(BACKGROUND_TASKS_SYNC=True)
+    @patch('chat.services.analysis_jobs.GeminiService')
+    def test_analysis_reused_until_movements_change(self, mock_gemini_service):
+        """Testa que a análise é reaproveitada até as movimentações mudarem"""
+        mock_service = mock_gemini_service.return_value
+        mock_service.analyze_process.side_effect = [
+            {'analysis': 'Primeira análise', 'success': True},
+            {'analysis': 'Segunda análise', 'success': True},
+        ]
+        
+        first = self._analyze()
+        second = self._analyze()
+        
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(second.data['cached'])
+        self.assertEqual(second.data['analysis'], 'Primeira análise')
+        self.assertEqual(mock_service.analyze_process.call_count, 1)
+        
+        from django.utils import timezone
+        ProcessMovement.objects.create(
+            process=self.process,
+            date=timezone.now(),
+            description='Citação',
+            movement_type='Citação'
+        )
+        third = self._analyze()
+        
+        self.assertEqual(third.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(AnalysisJob.objects.get(id=third.data['job_id']).result, 'Segunda análise')
+        # A análise do conteúdo antigo é descartada
+        self.assertEqual(list(ProcessAnalysis.objects.values_list('analysis', flat=True)), ['Segunda análise'])
+    
+    @override_settings(BACKGROUND_TASKS_SYNC=True)
+    @patch('chat.services.analysis_jobs.GeminiService')
+    def test_analysis_keyed_by_model(self, mock_gemini_service):
+        """Testa que a troca de modelo gera uma nova análise"""
+        mock_gemini_service.return_value.analyze_process.return_value = {'analysis': 'Análise', 'success': True}
+        
+        self._analyze()
+        with override_settings(GEMINI_MODEL='outro-modelo'):
+            response = self._analyze()
+        
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(ProcessAnalysis.objects.count(), 2)
+    
+    @override_settings(BACKGROUND_TASKS_SYNC=True, CHAT_ANALYSIS_MAX_ATTEMPTS=2, CHAT_ANALYSIS_RETRY_BACKOFF=10)
+    @patch('chat.services.analysis_jobs.GeminiService')
+    def test_failed_analysis_retried_then_failed(self, mock_gemini_service):
+        """Testa que falhas da IA são repetidas com backoff, não são salvas e avisam o usuário ao final"""
+        mock_gemini_service.return_value.analyze_process.return_value = {
+            'analysis': 'Não foi possível analisar o processo no momento.',
+            'success': False
+        }
+        
+        response = self._analyze()
+        job = AnalysisJob.objects.get(id=response.data['job_id'])
+        
+        # Primeira falha: volta para a fila com espera
+        from django.utils import timezone
+        self.assertEqual(job.status, AnalysisJob.STATUS_QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(run_pending_jobs(), 0)
+        
+        AnalysisJob.objects.filter(id=job.id).update(run_after=timezone.now())
+        self.assertEqual(run_pending_jobs(), 1)
+        
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.STATUS_FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertFalse(ProcessAnalysis.objects.exists())
+        self.assertTrue(Notification.objects.filter(user=self.user, notification_type='error').exists())
+    
+    @override_settings(CHAT_ANALYSIS_MAX_ACTIVE_JOBS_PER_USER=1)
+    def test_active_jobs_limited_per_user(self):
+        """Testa o limite de análises simultâneas por usuário"""
+        other_process = ProcessData.objects.create(process_number='09876543210987654321', court_name='Tribunal de Teste')
+        AnalysisJob.objects.create(user=self.user, process=other_process)
+        
+        response = self.client.post(f'/chat/analyze/process/{self.process.id}/')
+        
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(response.data['success'])
+    
+    def test_active_job_reused(self):
+        """Testa que pedir de novo a mesma análise devolve o job em andamento"""
+        first = self.client.post(f'/chat/analyze/process/{self.process.id}/')
+        second = self.client.post(f'/chat/analyze/process/{self.process.id}/')
+        
+        self.assertEqual(first.data['job_id'], second.data['job_id'])
+        self.assertEqual(AnalysisJob.objects.count(), 1)
+    
+    @override_settings(CHAT_ANALYSIS_JOB_TIMEOUT=60)
+    @patch('chat.services.analysis_jobs.GeminiService')
+    def test_stale_running_job_reclaimed(self, mock_gemini_service):
+        """Testa que um job abandonado em execução é retomado por outro worker"""
+        from datetime import timedelta
+        from django.utils import timezone
+        mock_gemini_service.return_value.analyze_process.return_value = {'analysis': 'Análise', 'success': True}
+        now = timezone.now()
+        running = AnalysisJob.objects.create(
+            user=self.user, process=self.process, status=AnalysisJob.STATUS_RUNNING, attempts=1, started_at=now
+        )
+        
+        self.assertEqual(run_pending_jobs(), 0)
+        
+        AnalysisJob.objects.filter(id=running.id).update(started_at=now - timedelta(seconds=120))
+        self.assertEqual(run_pending_jobs(), 1)
+        
+        running.refresh_from_db()
+        self.assertEqual(running.status, AnalysisJob.STATUS_SUCCEEDED)
+        self.assertEqual(running.attempts, 2)
+    
+    @override_settings(CHAT_ANALYSIS_JOB_TIMEOUT=60, CHAT_ANALYSIS_MAX_ATTEMPTS=2)
+    @patch('chat.services.analysis_jobs.GeminiService')
+    def test_abandoned_last_attempt_failed(self, mock_gemini_service):
+        """Testa que um job abandonado na última tentativa falha em vez de ser retomado"""
+        from datetime import timedelta
+        from django.utils import timezone
+        running = AnalysisJob.objects.create(
+            user=self.user, process=self.process, status=AnalysisJob.STATUS_RUNNING, attempts=2,
+            started_at=timezone.now() - timedelta(seconds=120)
+        )
+    
+        self.assertEqual(run_pending_jobs(), 0)
+    
+        running.refresh_from_db()
+        self.assertEqual(running.status, AnalysisJob.STATUS_FAILED)
+        self.assertEqual(running.attempts, 2)
+        mock_gemini_service.return_value.analyze_process.assert_not_called()
+        self.assertTrue(Notification.objects.filter(user=self.user, notification_type='error').exists())
+    
+    @override_settings(BACKGROUND_TASKS_SYNC=True)
+    @patch('chat.services.analysis_jobs.GeminiService')
+    def test_queue_check_runs_pending_retries(self, mock_gemini_service):
+        """Testa que a verificação periódica executa retentativas sem um novo enfileiramento (ex: após restart)"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .services import check_queue
+        mock_gemini_service.return_value.analyze_process.return_value = {'analysis': 'Análise', 'success': True}
+    
+        self.assertFalse(check_queue())
+    
+        job = AnalysisJob.objects.create(
+            user=self.user, process=self.process, attempts=1, run_after=timezone.now() - timedelta(seconds=1)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(check_queue())
+    
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.STATUS_SUCCEEDED)
+    
+    @override_settings(GEMINI_API_KEY='test-key', CHAT_ANALYSIS_REQUEST_TIMEOUT=30)
+    @patch('chat.services.gemini_service.get_generative_model')
+    def test_analysis_request_timeout(self, mock_get_model):
+        """Testa que a chamada de análise ao Gemini tem timeout"""
+        from .services import GeminiService
+        mock_get_model.return_value.generate_content.return_value.text = 'Análise'
+    
+        self.assertTrue(GeminiService().analyze_process('Resumo')['success'])
+    
+        kwargs = mock_get_model.return_value.generate_content.call_args.kwargs
+        self.assertEqual(kwargs['request_options'], {'timeout': 30})
+
+
+class ProcessDigestTests(TestCase):
+    """Testes para o resumo de processos enviado à IA"""
+    
+    def setUp(self):
+        cache.clear()
+        from datetime import datetime
+        from django.utils import timezone
+        
+        def day(number):
+            return timezone.make_aware(datetime(2024, 1, number, 12))
+        
+        # Da mais recente para a mais antiga, como em build_analysis_data
+        movements = [{'description': 'Sentença', 'date': day(20), 'movement_type': 'Sentença'}]
+        movements += [
+            {'description': 'Conclusos para despacho', 'date': day(number), 'movement_type': 'Conclusão'}
+            for number in range(19, 4, -1)
+        ]
+        movements.append({'description': 'Distribuição', 'date': day(1), 'movement_type': 'Distribuição'})
+        self.process_data = {
+            'process_number': '12345678901234567890',
+            'court_name': 'Tribunal de Teste',
+            'case_class': 'Ação de Cobrança',
+            'subject': 'Teste de assunto',
+            'status': 'Ativo',
+            'value': None,
+            'distribution_date': None,
+            'parties': [
+                {'name': 'João Silva', 'party_type': 'autor', 'document': '12345678901'},
+                {'name': 'Maria Santos', 'party_type': 'reu', 'document': '98765432109'},
+            ],
+            'movements': movements
+        }
+    
+    def test_repeated_movements_collapsed(self):
+        """Testa que movimentações consecutivas iguais viram uma linha com período e contagem"""
+        digest = build_process_digest(self.process_data, max_tokens=1000)
+        
+        self.assertIn('- 05/01/2024 a 19/01/2024 Conclusos para despacho (15x)', digest)
+        self.assertEqual(digest.count('Conclusos para despacho'), 1)
+        self.assertIn('Primeira movimentação: 01/01/2024; última: 20/01/2024', digest)
+        self.assertIn('João Silva', digest)
+        # Documentos das partes não vão para o prompt
+        self.assertNotIn('12345678901', digest.replace('12345678901234567890', ''))
+        # Ordem cronológica
+        self.assertLess(digest.index('Distribuição'), digest.index('Sentença'))
+    
+    def test_digest_capped_keeps_first_and_recent(self):
+        """Testa que acima do limite ficam a primeira movimentação e as mais recentes"""
+        self.process_data['movements'] = [
+            {'description': f'Juntada de petição {number}', 'date': None, 'movement_type': 'Juntada'}
+            for number in range(200, 0, -1)
+        ]
+        
+        digest = build_process_digest(self.process_data, max_tokens=300)
+        
+        self.assertLessEqual(estimate_tokens(digest), 300)
+        self.assertIn('Juntada de petição 1\n', digest)
+        self.assertIn('Juntada de petição 200', digest)
+        self.assertIn('entradas intermediárias omitidas', digest)
+        self.assertNotIn('Juntada de petição 100\n', digest)
+    
+    def test_digest_smaller_than_json(self):
+        """Testa que o resumo é bem menor que o JSON completo"""
+        from django.core.serializers.json import DjangoJSONEncoder
+        full = json.dumps(self.process_data, ensure_ascii=False, indent=2, cls=DjangoJSONEncoder)
+        
+        digest = build_process_digest(self.process_data, max_tokens=1000)
+        
+        self.assertLess(estimate_tokens(digest) * 3, estimate_tokens(full))
+    
+    @patch('chat.services.process_digest.build_process_digest', return_value='Resumo')
+    def test_digest_cached_per_revision(self, mock_build):
+        """Testa que o resumo fica em cache pelo hash do conteúdo"""
+        self.assertEqual(get_process_digest('hash-1', self.process_data), 'Resumo')
+        self.assertEqual(get_process_digest('hash-1', self.process_data), 'Resumo')
+        self.assertEqual(mock_build.call_count, 1)
+        
+        get_process_digest('hash-2', self.process_data)
+        
+        self.assertEqual(mock_build.call_count, 2)
+
+
+class FakeChunk:
+    def __init__(self, text=None):
+        self._text = text
+    
+    @property
+    def text(self):
+        if self._text is None:
+            raise ValueError('Parte sem texto')
+        return self._text
+
+
+class FakeStreamingModel:
+    """Modelo do Gemini falso: responde em partes quando stream=True"""
+    
+    def __init__(self, chunks, suggestions='Pergunta 1\nPergunta 2\nPergunta 3', fail_after=None):
+        self.chunks = chunks
+        self.suggestions = suggestions
+        self.fail_after = fail_after
+        self.prompts = []
+    
+    def generate_content(self, prompt, stream=False):
+        self.prompts.append(prompt)
+        if not stream:
+            return FakeChunk(self.suggestions)
+        return self._stream()
+    
+    def _stream(self):
+        for index, text in enumerate(self.chunks):
+            if index == self.fail_after:
+                raise RuntimeError('Conexão interrompida')
+            yield FakeChunk(text)
+
+
+@override_settings(GEMINI_API_KEY='test-key')
+class ChatStreamTests(APITestCase):
+    """Testes para o envio de mensagens com resposta em streaming"""
+    
+    def setUp(self):
+        # Cada teste usa um modelo falso próprio
+        reset_gemini_clients()
+        self.addCleanup(reset_gemini_clients)
+        self.user = User.objects.create_user(email='test@example.com', password='testpass123')
+        self.session = ChatSession.objects.create(user=self.user, title='Sessão de Teste')
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+    
+    def _send(self, model, message='Qual o prazo do recurso?'):
+        with patch('chat.services.gemini_client.genai') as mock_genai:
+            mock_genai.GenerativeModel.return_value = model
+            response = self.client.post(f'/chat/sessions/{self.session.id}/send/stream/', {'message': message})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            return self._parse(b''.join(response.streaming_content).decode())
+    
+    def _parse(self, body):
+        events = []
+        for block in body.strip().split('\n\n'):
+            lines = dict(line.split(': ', 1) for line in block.split('\n'))
+            events.append((lines['event'], json.loads(lines['data'])))
+        return events
+    
+    def test_stream_tokens_then_suggestions(self):
+        """Testa que os trechos chegam antes da mensagem salva e das sugestões"""
+        events = self._send(FakeStreamingModel(['O prazo ', 'é de 15 dias.']))
+        
+        names = [name for name, _ in events]
+        self.assertEqual(names, ['token', 'token', 'message', 'suggestions', 'done'])
+        self.assertEqual(''.join(data['text'] for name, data in events if name == 'token'), 'O prazo é de 15 dias.')
+        self.assertEqual(events[3][1]['suggestions'], ['Pergunta 1', 'Pergunta 2', 'Pergunta 3'])
+        
+        reply = ChatMessage.objects.get(id=events[2][1]['message_id'])
+        self.assertEqual(reply.message_type, 'assistant')
+        self.assertEqual(reply.content, 'O prazo é de 15 dias.')
+        self.assertTrue(reply.metadata['streamed'])
+        self.assertEqual(self.session.messages.count(), 2)
+    
+    def test_stream_with_process_context(self):
+        """Testa o streaming em uma sessão vinculada a um processo"""
+        process = ProcessData.objects.create(process_number='12345678901234567890', court_name='Tribunal de Teste')
+        ProcessParty.objects.create(process=process, name='João Silva', party_type='autor')
+        self.session.process = process
+        self.session.save()
+        model = FakeStreamingModel(['Resposta'])
+        
+        events = self._send(model)
+        
+        self.assertEqual([name for name, _ in events], ['token', 'message', 'suggestions', 'done'])
+        self.assertTrue(any('João Silva (autor)' in prompt for prompt in model.prompts))
+    
+    def test_chunks_without_text_are_skipped(self):
+        """Testa que partes sem texto (ex: metadados de segurança) são ignoradas"""
+        model = FakeStreamingModel(['Olá'])
+        model._stream = lambda: iter([FakeChunk(), FakeChunk('Olá')])
+        
+        events = self._send(model)
+        
+        self.assertEqual([data for name, data in events if name == 'token'], [{'text': 'Olá'}])
+    
+    def test_stream_error(self):
+        """Testa que uma falha no meio do stream gera o evento de erro e a mensagem de erro"""
+        events = self._send(FakeStreamingModel(['Parte 1', 'Parte 2'], fail_after=1))
+        
+        self.assertEqual([name for name, _ in events], ['token', 'error'])
+        error_msg = ChatMessage.objects.get(id=events[1][1]['message_id'])
+        self.assertFalse(error_msg.metadata['success'])
+    
+    def test_client_disconnect_saves_partial_reply(self):
+        """Testa que o trecho já gerado é salvo se o cliente desconectar"""
+        with patch('chat.services.gemini_client.genai') as mock_genai:
+            mock_genai.GenerativeModel.return_value = FakeStreamingModel(['Parte 1', 'Parte 2'])
+            response = self.client.post(f'/chat/sessions/{self.session.id}/send/stream/', {'message': 'Oi'})
+            next(iter(response.streaming_content))
+            response.close()
+        
+        reply = self.session.messages.get(message_type='assistant')
+        self.assertEqual(reply.content, 'Parte 1')
+        self.assertTrue(reply.metadata['interrupted'])
+    
+    def test_stream_empty_message(self):
+        """Testa que mensagens vazias são rejeitadas antes do stream"""
+        response = self.client.post(f'/chat/sessions/{self.session.id}/send/stream/', {'message': ''})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(
+    GEMINI_API_KEY='test-key',
+    CHAT_SUGGESTIONS_TIMEOUT=2,
+    # A thread das sugestões grava no cache; em memória para não disputar o banco de teste
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+)
+class ChatSuggestionsTests(APITestCase):
+    """Testes para as sugestões geradas em paralelo e sob demanda"""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='test@example.com', password='testpass123')
+        self.session = ChatSession.objects.create(user=self.user, title='Sessão de Teste')
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+        self.suggestions_started = threading.Event()
+        self.release_suggestions = threading.Event()
+        self.release_suggestions.set()
+        self.service = MagicMock()
+        self.service.generate_response.side_effect = self._generate_response
+        self.service.generate_suggestions.side_effect = self._generate_suggestions
+    
+    def _generate_response(self, **kwargs):
+        # Só responde depois que as sugestões começaram: prova que rodam em paralelo
+        concurrent = self.suggestions_started.wait(timeout=2)
+        return {'content': 'Resposta', 'tokens_used': 10, 'model_used': 'fake', 'success': concurrent}
+    
+    def _generate_suggestions(self, user_message, process_context=None, raise_errors=False):
+        self.suggestions_started.set()
+        self.release_suggestions.wait(timeout=5)
+        return ['Sugestão 1', '', 'Sugestão 2', 42]
+    
+    def _send(self):
+        with patch('chat.views.GeminiService', return_value=self.service):
+            return self.client.post(f'/chat/sessions/{self.session.id}/send/', {'message': 'Qual o prazo?'})
+    
+    def test_suggestions_run_concurrently(self):
+        """Testa que as sugestões são geradas em paralelo com a resposta e normalizadas"""
+        response = self._send()
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        reply = ChatMessage.objects.get(id=response.data['message_id'])
+        self.assertTrue(reply.metadata['success'])
+        self.assertEqual(response.data['suggestions'], ['Sugestão 1', 'Sugestão 2'])
+        self.assertFalse(response.data['suggestions_pending'])
+    
+    @override_settings(CHAT_SUGGESTIONS_TIMEOUT=0.05)
+    def test_deadline_omits_suggestions(self):
+        """Testa que as sugestões são omitidas após o prazo e ficam disponíveis depois"""
+        self.release_suggestions.clear()
+        response = self._send()
+        
+        self.assertEqual(response.data['suggestions'], [])
+        self.assertTrue(response.data['suggestions_pending'])
+        
+        self.release_suggestions.set()
+        key = f"chat_suggestions_{response.data['message_id']}"
+        for _ in range(100):
+            if cache.get(key) is not None:
+                break
+            time.sleep(0.02)
+        
+        with patch('chat.views.GeminiService', return_value=self.service):
+            response = self.client.get(f"/chat/messages/{response.data['message_id']}/suggestions/")
+        self.assertEqual(response.data['data']['suggestions'], ['Sugestão 1', 'Sugestão 2'])
+        self.assertEqual(self.service.generate_suggestions.call_count, 1)
+    
+    def test_on_demand_suggestions_are_cached(self):
+        """Testa que o endpoint sob demanda gera as sugestões uma vez por mensagem"""
+        ChatMessage.objects.create(session=self.session, message_type='user', content='Qual o prazo?')
+        reply = ChatMessage.objects.create(session=self.session, message_type='assistant', content='15 dias')
+        
+        with patch('chat.views.GeminiService', return_value=self.service):
+            first = self.client.get(f'/chat/messages/{reply.id}/suggestions/')
+            second = self.client.get(f'/chat/messages/{reply.id}/suggestions/')
+        
+        self.assertEqual(first.data['data']['suggestions'], ['Sugestão 1', 'Sugestão 2'])
+        self.assertEqual(second.data, first.data)
+        self.service.generate_suggestions.assert_called_once_with('Qual o prazo?', None, raise_errors=True)
+    
+    def test_failed_suggestions_not_cached(self):
+        """Testa que uma falha na geração não fica em cache e as sugestões são geradas de novo sob demanda"""
+        self.service.generate_suggestions.side_effect = [RuntimeError('Gemini indisponível'), ['Sugestão 1']]
+        self.suggestions_started.set()
+        response = self._send()
+        
+        self.assertEqual(response.data['suggestions'], [])
+        self.assertFalse(response.data['suggestions_pending'])
+        self.assertIsNone(cache.get(f"chat_suggestions_{response.data['message_id']}"))
+        
+        with patch('chat.views.GeminiService', return_value=self.service):
+            response = self.client.get(f"/chat/messages/{response.data['message_id']}/suggestions/")
+        self.assertEqual(response.data['data']['suggestions'], ['Sugestão 1'])
+    
+    def test_on_demand_suggestions_with_process(self):
+        """Testa as sugestões sob demanda em uma sessão vinculada a um processo com movimentações"""
+        from django.utils import timezone
+        process = ProcessData.objects.create(process_number='12345678901234567890', court_name='Tribunal de Teste')
+        ProcessParty.objects.create(process=process, name='João Silva', party_type='autor')
+        ProcessMovement.objects.create(process=process, date=timezone.now(), description='Distribuição')
+        self.session.process = process
+        self.session.save()
+        ChatMessage.objects.create(session=self.session, message_type='user', content='Qual o prazo?')
+        reply = ChatMessage.objects.create(session=self.session, message_type='assistant', content='15 dias')
+        model = FakeStreamingModel([])
+        reset_gemini_clients()
+        self.addCleanup(reset_gemini_clients)
+        
+        with patch('chat.services.gemini_client.genai') as mock_genai:
+            mock_genai.GenerativeModel.return_value = model
+            response = self.client.get(f'/chat/messages/{reply.id}/suggestions/')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['suggestions'], ['Pergunta 1', 'Pergunta 2', 'Pergunta 3'])
+        self.assertIn('João Silva', model.prompts[0])
+    
+    def test_on_demand_suggestions_other_user(self):
+        """Testa que não é possível obter sugestões de mensagens de outro usuário"""
+        other = User.objects.create_user(email='other@example.com', password='testpass123')
+        session = ChatSession.objects.create(user=other, title='Outra')
+        reply = ChatMessage.objects.create(session=session, message_type='assistant', content='Resposta')
+        
+        response = self.client.get(f'/chat/messages/{reply.id}/suggestions/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(
+    GEMINI_API_KEY='test-key',
+    # Mensagens do usuário custam 6 tokens e as da assistente, 7: cabem 5 mensagens
+    CHAT_HISTORY_TOKEN_BUDGET=33,
+    CHAT_HISTORY_FETCH_LIMIT=6,
+    CHAT_SUMMARY_MAX_TOKENS=50,
+    BACKGROUND_TASKS_SYNC=True
+)
+class ConversationMemoryTests(APITestCase):
+    """Testes para o prompt com orçamento de tokens e o resumo incremental da conversa"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', password='testpass123')
+        self.session = ChatSession.objects.create(user=self.user, title='Sessão de Teste')
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+    
+    def _add_messages(self, count):
+        return [
+            ChatMessage.objects.create(
+                session=self.session,
+                message_type='user' if index % 2 == 0 else 'assistant',
+                content=f'mensagem {index}'
+            )
+            for index in range(count)
+        ]
+    
+    def test_estimate_tokens(self):
+        """Testa a estimativa de tokens para palavras, números e pontuação"""
+        self.assertEqual(estimate_tokens(''), 0)
+        self.assertEqual(estimate_tokens('o processo'), 1 + 2)
+        self.assertEqual(estimate_tokens('nº 1234.'), 1 + 4 + 1)
+        self.assertEqual(truncate_to_tokens('um dois três quatro', 2), 'um dois')
+    
+    def test_prompt_builder_respects_budget(self):
+        """Testa que o histórico mais antigo é descartado quando excede o orçamento"""
+        history = [
+            {'message_type': 'user', 'content': 'primeira pergunta longa ' * 5},
+            {'message_type': 'assistant', 'content': 'resposta'},
+            {'message_type': 'user', 'content': 'segunda'},
+        ]
+        fixed = estimate_tokens(
+            'Sistema' 'RESUMO DA CONVERSA ATÉ AQUI:\nresumo anterior\n\n' 'HISTÓRICO DA CONVERSA:\n' '\nUsuário: atual\nAssistente:'
+        )
+        recent = estimate_tokens('Assistente: resposta\n') + estimate_tokens('Usuário: segunda\n')
+        builder = PromptBuilder(token_budget=fixed + recent)
+        prompt = builder.build('Sistema', 'atual', history, 'resumo anterior')
+        
+        self.assertEqual(builder.omitted, 1)
+        self.assertNotIn('primeira', prompt)
+        self.assertIn('Assistente: resposta\nUsuário: segunda\n', prompt)
+        self.assertIn('RESUMO DA CONVERSA ATÉ AQUI:\nresumo anterior', prompt)
+        self.assertTrue(prompt.endswith('Usuário: atual\nAssistente:'))
+    
+    def test_load_conversation_reads_only_unsummarized_tail(self):
+        """Testa que apenas as mensagens recentes ainda não resumidas são lidas"""
+        messages = self._add_messages(10)
+        ChatContext.objects.create(
+            session=self.session,
+            conversation_summary='Resumo',
+            summary_last_message_id=messages[1].id
+        )
+        
+        with self.assertNumQueries(2):
+            conversation = load_conversation(self.session, exclude_message_id=messages[-1].id)
+        
+        self.assertEqual(conversation['summary'], 'Resumo')
+        # Lidas as 6 mais recentes (3..8); as 5 mais novas cabem no orçamento
+        self.assertEqual([m['content'] for m in conversation['messages']], [f'mensagem {i}' for i in range(4, 9)])
+        self.assertTrue(conversation['overflow'])
+    
+    @patch('chat.services.conversation.GeminiService')
+    def test_summary_updated_incrementally(self, mock_gemini_service):
+        """Testa que apenas as mensagens excedentes são incorporadas ao resumo"""
+        mock_gemini_service.return_value.summarize_conversation.return_value = 'Resumo novo'
+        messages = self._add_messages(8)
+        ChatContext.objects.create(session=self.session, conversation_summary='Resumo antigo')
+        
+        update_conversation_summary(self.session.id)
+        
+        previous, overflow = mock_gemini_service.return_value.summarize_conversation.call_args[0]
+        self.assertEqual(previous, 'Resumo antigo')
+        # Lidas as 6 mais recentes (2..7); as 5 mais novas cabem, a 2 é resumida
+        self.assertEqual([m['content'] for m in overflow], ['mensagem 2'])
+        context = ChatContext.objects.get(session=self.session)
+        self.assertEqual(context.conversation_summary, 'Resumo novo')
+        self.assertEqual(context.summary_last_message_id, messages[2].id)
+        
+        # Nada mais a resumir
+        update_conversation_summary(self.session.id)
+        self.assertEqual(mock_gemini_service.return_value.summarize_conversation.call_count, 1)
+    
+    @patch('chat.services.conversation.background.submit_to_pool')
+    def test_summary_update_uses_chat_pool(self, mock_submit):
+        """Testa que a atualização do resumo roda no pool dedicado, fora do pool padrão"""
+        schedule_summary_update(self.session.id, {'overflow': False})
+        mock_submit.assert_not_called()
+        
+        schedule_summary_update(self.session.id, {'overflow': True})
+        mock_submit.assert_called_once_with('chat', update_conversation_summary, self.session.id)
+    
+    @patch('chat.services.conversation.GeminiService')
+    @patch('chat.views.GeminiService')
+    def test_send_message_uses_budgeted_history(self, mock_view_service, mock_summary_service):
+        """Testa que send_message envia o histórico limitado e agenda o resumo"""
+        mock_view_service.return_value.generate_response.return_value = {
+            'content': 'Resposta', 'tokens_used': 10, 'model_used': 'fake', 'success': True
+        }
+        mock_view_service.return_value.generate_suggestions.return_value = []
+        mock_summary_service.return_value.summarize_conversation.return_value = 'Resumo'
+        self._add_messages(8)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/chat/sessions/{self.session.id}/send/', {'message': 'nova pergunta'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        kwargs = mock_view_service.return_value.generate_response.call_args.kwargs
+        self.assertEqual(len(kwargs['chat_history']), 5)
+        self.assertNotIn('nova pergunta', [m['content'] for m in kwargs['chat_history']])
+        self.assertTrue(mock_summary_service.return_value.summarize_conversation.called)
+        self.assertEqual(ChatContext.objects.get(session=self.session).conversation_summary, 'Resumo')
+
+
+
+@override_settings(GEMINI_API_KEY='test-key', GEMINI_TRANSPORT='')
+class GeminiClientRegistryTests(TestCase):
+    """Testes para o registro de clientes do Gemini"""
+    
+    def setUp(self):
+        reset_gemini_clients()
+        self.addCleanup(reset_gemini_clients)
+    
+    @patch('chat.services.gemini_client.genai')
+    def test_configured_once_per_process(self, mock_genai):
+        """Testa que a API é configurada uma vez e os modelos reaproveitados"""
+        from .services import GeminiService
+        
+        first = GeminiService()
+        second = GeminiService()
+        
+        self.assertIs(first.model, second.model)
+        mock_genai.configure.assert_called_once_with(api_key='test-key', transport=None)
+        mock_genai.GenerativeModel.assert_called_once()
+        
+        get_generative_model('outro-modelo')
+        self.assertEqual(mock_genai.GenerativeModel.call_count, 2)
+        self.assertEqual(mock_genai.configure.call_count, 1)
+    
+    @patch('chat.services.gemini_client.genai')
+    def test_reconfigured_after_fork(self, mock_genai):
+        """Testa que um novo processo (fork do preload_app) configura seu próprio cliente"""
+        get_generative_model('gemini-1.5-flash')
+        
+        with patch('chat.services.gemini_client.os.getpid', return_value=-1):
+            get_generative_model('gemini-1.5-flash')
+        
+        self.assertEqual(mock_genai.configure.call_count, 2)
+        self.assertEqual(mock_genai.GenerativeModel.call_count, 2)
+    
+    @patch('chat.services.gemini_client.genai')
+    def test_thread_safe_initialization(self, mock_genai):
+        """Testa que requisições simultâneas criam um único modelo"""
+        mock_genai.GenerativeModel.side_effect = lambda name: (time.sleep(0.01), object())[1]
+        models = []
+        threads = [threading.Thread(target=lambda: models.append(get_generative_model('m'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len({id(model) for model in models}), 1)
+        self.assertEqual(mock_genai.configure.call_count, 1)
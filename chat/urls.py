@@ -10,9 +10,12 @@ urlpatterns = [
     
     # Mensagens
     path('sessions/<int:session_id>/send/', views.send_message, name='send_message'),
+    path('sessions/<int:session_id>/send/stream/', views.send_message_stream, name='send_message_stream'),
+    path('messages/<int:message_id>/suggestions/', views.get_message_suggestions, name='get_message_suggestions'),
     
     # Análise de processos
     path('analyze/process/<int:process_id>/', views.analyze_process, name='analyze_process'),
+    path('analyze/jobs/<int:job_id>/', views.get_analysis_job, name='get_analysis_job'),
 ]
 
 
@@ -1,20 +1,39 @@
+import json
 import logging
+from asgiref.sync import sync_to_async
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.core.cache import cache
+from django.conf import settings
 
-from .models import ChatSession, ChatMessage, ChatContext
+from .models import ChatSession, ChatMessage, ChatContext, AnalysisJob
 from .serializers import (
     ChatSessionSerializer, 
     ChatSessionCreateSerializer,
     ChatMessageSerializer,
     ChatResponseSerializer,
-    ChatContextSerializer
+    ChatContextSerializer,
+    AnalysisJobSerializer
+)
+from .services import (
+    GeminiService,
+    SuggestionsTask,
+    analysis_cache_key,
+    build_analysis_data,
+    enqueue_analysis,
+    get_saved_analysis,
+    load_conversation,
+    normalize_suggestions,
+    schedule_summary_update,
+    suggestions_cache_key
 )
-from .services import GeminiService
 from processes.models import ProcessData
 
 logger = logging.getLogger(__name__)
@@ -132,28 +151,22 @@ def send_message(request, session_id):
             content=user_message
         )
         
-        # Obter histórico de mensagens
-        chat_history = list(session.messages.values('message_type', 'content').order_by('created_at'))
+        # Resumo e mensagens recentes que cabem no orçamento (a mensagem atual vai ao fim do prompt)
+        conversation = load_conversation(session, exclude_message_id=user_msg.id)
         
         # Obter contexto do processo se disponível
-        process_context = None
-        if session.process:
-            process_context = {
-                'process_number': session.process.process_number,
-                'court_name': session.process.court_name,
-                'case_class': session.process.case_class,
-                'subject': session.process.subject,
-                'parties': list(session.process.parties.values('name', 'type', 'role')),
-                'movements': list(session.process.movements.values('description', 'date', 'movement_type').order_by('-date')[:10])
-            }
+        process_context = _build_process_context(session)
         
         # Gerar resposta da IA
         try:
             gemini_service = GeminiService()
+            # As sugestões dependem apenas da mensagem: geradas em paralelo com a resposta
+            suggestions_task = SuggestionsTask(gemini_service, user_message, process_context)
             ai_response = gemini_service.generate_response(
                 user_message=user_message,
-                chat_history=chat_history,
-                process_context=process_context
+                chat_history=conversation['messages'],
+                process_context=process_context,
+                conversation_summary=conversation['summary']
             )
             
             # Salvar resposta da IA
@@ -167,19 +180,21 @@ def send_message(request, session_id):
                     'success': ai_response.get('success', True)
                 }
             )
+            schedule_summary_update(session.id, conversation)
             
             # Atualizar contexto se necessário
             if session.process and ai_response.get('success', True):
                 _update_chat_context(session, ai_response['content'])
             
-            # Gerar sugestões
-            suggestions = gemini_service.generate_suggestions(user_message, process_context)
+            # Sugestões prontas até o prazo; as demais ficam disponíveis em get_message_suggestions
+            suggestions = suggestions_task.result(ai_msg.id)
             
             return Response({
                 'success': True,
                 'message': ai_response['content'],
                 'message_id': ai_msg.id,
-                'suggestions': suggestions,
+                'suggestions': suggestions['suggestions'],
+                'suggestions_pending': suggestions['pending'],
                 'context_updated': bool(session.process)
             }, status=status.HTTP_200_OK)
             
@@ -208,44 +223,149 @@ def send_message(request, session_id):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def send_message_stream(request, session_id):
+    """
+    Envia uma mensagem e transmite a resposta da IA via SSE, à medida que é gerada
+    
+    Eventos: token ({'text'}) para cada trecho, message ({'message_id',
+    'context_updated'}) quando a resposta é salva, suggestions ({'suggestions',
+    'pending'}) e done. Em caso de falha, error ({'message', 'message_id'}).
+    """
+    session = get_object_or_404(ChatSession, id=session_id, user=request.user)
+    user_message = request.data.get('message', '').strip()
+    
+    if not user_message:
+        return Response({
+            'success': False,
+            'message': 'Mensagem não pode estar vazia'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        gemini_service = GeminiService()
+    except Exception as e:
+        logger.error(f"Erro ao configurar a IA: {str(e)}")
+        return Response({
+            'success': False,
+            'message': 'Erro ao processar mensagem com IA'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    # Salvar mensagem do usuário
+    user_msg = ChatMessage.objects.create(
+        session=session,
+        message_type='user',
+        content=user_message
+    )
+    
+    conversation = load_conversation(session, exclude_message_id=user_msg.id)
+    process_context = _build_process_context(session)
+    
+    suggestions_task = SuggestionsTask(gemini_service, user_message, process_context)
+    events = _stream_chat_events(gemini_service, suggestions_task, session, user_message, conversation, process_context)
+    if isinstance(request._request, ASGIRequest):
+        # Sob ASGI, um iterador síncrono seria consumido inteiro antes do envio
+        events = _iterate_async(events)
+    
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_message_suggestions(request, message_id):
+    """
+    Retorna as sugestões de perguntas de uma resposta da IA, geradas sob demanda e mantidas em cache
+    """
+    message = get_object_or_404(
+        ChatMessage.objects.select_related('session'),
+        id=message_id,
+        message_type='assistant',
+        session__user=request.user
+    )
+    
+    cache_key = suggestions_cache_key(message.id)
+    suggestions = cache.get(cache_key)
+    if suggestions is not None:
+        return Response({
+            'success': True,
+            'data': {'message_id': message.id, 'suggestions': suggestions}
+        }, status=status.HTTP_200_OK)
+    
+    # Mensagem do usuário respondida por esta mensagem
+    user_message = message.session.messages.filter(
+        message_type='user',
+        created_at__lte=message.created_at,
+        id__lt=message.id
+    ).order_by('-created_at', '-id').first()
+    if user_message is None:
+        return Response({
+            'success': True,
+            'data': {'message_id': message.id, 'suggestions': []}
+        }, status=status.HTTP_200_OK)
+    
+    try:
+        gemini_service = GeminiService()
+        suggestions = normalize_suggestions(
+            gemini_service.generate_suggestions(
+                user_message.content, _build_process_context(message.session), raise_errors=True
+            )
+        )
+    except Exception as e:
+        logger.error(f"Erro ao gerar sugestões da mensagem {message_id}: {str(e)}")
+        return Response({
+            'success': False,
+            'message': 'Erro ao gerar sugestões'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    cache.set(cache_key, suggestions, settings.CHAT_SUGGESTIONS_CACHE_TTL)
+    return Response({
+        'success': True,
+        'data': {'message_id': message.id, 'suggestions': suggestions}
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def analyze_process(request, process_id):
     """
     Analisa um processo específico com IA
+    
+    Análises já geradas para o conteúdo atual do processo são devolvidas
+    imediatamente. As demais viram um job na fila (202), acompanhado por
+    get_analysis_job ou pela notificação enviada ao final.
     """
+    process = get_object_or_404(ProcessData, id=process_id)
+    
     try:
-        process = get_object_or_404(ProcessData, id=process_id)
-        
         # Verificar se o usuário tem acesso ao processo (se necessário)
         # Aqui você pode adicionar lógica de permissão específica
         
-        process_data = {
-            'process_number': process.process_number,
-            'court_name': process.court_name,
-            'case_class': process.case_class,
-            'subject': process.subject,
-            'status': process.status,
-            'value': process.value,
-            'distribution_date': process.distribution_date,
-            'parties': list(process.parties.values('name', 'party_type', 'document')),
-            'movements': list(process.movements.values('description', 'date', 'movement_type').order_by('-date'))
-        }
+        # Análise já gerada para o mesmo conteúdo, prompt e modelo
+        analysis = get_saved_analysis(analysis_cache_key(process, build_analysis_data(process)))
+        if analysis is not None:
+            return Response({
+                'success': True,
+                'analysis': analysis,
+                'process_id': process_id,
+                'cached': True
+            }, status=status.HTTP_200_OK)
         
-        gemini_service = GeminiService()
-        analysis = gemini_service.analyze_process(process_data)
+        job = enqueue_analysis(request.user, process)
+        if job is None:
+            return Response({
+                'success': False,
+                'message': 'Limite de análises simultâneas atingido. Aguarde a conclusão das análises em andamento.'
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS)
         
         return Response({
-            'success': analysis.get('success', True),
-            'analysis': analysis.get('analysis', ''),
+            'success': True,
+            'job_id': job.id,
+            'status': job.status,
             'process_id': process_id
-        }, status=status.HTTP_200_OK)
-        
-    except ProcessData.DoesNotExist:
-        return Response({
-            'success': False,
-            'message': 'Processo não encontrado'
-        }, status=status.HTTP_404_NOT_FOUND)
+        }, status=status.HTTP_202_ACCEPTED)
         
     except Exception as e:
         logger.error(f"Erro ao analisar processo {process_id}: {str(e)}")
@@ -255,6 +375,21 @@ def analyze_process(request, process_id):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_analysis_job(request, job_id):
+    """
+    Status de uma análise enfileirada e, quando concluída, o resultado
+    """
+    job = get_object_or_404(AnalysisJob, id=job_id, user=request.user)
+    serializer = AnalysisJobSerializer(job)
+    
+    return Response({
+        'success': True,
+        'data': serializer.data
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def delete_chat_session(request, session_id):
@@ -293,4 +428,123 @@ def _update_chat_context(session: ChatSession, ai_response: str):
         context.save()
         
     except Exception as e:
-        logger.error(f"Erro ao atualizar contexto do chat: {str(e)}")
\ No newline at end of file
+        logger.error(f"Erro ao atualizar contexto do chat: {str(e)}")
+
+
+def _build_process_context(session: ChatSession):
+    """
+    Monta o contexto do processo associado à sessão, se houver
+    """
+    if not session.process:
+        return None
+    
+    return {
+        'process_number': session.process.process_number,
+        'court_name': session.process.court_name,
+        'case_class': session.process.case_class,
+        'subject': session.process.subject,
+        'parties': list(session.process.parties.values('name', 'party_type')),
+        'movements': list(session.process.movements.values('description', 'date', 'movement_type').order_by('-date')[:10])
+    }
+
+
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def _forward_tokens(stream, parts):
+    """
+    Repassa os trechos do Gemini como eventos token e retorna os metadados da resposta
+    """
+    while True:
+        try:
+            text = next(stream)
+        except StopIteration as stop:
+            return stop.value or {}
+        parts.append(text)
+        yield _sse_event('token', {'text': text})
+
+
+def _stream_chat_events(gemini_service, suggestions_task, session, user_message, conversation, process_context):
+    """
+    Gera os eventos SSE da resposta e salva a mensagem da IA ao final do stream
+    
+    Se o cliente desconectar no meio da resposta, o trecho já gerado é salvo
+    e marcado como interrompido.
+    """
+    parts = []
+    saved = False
+    try:
+        stream = gemini_service.stream_response(
+            user_message=user_message,
+            chat_history=conversation['messages'],
+            process_context=process_context,
+            conversation_summary=conversation['summary']
+        )
+        try:
+            result = yield from _forward_tokens(stream, parts)
+        except GeneratorExit:
+            raise
+        except Exception as ai_error:
+            logger.error(f"Erro na IA: {str(ai_error)}")
+            
+            # Salvar mensagem de erro
+            error_msg = ChatMessage.objects.create(
+                session=session,
+                message_type='assistant',
+                content="Desculpe, ocorreu um erro ao processar sua mensagem. Tente novamente.",
+                metadata={'error': str(ai_error), 'success': False}
+            )
+            saved = True
+            yield _sse_event('error', {'message': 'Erro ao processar mensagem com IA', 'message_id': error_msg.id})
+            return
+        
+        content = ''.join(parts)
+        ai_msg = ChatMessage.objects.create(
+            session=session,
+            message_type='assistant',
+            content=content,
+            metadata={
+                'tokens_used': result.get('tokens_used', 0),
+                'model_used': result.get('model_used', ''),
+                'success': result.get('success', True),
+                'streamed': True
+            }
+        )
+        saved = True
+        schedule_summary_update(session.id, conversation)
+        
+        # Atualizar contexto se necessário
+        if session.process:
+            _update_chat_context(session, content)
+        
+        yield _sse_event('message', {'message_id': ai_msg.id, 'context_updated': bool(session.process)})
+        
+        # A resposta já foi entregue; as sugestões, geradas em paralelo, chegam depois
+        yield _sse_event('suggestions', suggestions_task.result(ai_msg.id))
+        yield _sse_event('done', {})
+    finally:
+        if not saved and parts:
+            # Cliente desconectou durante a resposta
+            ChatMessage.objects.create(
+                session=session,
+                message_type='assistant',
+                content=''.join(parts),
+                metadata={'success': False, 'interrupted': True, 'streamed': True}
+            )
+
+
+async def _iterate_async(iterator):
+    """
+    Consome um iterador síncrono (que acessa o banco) sem bloquear o event loop
+    """
+    sentinel = object()
+    try:
+        while True:
+            item = await sync_to_async(next)(iterator, sentinel)
+            if item is sentinel:
+                break
+            yield item
+    finally:
+        # Encerra o gerador (ex: cliente desconectou) na thread que acessa o banco
+        await sync_to_async(iterator.close)()
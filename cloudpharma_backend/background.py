@@ -0,0 +1,90 @@
+"""
+Execução de tarefas em segundo plano dentro do processo da aplicação.
+
+Usado para trabalho que não deve atrasar a resposta HTTP (ex: atualizar
+dados de um processo no DataJud). O pool de threads é criado sob demanda
+e recriado após um fork (workers do gunicorn). As tarefas são enfileiradas
+apenas após o commit da transação corrente, para que vejam os dados já
+gravados pela requisição.
+
+Tarefas longas (ex: chamadas à IA) usam pools nomeados, com tamanho em
+BACKGROUND_POOL_WORKERS, para não ocupar as threads das demais tarefas.
+
+Com BACKGROUND_TASKS_SYNC=True as tarefas rodam na própria thread (testes).
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL = 'default'
+
+_executors = {}
+_executors_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(pool=DEFAULT_POOL):
+    """
+    Retorna o pool de threads do processo atual
+    """
+    global _executors, _executors_pid
+    pid = os.getpid()
+    executor = _executors.get(pool) if _executors_pid == pid else None
+    if executor is None:
+        with _executor_lock:
+            if _executors_pid != pid:
+                # Pools herdados do processo pai (fork) não têm threads
+                _executors = {}
+                _executors_pid = pid
+            executor = _executors.get(pool)
+            if executor is None:
+                max_workers = (
+                    settings.BACKGROUND_MAX_WORKERS if pool == DEFAULT_POOL
+                    else settings.BACKGROUND_POOL_WORKERS[pool]
+                )
+                executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'background-{pool}')
+                _executors[pool] = executor
+    return executor
+
+
+def _call(fn, args, kwargs):
+    try:
+        fn(*args, **kwargs)
+    except Exception as e:
+        logger.error(f"Erro na tarefa em segundo plano {getattr(fn, '__name__', fn)}: {str(e)}")
+
+
+def _run(fn, args, kwargs):
+    close_old_connections()
+    try:
+        _call(fn, args, kwargs)
+    finally:
+        # Cada thread do pool tem suas próprias conexões; não deixá-las abertas indefinidamente
+        connections.close_all()
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Agenda fn(*args, **kwargs) para execução em segundo plano após o commit
+
+    Erros da tarefa são registrados no log e não se propagam ao chamador.
+    """
+    submit_to_pool(DEFAULT_POOL, fn, *args, **kwargs)
+
+
+def submit_to_pool(pool, fn, *args, **kwargs):
+    """
+    Como submit(), no pool nomeado (ver BACKGROUND_POOL_WORKERS)
+    """
+    if settings.BACKGROUND_TASKS_SYNC:
+        transaction.on_commit(lambda: _call(fn, args, kwargs))
+        return
+
+    transaction.on_commit(lambda: _get_executor(pool).submit(_run, fn, args, kwargs))
+
@@ -0,0 +1,204 @@
+"""
+Cache em dois níveis para a aplicação.
+
+O L1 é um LRU pequeno em memória, por processo, usado apenas para as
+famílias de chaves configuradas em L1_KEY_PREFIXES (dados que toleram
+alguns segundos de defasagem entre workers). O L2 é o cache compartilhado
+entre workers e instâncias (tabela no banco ou Redis), indicado pelo
+alias em LOCATION. O TTL de cada chave é informado por quem a grava.
+
+Exemplo de configuração:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'cloudpharma_backend.cache.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'L1_MAX_ENTRIES': 500,
+                'L1_TIMEOUT': 60,
+                'L1_KEY_PREFIXES': ['datajud_'],
+            },
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        },
+    }
+"""
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class TieredCache(BaseCache):
+    """
+    Backend de cache com um LRU em memória (L1) na frente de um cache compartilhado (L2)
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = location
+        self._l1_max_entries = options.get('L1_MAX_ENTRIES', 500)
+        self._l1_timeout = options.get('L1_TIMEOUT', 60)
+        self._l1_prefixes = tuple(options.get('L1_KEY_PREFIXES', ()))
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    # --- L1 --- #
+
+    def _l1_key(self, key, version):
+        return (key, self.version if version is None else version)
+
+    def _use_l1(self, key):
+        return bool(self._l1_prefixes) and isinstance(key, str) and key.startswith(self._l1_prefixes)
+
+    def _l1_get(self, key, version):
+        l1_key = self._l1_key(key, version)
+        with self._lock:
+            entry = self._l1.get(l1_key)
+            if entry is None:
+                self._stats['l1_misses'] += 1
+                return None
+            expires_at, data = entry
+            if expires_at <= time.monotonic():
+                del self._l1[l1_key]
+                self._stats['l1_misses'] += 1
+                return None
+            self._l1.move_to_end(l1_key)
+            self._stats['l1_hits'] += 1
+        return pickle.loads(data)
+
+    def _l1_set(self, key, value, timeout, version):
+        l1_timeout = self._l1_timeout
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            l1_timeout = min(l1_timeout, timeout)
+        if l1_timeout <= 0:
+            self._l1_delete(key, version)
+            return
+
+        # Valores serializados, como no LocMemCache, para que alterações do chamador não vazem para o cache
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        l1_key = self._l1_key(key, version)
+        with self._lock:
+            self._l1[l1_key] = (time.monotonic() + l1_timeout, data)
+            self._l1.move_to_end(l1_key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+                self._stats['l1_evictions'] += 1
+
+    def _l1_delete(self, key, version):
+        with self._lock:
+            self._l1.pop(self._l1_key(key, version), None)
+
+    # --- API do cache --- #
+
+    def get(self, key, default=None, version=None):
+        if self._use_l1(key):
+            value = self._l1_get(key, version)
+            if value is not None:
+                return value
+
+        sentinel = object()
+        value = self.l2.get(key, sentinel, version=version)
+        if value is sentinel:
+            self._stats['l2_misses'] += 1
+            return default
+
+        self._stats['l2_hits'] += 1
+        if self._use_l1(key):
+            self._l1_set(key, value, DEFAULT_TIMEOUT, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._l1_get(key, version) if self._use_l1(key) else None
+            if value is not None:
+                found[key] = value
+            else:
+                missing.append(key)
+
+        if missing:
+            from_l2 = self.l2.get_many(missing, version=version)
+            self._stats['l2_hits'] += len(from_l2)
+            self._stats['l2_misses'] += len(missing) - len(from_l2)
+            for key, value in from_l2.items():
+                if self._use_l1(key):
+                    self._l1_set(key, value, DEFAULT_TIMEOUT, version)
+            found.update(from_l2)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        self._stats['sets'] += 1
+        if self._use_l1(key):
+            self._l1_set(key, value, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version) or []
+        self._stats['sets'] += len(data)
+        for key, value in data.items():
+            if self._use_l1(key) and key not in failed:
+                self._l1_set(key, value, timeout, version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        if added and self._use_l1(key):
+            self._l1_set(key, value, timeout, version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1_delete(key, version)
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(key, version)
+        return self.l2.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_delete(key, version)
+        self.l2.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        if self._use_l1(key) and self._l1_get(key, version) is not None:
+            return True
+        return self.l2.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete(key, version)
+        return self.l2.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self._l1_delete(key, version)
+        return self.l2.decr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.l2.clear()
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
+
+    def get_stats(self):
+        """
+        Retorna os contadores de acertos, falhas e remoções dos dois níveis
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['l1_entries'] = len(self._l1)
+        stats['l1_max_entries'] = self._l1_max_entries
+        return stats
@@ -62,6 +62,10 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Paginação por cursor das listagens (processes.pagination)
+API_PAGE_SIZE = env.int('API_PAGE_SIZE', default=20)
+API_MAX_PAGE_SIZE = env.int('API_MAX_PAGE_SIZE', default=100)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -215,10 +219,137 @@ EMAIL_HOST_USER = env('EMAIL_HOST_USER', default='your-email@example.com')
 # Google Gemini AI
 GEMINI_API_KEY = env('GEMINI_API_KEY', default='')
 GEMINI_MODEL = env('GEMINI_MODEL', default='gemini-1.5-flash')
+# Transporte do cliente do Gemini ('grpc' ou 'rest'); vazio usa o padrão da biblioteca
+GEMINI_TRANSPORT = env('GEMINI_TRANSPORT', default='')
+
+# Espera máxima (segundos) pelas sugestões do chat após a resposta; depois disso são omitidas
+CHAT_SUGGESTIONS_TIMEOUT = env.float('CHAT_SUGGESTIONS_TIMEOUT', default=2.0)
+# Tempo (segundos) das sugestões geradas em cache
+CHAT_SUGGESTIONS_CACHE_TTL = env.int('CHAT_SUGGESTIONS_CACHE_TTL', default=86400)
+
+# Orçamento de tokens do prompt do chat: total, parcela do histórico, mensagens lidas por turno e tamanho do resumo da conversa
+CHAT_PROMPT_TOKEN_BUDGET = env.int('CHAT_PROMPT_TOKEN_BUDGET', default=8000)
+CHAT_HISTORY_TOKEN_BUDGET = env.int('CHAT_HISTORY_TOKEN_BUDGET', default=3000)
+CHAT_HISTORY_FETCH_LIMIT = env.int('CHAT_HISTORY_FETCH_LIMIT', default=40)
+CHAT_SUMMARY_MAX_TOKENS = env.int('CHAT_SUMMARY_MAX_TOKENS', default=500)
+CHAT_SUMMARY_LOCK_TIMEOUT = env.int('CHAT_SUMMARY_LOCK_TIMEOUT', default=120)
+# Threads por processo do pool que atualiza os resumos das conversas (chamadas ao Gemini)
+CHAT_SUMMARY_WORKERS = env.int('CHAT_SUMMARY_WORKERS', default=1)
+
+# Fila de análises de processos (chat.services.analysis_jobs): threads por processo, jobs ativos por usuário,
+# tentativas, backoff inicial (segundos, dobra a cada tentativa), tempo após o qual um job em execução é retomado
+# e timeout da chamada ao Gemini (menor que CHAT_ANALYSIS_JOB_TIMEOUT, para que um job não seja retomado em execução)
+CHAT_ANALYSIS_WORKERS = env.int('CHAT_ANALYSIS_WORKERS', default=2)
+CHAT_ANALYSIS_MAX_ACTIVE_JOBS_PER_USER = env.int('CHAT_ANALYSIS_MAX_ACTIVE_JOBS_PER_USER', default=2)
+CHAT_ANALYSIS_MAX_ATTEMPTS = env.int('CHAT_ANALYSIS_MAX_ATTEMPTS', default=3)
+CHAT_ANALYSIS_RETRY_BACKOFF = env.int('CHAT_ANALYSIS_RETRY_BACKOFF', default=10)
+CHAT_ANALYSIS_JOB_TIMEOUT = env.int('CHAT_ANALYSIS_JOB_TIMEOUT', default=600)
+CHAT_ANALYSIS_REQUEST_TIMEOUT = env.int('CHAT_ANALYSIS_REQUEST_TIMEOUT', default=300)
+# Intervalo (segundos) entre verificações da fila em cada worker: retentativas e jobs abandonados após um restart
+CHAT_ANALYSIS_SWEEP_INTERVAL = env.int('CHAT_ANALYSIS_SWEEP_INTERVAL', default=60)
+# Limite estimado de tokens do resumo do processo enviado para análise (chat.services.process_digest)
+CHAT_PROCESS_DIGEST_MAX_TOKENS = env.int('CHAT_PROCESS_DIGEST_MAX_TOKENS', default=2000)
+CHAT_PROCESS_DIGEST_CACHE_TTL = env.int('CHAT_PROCESS_DIGEST_CACHE_TTL', default=86400)
 
 # DataJud API (CNJ)
 DATAJUD_API_KEY = env('DATAJUD_API_KEY', default='cDZHYzlZa0JadVREZDJCendQbXY6SkJlTzNjLV9TRENyQk1RdnFKZGRQdw==')
 DATAJUD_BASE_URL = env('DATAJUD_BASE_URL', default='https://api-publica.datajud.cnj.jus.br')
+# Busca em tribunais alternativos quando o processo não está no tribunal extraído do número
+# (DATAJUD_SEARCH_DEADLINE é o prazo total, em segundos, de uma busca por número)
+DATAJUD_FALLBACK_PARALLEL = env.bool('DATAJUD_FALLBACK_PARALLEL', default=True)
+DATAJUD_FALLBACK_MAX_WORKERS = env.int('DATAJUD_FALLBACK_MAX_WORKERS', default=5)
+DATAJUD_SEARCH_DEADLINE = env.float('DATAJUD_SEARCH_DEADLINE', default=20)
+# Pool de conexões HTTP e política de retry (429/5xx) do DataJud
+DATAJUD_CONNECT_TIMEOUT = env.float('DATAJUD_CONNECT_TIMEOUT', default=5)
+DATAJUD_READ_TIMEOUT = env.float('DATAJUD_READ_TIMEOUT', default=30)
+DATAJUD_POOL_CONNECTIONS = env.int('DATAJUD_POOL_CONNECTIONS', default=4)
+DATAJUD_POOL_MAXSIZE = env.int('DATAJUD_POOL_MAXSIZE', default=10)
+DATAJUD_MAX_RETRIES = env.int('DATAJUD_MAX_RETRIES', default=2)
+DATAJUD_RETRY_BACKOFF = env.float('DATAJUD_RETRY_BACKOFF', default=0.5)
+DATAJUD_RETRY_JITTER = env.float('DATAJUD_RETRY_JITTER', default=0.5)
+# Cache negativo (segundos) para processos inexistentes e para tribunais que não possuem o processo
+DATAJUD_NEGATIVE_CACHE_TTL = env.int('DATAJUD_NEGATIVE_CACHE_TTL', default=300)
+DATAJUD_TRIBUNAL_MISS_TTL = env.int('DATAJUD_TRIBUNAL_MISS_TTL', default=900)
+# Tempo (segundos) em cache dos processos, buscas por tribunal, detalhes e lista de tribunais
+DATAJUD_PROCESS_CACHE_TTL = env.int('DATAJUD_PROCESS_CACHE_TTL', default=3600)
+DATAJUD_COURT_CACHE_TTL = env.int('DATAJUD_COURT_CACHE_TTL', default=1800)
+DATAJUD_DETAILS_CACHE_TTL = env.int('DATAJUD_DETAILS_CACHE_TTL', default=7200)
+DATAJUD_COURTS_LIST_CACHE_TTL = env.int('DATAJUD_COURTS_LIST_CACHE_TTL', default=86400)
+
+# Cache
+# L1: LRU em memória por processo (apenas famílias de chave que toleram defasagem entre workers)
+# L2: cache compartilhado entre workers e instâncias (Redis se REDIS_URL estiver definido, senão tabela no banco)
+REDIS_URL = env('REDIS_URL', default='')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'cloudpharma_backend.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': env.int('CACHE_L1_MAX_ENTRIES', default=500),
+            'L1_TIMEOUT': env.int('CACHE_L1_TIMEOUT', default=60),
+            'L1_KEY_PREFIXES': ['datajud_'],
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': env.int('CACHE_DB_MAX_ENTRIES', default=50000),
+        },
+    },
+}
+# Tempo máximo (segundos) do lock que evita consultas simultâneas iguais ao DataJud
+DATAJUD_SINGLE_FLIGHT_TIMEOUT = env.int('DATAJUD_SINGLE_FLIGHT_TIMEOUT', default=60)
+# Atualização de processos em segundo plano: os detalhes são servidos do banco e, se estiverem
+# mais antigos que o intervalo (segundos) do tribunal, uma atualização é agendada.
+# PROCESS_REFRESH_INTERVALS sobrescreve o intervalo por tribunal, ex: tjsp=1800;stj=86400
+PROCESS_REFRESH_INTERVAL = env.int('PROCESS_REFRESH_INTERVAL', default=3600)
+PROCESS_REFRESH_INTERVALS = env.dict('PROCESS_REFRESH_INTERVALS', cast={'value': int}, default={})
+PROCESS_REFRESH_LOCK_TIMEOUT = env.int('PROCESS_REFRESH_LOCK_TIMEOUT', default=120)
+# Tamanho dos lotes de INSERT/UPDATE/DELETE ao sincronizar partes e movimentações
+PROCESS_SYNC_BATCH_SIZE = env.int('PROCESS_SYNC_BATCH_SIZE', default=500)
+# Quantidade máxima de números por busca em lote (POST /processes/search/batch/)
+PROCESS_BATCH_MAX_NUMBERS = env.int('PROCESS_BATCH_MAX_NUMBERS', default=50)
+# Movimentações incluídas na representação compacta de um processo (?expand=movements traz todas)
+PROCESS_SUMMARY_MOVEMENTS = env.int('PROCESS_SUMMARY_MOVEMENTS', default=5)
+
+# Contador de notificações não lidas em cache: intervalo máximo (segundos) entre recálculos a partir do banco
+NOTIFICATION_UNREAD_COUNTER_TTL = env.int('NOTIFICATION_UNREAD_COUNTER_TTL', default=300)
+
+# Stream SSE de notificações (segundos): verificação de novas notificações, heartbeat e duração máxima da conexão
+NOTIFICATION_STREAM_POLL_INTERVAL = env.float('NOTIFICATION_STREAM_POLL_INTERVAL', default=2.0)
+NOTIFICATION_STREAM_HEARTBEAT = env.float('NOTIFICATION_STREAM_HEARTBEAT', default=15.0)
+NOTIFICATION_STREAM_MAX_DURATION = env.float('NOTIFICATION_STREAM_MAX_DURATION', default=280.0)
+NOTIFICATION_STREAM_RETRY_MS = env.int('NOTIFICATION_STREAM_RETRY_MS', default=3000)
+NOTIFICATION_STREAM_BATCH_SIZE = env.int('NOTIFICATION_STREAM_BATCH_SIZE', default=50)
+NOTIFICATION_STREAM_VERSION_TTL = env.int('NOTIFICATION_STREAM_VERSION_TTL', default=86400)
+# Streams abertos por processo sob WSGI (cada um ocupa uma das threads do gunicorn); os excedentes recebem 503
+NOTIFICATION_STREAM_WSGI_MAX_CONNECTIONS = env.int('NOTIFICATION_STREAM_WSGI_MAX_CONNECTIONS', default=2)
+
+# Envio de notificações em massa: usuários por lote (bulk_create), maior público enviado na própria requisição
+# e tempo sem progresso (segundos) após o qual um envio "em andamento" pode ser retomado
+NOTIFICATION_BROADCAST_BATCH_SIZE = env.int('NOTIFICATION_BROADCAST_BATCH_SIZE', default=1000)
+NOTIFICATION_BROADCAST_SYNC_THRESHOLD = env.int('NOTIFICATION_BROADCAST_SYNC_THRESHOLD', default=500)
+NOTIFICATION_BROADCAST_STALE_TIMEOUT = env.int('NOTIFICATION_BROADCAST_STALE_TIMEOUT', default=600)
+
+# Limpeza de notificações (comando purge_notifications): retenção em dias, linhas por lote e pausa entre lotes (segundos)
+NOTIFICATION_READ_RETENTION_DAYS = env.int('NOTIFICATION_READ_RETENTION_DAYS', default=90)
+NOTIFICATION_EXPIRED_GRACE_DAYS = env.int('NOTIFICATION_EXPIRED_GRACE_DAYS', default=0)
+NOTIFICATION_PURGE_BATCH_SIZE = env.int('NOTIFICATION_PURGE_BATCH_SIZE', default=1000)
+NOTIFICATION_PURGE_SLEEP = env.float('NOTIFICATION_PURGE_SLEEP', default=0.05)
+
+# Tarefas em segundo plano (cloudpharma_backend.background)
+BACKGROUND_MAX_WORKERS = env.int('BACKGROUND_MAX_WORKERS', default=4)
+# Pools dedicados a tarefas longas (cloudpharma_backend.background.submit_to_pool)
+BACKGROUND_POOL_WORKERS = {
+    'analysis': CHAT_ANALYSIS_WORKERS,
+    'chat': CHAT_SUMMARY_WORKERS,
+}
+BACKGROUND_TASKS_SYNC = env.bool('BACKGROUND_TASKS_SYNC', default=False)
 
 # CSRF and Security settings for Cloud Run
 CSRF_TRUSTED_ORIGINS = [
@@ -10,3 +10,9 @@ preload_app = True
 accesslog = "-"
 errorlog = "-"
 loglevel = "info"
+
+
+def post_worker_init(worker):
+    # Cada worker verifica a fila de análises: retentativas e jobs abandonados não se perdem em um restart
+    from chat.services import start_queue_sweeper
+    start_queue_sweeper()
@@ -7,4 +7,5 @@ from . import views
 urlpatterns = [
     path('live/', views.health_live, name='health_live'),
     path('ready/', views.health_ready, name='health_ready'),
+    path('cache/', views.health_cache, name='health_cache'),
 ]
@@ -4,6 +4,10 @@ Health check views for Google Cloud Run
 from django.http import JsonResponse
 from django.db import connection
 from django.core.cache import cache
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 import logging
 
 logger = logging.getLogger(__name__)
@@ -61,3 +65,21 @@ def health_ready(request):
             'check': 'readiness',
             'error': str(e)
         }, status=503)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def health_cache(request):
+    """
+    Cache statistics - hit/miss counters of the in-process (L1) and shared (L2) tiers (superusers only)
+    """
+    if not request.user.is_superuser:
+        return Response({'error': 'Acesso negado. Apenas superusers podem consultar as estatísticas do cache.'},
+                       status=status.HTTP_403_FORBIDDEN)
+    
+    get_stats = getattr(cache, 'get_stats', None)
+    return Response({
+        'service': 'jusia-backend',
+        'check': 'cache',
+        'stats': get_stats() if get_stats else None
+    })
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Notification
+from cloudpharma_backend import background
+from .models import Notification, NotificationBroadcast
+from .services import run_broadcast
 
 
 @admin.register(Notification)
@@ -9,3 +11,21 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ('title', 'message', 'user__email')
     readonly_fields = ('created_at', 'read_at')
     ordering = ('-created_at',)
+
+
+@admin.register(NotificationBroadcast)
+class NotificationBroadcastAdmin(admin.ModelAdmin):
+    list_display = ('title', 'audience', 'status', 'sent_count', 'total_recipients', 'created_at')
+    list_filter = ('audience', 'status', 'created_at')
+    search_fields = ('title', 'message')
+    readonly_fields = ('status', 'total_recipients', 'sent_count', 'last_user_id', 'error',
+                       'created_at', 'started_at', 'heartbeat_at', 'finished_at')
+    ordering = ('-created_at',)
+    actions = ('resume_broadcasts',)
+
+    @admin.action(description='Retomar envios interrompidos')
+    def resume_broadcasts(self, request, queryset):
+        # run_broadcast ignora envios concluídos e os que ainda estão progredindo
+        for broadcast_id in queryset.exclude(status=NotificationBroadcast.STATUS_COMPLETED).values_list('id', flat=True):
+            background.submit(run_broadcast, broadcast_id)
+        self.message_user(request, 'Envios agendados para retomada.')
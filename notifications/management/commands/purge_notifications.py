@@ -0,0 +1,103 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from notifications.models import Notification
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove notificações expiradas e notificações lidas além do período de retenção, em lotes pequenos. '
+        'Pode ser agendado (ex: Cloud Scheduler + Cloud Run Job) para manter a tabela e seus índices pequenos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--read-retention-days', type=int, default=settings.NOTIFICATION_READ_RETENTION_DAYS,
+            help='Dias mantidos após a leitura'
+        )
+        parser.add_argument(
+            '--expired-grace-days', type=int, default=settings.NOTIFICATION_EXPIRED_GRACE_DAYS,
+            help='Dias mantidos após a expiração'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.NOTIFICATION_PURGE_BATCH_SIZE,
+            help='Linhas removidas por transação'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=settings.NOTIFICATION_PURGE_SLEEP,
+            help='Pausa (segundos) entre lotes, para não disputar o banco com as requisições'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta as linhas que seriam removidas')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        read_cutoff = now - timedelta(days=options['read_retention_days'])
+        criteria = [
+            ('expiradas', Q(expires_at__lt=now - timedelta(days=options['expired_grace_days']))),
+            # Notificações criadas já lidas não têm read_at
+            ('lidas antigas', Q(is_read=True) & (
+                Q(read_at__lt=read_cutoff) | Q(read_at__isnull=True, created_at__lt=read_cutoff)
+            )),
+        ]
+
+        start = time.perf_counter()
+        total = 0
+        for label, condition in criteria:
+            deleted, batches = self._purge(condition, options)
+            total += deleted
+            verb = 'a remover' if options['dry_run'] else 'removidas'
+            self.stdout.write(f"Notificações {label}: {deleted} {verb} em {batches} lote(s)")
+
+        elapsed = time.perf_counter() - start
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(f"Total: {total} em {elapsed:.2f}s ({rate:.0f} linhas/s)")
+        logger.info(
+            f"Limpeza de notificações: {total} linhas em {elapsed:.2f}s"
+            f"{' (simulação)' if options['dry_run'] else ''}"
+        )
+
+    def _purge(self, condition, options):
+        """
+        Remove as linhas que atendem à condição, percorrendo a tabela por id
+
+        Cada lote é um DELETE por chave primária em sua própria transação
+        (autocommit), o que mantém os locks curtos. O percurso por id lê a
+        tabela uma única vez, em vez de reiniciar a busca a cada lote.
+
+        Returns:
+            Tupla (linhas removidas, lotes)
+        """
+        batch_size = options['batch_size']
+        deleted = 0
+        batches = 0
+        last_id = 0
+
+        while True:
+            ids = list(
+                Notification.objects.filter(condition, id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+
+            last_id = ids[-1]
+            batches += 1
+            if options['dry_run']:
+                deleted += len(ids)
+                continue
+
+            # Notification não tem dependentes nem receivers de exclusão: um único DELETE ... WHERE id IN
+            deleted += Notification.objects.filter(id__in=ids).delete()[0]
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        return deleted, batches
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('notifications', '0002_notification_indexes'),
+        ('subscriptions', '0002_subscription_subscription_user_status_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationBroadcast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('audience', models.CharField(choices=[('all', 'Todos os usuários'), ('group', 'Grupo'), ('plan', 'Plano de assinatura')], max_length=20, verbose_name='Público')),
+                ('title', models.CharField(max_length=200, verbose_name='Título')),
+                ('message', models.TextField(verbose_name='Mensagem')),
+                ('notification_type', models.CharField(choices=[('info', 'Informação'), ('success', 'Sucesso'), ('warning', 'Aviso'), ('error', 'Erro'), ('system', 'Sistema')], default='info', max_length=20, verbose_name='Tipo')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='Expira em')),
+                ('action_url', models.URLField(blank=True, null=True, verbose_name='URL de Ação')),
+                ('action_text', models.CharField(blank=True, max_length=100, null=True, verbose_name='Texto da Ação')),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('running', 'Em andamento'), ('completed', 'Concluído'), ('failed', 'Falhou')], default='pending', max_length=20, verbose_name='Status')),
+                ('total_recipients', models.PositiveIntegerField(default=0, verbose_name='Destinatários')),
+                ('sent_count', models.PositiveIntegerField(default=0, verbose_name='Enviadas')),
+                ('last_user_id', models.BigIntegerField(default=0, verbose_name='Último usuário processado')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Erro')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado em')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Concluído em')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notification_broadcasts', to=settings.AUTH_USER_MODEL, verbose_name='Criado por')),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='auth.group', verbose_name='Grupo')),
+                ('plan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='subscriptions.plan', verbose_name='Plano')),
+            ],
+            options={
+                'verbose_name': 'Envio em Massa',
+                'verbose_name_plural': 'Envios em Massa',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -35,6 +35,16 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Listagem das notificações do usuário
+            models.Index(fields=['user', '-created_at'], name='notification_user_created_idx'),
+            # Contagem e marcação das não lidas: índice parcial, só com as não lidas
+            models.Index(
+                fields=['user', 'expires_at'],
+                condition=models.Q(is_read=False),
+                name='notification_unread_idx'
+            ),
+        ]
         verbose_name = 'Notificação'
         verbose_name_plural = 'Notificações'
 
@@ -51,3 +61,89 @@ class Notification(models.Model):
         if self.expires_at:
             return timezone.now() > self.expires_at
         return False
+
+
+class NotificationBroadcast(models.Model):
+    """
+    Envio de uma notificação para um público (todos, um grupo ou um plano)
+
+    As notificações são criadas em lotes em segundo plano; sent_count e
+    last_user_id registram o progresso e permitem retomar um envio interrompido.
+    """
+    AUDIENCE_ALL = 'all'
+    AUDIENCE_GROUP = 'group'
+    AUDIENCE_PLAN = 'plan'
+    AUDIENCES = [
+        (AUDIENCE_ALL, 'Todos os usuários'),
+        (AUDIENCE_GROUP, 'Grupo'),
+        (AUDIENCE_PLAN, 'Plano de assinatura'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUSES = [
+        (STATUS_PENDING, 'Pendente'),
+        (STATUS_RUNNING, 'Em andamento'),
+        (STATUS_COMPLETED, 'Concluído'),
+        (STATUS_FAILED, 'Falhou'),
+    ]
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='notification_broadcasts',
+        verbose_name='Criado por'
+    )
+    audience = models.CharField(max_length=20, choices=AUDIENCES, verbose_name='Público')
+    group = models.ForeignKey(
+        'auth.Group',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Grupo'
+    )
+    plan = models.ForeignKey(
+        'subscriptions.Plan',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Plano'
+    )
+    title = models.CharField(max_length=200, verbose_name='Título')
+    message = models.TextField(verbose_name='Mensagem')
+    notification_type = models.CharField(
+        max_length=20,
+        choices=Notification.NOTIFICATION_TYPES,
+        default='info',
+        verbose_name='Tipo'
+    )
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name='Expira em')
+    action_url = models.URLField(null=True, blank=True, verbose_name='URL de Ação')
+    action_text = models.CharField(max_length=100, null=True, blank=True, verbose_name='Texto da Ação')
+    status = models.CharField(max_length=20, choices=STATUSES, default=STATUS_PENDING, verbose_name='Status')
+    total_recipients = models.PositiveIntegerField(default=0, verbose_name='Destinatários')
+    sent_count = models.PositiveIntegerField(default=0, verbose_name='Enviadas')
+    last_user_id = models.BigIntegerField(default=0, verbose_name='Último usuário processado')
+    error = models.TextField(blank=True, default='', verbose_name='Erro')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Iniciado em')
+    # Atualizado a cada lote: um envio "em andamento" sem progresso há muito tempo foi interrompido
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name='Último progresso')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Concluído em')
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Envio em Massa'
+        verbose_name_plural = 'Envios em Massa'
+
+    def __str__(self):
+        return f"{self.title} ({self.get_audience_display()})"
+
+    @property
+    def progress(self):
+        if not self.total_recipients:
+            return 100 if self.status == self.STATUS_COMPLETED else 0
+        return round(self.sent_count * 100 / self.total_recipients, 1)
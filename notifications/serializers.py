@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Notification
+from .models import Notification, NotificationBroadcast
 
 
 class NotificationSerializer(serializers.ModelSerializer):
@@ -37,3 +37,27 @@ class NotificationCreateSerializer(serializers.ModelSerializer):
             validated_data['expires_at'] = timezone.now() + timedelta(days=30)
         
         return super().create(validated_data)
+
+
+class NotificationBroadcastSerializer(serializers.ModelSerializer):
+    progress = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = NotificationBroadcast
+        fields = [
+            'id', 'audience', 'group', 'plan', 'title', 'message', 'notification_type',
+            'expires_at', 'action_url', 'action_text', 'status', 'total_recipients',
+            'sent_count', 'progress', 'error', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = [
+            'id', 'status', 'total_recipients', 'sent_count', 'error',
+            'created_at', 'started_at', 'finished_at'
+        ]
+
+    def validate(self, attrs):
+        audience = attrs.get('audience')
+        if audience == NotificationBroadcast.AUDIENCE_GROUP and not attrs.get('group'):
+            raise serializers.ValidationError({'group': 'Informe o grupo para envios a um grupo.'})
+        if audience == NotificationBroadcast.AUDIENCE_PLAN and not attrs.get('plan'):
+            raise serializers.ValidationError({'plan': 'Informe o plano para envios a um plano.'})
+        return attrs
@@ -0,0 +1,9 @@
+from .unread_counter import UnreadCounter, unread_counter
+from .stream import NotificationStream, notification_stream
+from .broadcast import broadcast_recipients, run_broadcast
+
+__all__ = [
+    'UnreadCounter', 'unread_counter',
+    'NotificationStream', 'notification_stream',
+    'broadcast_recipients', 'run_broadcast',
+]
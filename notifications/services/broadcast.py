@@ -0,0 +1,129 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import Notification, NotificationBroadcast
+from .stream import notification_stream
+from .unread_counter import unread_counter
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def broadcast_recipients(broadcast):
+    """
+    Retorna os ids dos usuários ativos do público do envio
+    """
+    users = User.objects.filter(is_active=True)
+    if broadcast.audience == NotificationBroadcast.AUDIENCE_GROUP:
+        users = users.filter(groups=broadcast.group_id)
+    elif broadcast.audience == NotificationBroadcast.AUDIENCE_PLAN:
+        users = users.filter(subscriptions__plan=broadcast.plan_id, subscriptions__status__name='active')
+    return users.values_list('id', flat=True).distinct()
+
+
+def run_broadcast(broadcast_id):
+    """
+    Cria as notificações de um envio em massa, em lotes de NOTIFICATION_BROADCAST_BATCH_SIZE usuários
+
+    Os destinatários são percorridos por id (keyset), cada lote é gravado com
+    bulk_create junto com o progresso e, se o envio for interrompido, uma nova
+    execução continua a partir de last_user_id sem duplicar notificações.
+
+    Envios com falha e envios "em andamento" sem progresso há mais de
+    NOTIFICATION_BROADCAST_STALE_TIMEOUT segundos (worker reiniciado ou
+    instância encerrada) podem ser retomados. Cada execução é identificada
+    pelo started_at gravado ao assumir o envio; lotes e status só são gravados
+    se ele não mudou, então uma execução antiga que volte a rodar não duplica
+    os lotes da que a substituiu.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.NOTIFICATION_BROADCAST_STALE_TIMEOUT)
+    claimed = NotificationBroadcast.objects.filter(
+        Q(status__in=[NotificationBroadcast.STATUS_PENDING, NotificationBroadcast.STATUS_FAILED])
+        | Q(status=NotificationBroadcast.STATUS_RUNNING, heartbeat_at__lt=stale)
+        # Envios iniciados antes de heartbeat_at existir
+        | Q(status=NotificationBroadcast.STATUS_RUNNING, heartbeat_at__isnull=True, started_at__lt=stale),
+        pk=broadcast_id
+    ).update(status=NotificationBroadcast.STATUS_RUNNING, started_at=now, heartbeat_at=now, error='')
+    if not claimed:
+        # Concluído ou em execução por outro worker
+        return
+
+    this_run = NotificationBroadcast.objects.filter(pk=broadcast_id, started_at=now)
+    broadcast = NotificationBroadcast.objects.get(pk=broadcast_id)
+    batch_size = settings.NOTIFICATION_BROADCAST_BATCH_SIZE
+    expires_at = broadcast.expires_at or timezone.now() + timedelta(days=30)
+
+    try:
+        recipients = broadcast_recipients(broadcast)
+        total = broadcast.sent_count + recipients.filter(id__gt=broadcast.last_user_id).count()
+        this_run.update(total_recipients=total)
+
+        last_user_id = broadcast.last_user_id
+        while True:
+            user_ids = list(recipients.filter(id__gt=last_user_id).order_by('id')[:batch_size])
+            if not user_ids:
+                break
+
+            try:
+                with transaction.atomic():
+                    _send_batch(this_run, broadcast, user_ids, expires_at, batch_size)
+            except _Superseded:
+                logger.warning(f"Envio em massa {broadcast_id} retomado por outra execução; esta foi encerrada")
+                return
+            last_user_id = user_ids[-1]
+
+            # bulk_create não dispara post_save: contadores e streams são avisados por lote
+            unread_counter.invalidate_many(user_ids)
+            notification_stream.publish_broadcast()
+    except Exception as e:
+        logger.error(f"Erro no envio em massa {broadcast_id}: {str(e)}")
+        this_run.update(
+            status=NotificationBroadcast.STATUS_FAILED,
+            error=str(e)
+        )
+        return
+
+    this_run.update(
+        status=NotificationBroadcast.STATUS_COMPLETED,
+        finished_at=timezone.now()
+    )
+
+
+class _Superseded(Exception):
+    """
+    O envio foi retomado por outra execução enquanto esta estava parada
+    """
+
+
+def _send_batch(this_run, broadcast, user_ids, expires_at, batch_size):
+    """
+    Grava as notificações de um lote e avança o progresso, na transação do chamador
+    """
+    Notification.objects.bulk_create([
+        Notification(
+            user_id=user_id,
+            title=broadcast.title,
+            message=broadcast.message,
+            notification_type=broadcast.notification_type,
+            expires_at=expires_at,
+            action_url=broadcast.action_url,
+            action_text=broadcast.action_text
+        )
+        for user_id in user_ids
+    ], batch_size=batch_size)
+    advanced = this_run.filter(status=NotificationBroadcast.STATUS_RUNNING).update(
+        sent_count=F('sent_count') + len(user_ids),
+        last_user_id=user_ids[-1],
+        heartbeat_at=timezone.now()
+    )
+    if not advanced:
+        # Desfaz o lote: outra execução assumiu o envio
+        raise _Superseded()
@@ -0,0 +1,135 @@
+import logging
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+
+from processes.models import ProcessNotification
+from ..models import Notification
+from ..serializers import NotificationSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationStream:
+    """
+    Distribuição de novas notificações para as conexões SSE de qualquer worker
+
+    Cada usuário tem uma versão no cache compartilhado, alterada quando ele
+    recebe uma notificação (e uma versão global para envios em massa). As
+    conexões abertas leem apenas essas chaves e só consultam o banco quando
+    a versão muda.
+
+    A posição de um cliente no stream é o cursor "<id Notification>-<id ProcessNotification>",
+    enviado como id dos eventos SSE e devolvido pelo navegador em Last-Event-ID.
+    """
+    BROADCAST_KEY = 'notifications_stream_all'
+
+    def _user_key(self, user_id) -> str:
+        return f"notifications_stream_{user_id}"
+
+    def publish(self, user_id):
+        """
+        Avisa as conexões do usuário que há novas notificações
+        """
+        self._bump(self._user_key(user_id))
+
+    def publish_broadcast(self):
+        """
+        Avisa todas as conexões que há novas notificações (envios em massa)
+        """
+        self._bump(self.BROADCAST_KEY)
+
+    def _bump(self, key: str):
+        timeout = settings.NOTIFICATION_STREAM_VERSION_TTL
+        if cache.add(key, 1, timeout):
+            return
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Expirou entre o add e o incr
+            cache.set(key, 1, timeout)
+
+    def version(self, user_id) -> Tuple[int, int]:
+        """
+        Retorna a versão atual do usuário e a global; qualquer mudança indica novas notificações
+        """
+        user_key = self._user_key(user_id)
+        values = cache.get_many([user_key, self.BROADCAST_KEY])
+        return values.get(user_key, 0), values.get(self.BROADCAST_KEY, 0)
+
+    def parse_cursor(self, value: Optional[str]) -> Optional[Tuple[int, int]]:
+        """
+        Converte um Last-Event-ID no cursor (id Notification, id ProcessNotification)
+        """
+        try:
+            notification_id, process_notification_id = (int(part) for part in value.split('-'))
+        except (AttributeError, ValueError):
+            return None
+        return notification_id, process_notification_id
+
+    def format_cursor(self, cursor: Tuple[int, int]) -> str:
+        return f"{cursor[0]}-{cursor[1]}"
+
+    def current_cursor(self) -> Tuple[int, int]:
+        """
+        Cursor posicionado após as notificações já existentes (nova conexão sem histórico)
+        """
+        notification_id = Notification.objects.aggregate(last=Max('id'))['last'] or 0
+        process_notification_id = ProcessNotification.objects.aggregate(last=Max('id'))['last'] or 0
+        return notification_id, process_notification_id
+
+    def fetch(self, user_id, cursor: Tuple[int, int]) -> Tuple[List[Tuple[str, dict, Tuple[int, int]]], Tuple[int, int], bool]:
+        """
+        Busca as notificações do usuário posteriores ao cursor, até NOTIFICATION_STREAM_BATCH_SIZE de cada tipo
+
+        Returns:
+            Tupla (eventos [(tipo, dados, cursor após o evento)], novo cursor, se um dos lotes veio cheio
+            e pode haver mais notificações após o novo cursor)
+        """
+        limit = settings.NOTIFICATION_STREAM_BATCH_SIZE
+        notification_id, process_notification_id = cursor
+        events = []
+
+        notifications = list(Notification.objects.filter(
+            user_id=user_id,
+            id__gt=notification_id,
+            expires_at__gt=timezone.now()
+        ).order_by('id')[:limit])
+        for notification in notifications:
+            notification_id = notification.id
+            events.append((
+                'notification',
+                NotificationSerializer(notification).data,
+                (notification_id, process_notification_id)
+            ))
+
+        process_notifications = list(ProcessNotification.objects.filter(
+            user_id=user_id,
+            id__gt=process_notification_id
+        ).select_related('process').order_by('id')[:limit])
+        for notification in process_notifications:
+            process_notification_id = notification.id
+            events.append((
+                'process_notification',
+                {
+                    'id': notification.id,
+                    'process_id': notification.process_id,
+                    'process_number': notification.process.process_number,
+                    'notification_type': notification.notification_type,
+                    'title': notification.title,
+                    'message': notification.message,
+                    'is_read': notification.is_read,
+                    'created_at': notification.created_at.isoformat(),
+                },
+                (notification_id, process_notification_id)
+            ))
+
+        has_more = len(notifications) == limit or len(process_notifications) == limit
+        return events, (notification_id, process_notification_id), has_more
+
+
+# Instância global do serviço
+notification_stream = NotificationStream()
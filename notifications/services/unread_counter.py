@@ -0,0 +1,113 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import BaseCache
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from ..models import Notification
+
+logger = logging.getLogger(__name__)
+
+
+class UnreadCounter:
+    """
+    Contador de notificações não lidas por usuário, mantido no cache compartilhado
+
+    O contador é recalculado a partir do banco quando não está no cache. Ele
+    expira após NOTIFICATION_UNREAD_COUNTER_TTL (reconciliação periódica) ou
+    quando a próxima notificação não lida expira, o que ocorrer primeiro.
+    Criações (sinal post_save) e leituras ajustam o valor em cache com
+    incr/decr quando o cache compartilhado os implementa de forma atômica
+    (Redis); nos demais (tabela do banco) o contador é descartado e recalculado.
+    """
+
+    def _key(self, user_id) -> str:
+        return f"notifications_unread_{user_id}"
+
+    def get(self, user_id) -> int:
+        """
+        Retorna a quantidade de notificações não lidas e não expiradas do usuário
+        """
+        count = cache.get(self._key(user_id))
+        if count is None:
+            count = self.reconcile(user_id)
+        return count
+
+    def reconcile(self, user_id) -> int:
+        """
+        Recalcula o contador a partir do banco e o salva no cache
+        """
+        now = timezone.now()
+        result = Notification.objects.filter(
+            user_id=user_id,
+            is_read=False,
+            expires_at__gt=now
+        ).aggregate(count=Count('id'), next_expiry=Min('expires_at'))
+
+        timeout = settings.NOTIFICATION_UNREAD_COUNTER_TTL
+        if result['next_expiry'] is not None:
+            # O valor deixa de valer quando a primeira notificação contada expirar
+            timeout = max(1, min(timeout, int((result['next_expiry'] - now).total_seconds())))
+
+        cache.set(self._key(user_id), result['count'], timeout)
+        return result['count']
+
+    def on_created(self, notification):
+        """
+        Ajusta o contador após a criação de uma notificação
+        """
+        if notification.is_read or notification.expires_at is None:
+            return
+        if notification.expires_at <= timezone.now() + timedelta(seconds=settings.NOTIFICATION_UNREAD_COUNTER_TTL):
+            # Expira antes da próxima reconciliação: o contador precisa ser recalculado
+            self.invalidate(notification.user_id)
+            return
+        self._add(notification.user_id, 1)
+
+    def on_read(self, user_id, count: int = 1):
+        """
+        Ajusta o contador após notificações não lidas serem marcadas como lidas
+        """
+        if count:
+            self._add(user_id, -count)
+
+    def invalidate(self, user_id):
+        """
+        Descarta o contador, que será recalculado na próxima leitura
+        """
+        cache.delete(self._key(user_id))
+
+    def invalidate_many(self, user_ids):
+        """
+        Descarta os contadores de vários usuários (envios em massa)
+        """
+        cache.delete_many([self._key(user_id) for user_id in user_ids])
+
+    def _has_atomic_incr(self) -> bool:
+        backend = caches['default']
+        backend = getattr(backend, 'l2', backend)
+        # O incr genérico de BaseCache faz get + set: perde atualizações concorrentes
+        # e troca o timeout alinhado à expiração definido em reconcile()
+        return type(backend).incr is not BaseCache.incr
+
+    def _add(self, user_id, delta: int):
+        if not self._has_atomic_incr():
+            self.invalidate(user_id)
+            return
+
+        key = self._key(user_id)
+        try:
+            value = cache.incr(key, delta)
+        except ValueError:
+            # Contador fora do cache: será recalculado na próxima leitura
+            return
+        if value < 0:
+            logger.warning(f"Contador de não lidas negativo para o usuário {user_id}, recalculando")
+            self.invalidate(user_id)
+
+
+# Instância global do serviço
+unread_counter = UnreadCounter()
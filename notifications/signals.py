@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from processes.models import ProcessNotification
+from .models import Notification
+from .services import notification_stream, unread_counter
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_save, sender=ProcessNotification)
+def publish_new_notification(sender, instance, created, **kwargs):
+    """
+    Avisa as conexões SSE do usuário após o commit da nova notificação
+    """
+    if created:
+        transaction.on_commit(lambda: notification_stream.publish(instance.user_id))
+
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    """
+    Ajusta o contador de não lidas após o commit, qualquer que seja a origem (views, admin, serviços)
+
+    Envios com bulk_create não disparam o sinal e descartam os contadores (ver run_broadcast).
+    """
+    if created:
+        transaction.on_commit(lambda: unread_counter.on_created(instance))
@@ -0,0 +1,497 @@
+import json
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from django.contrib.auth.models import Group
+from subscriptions.models import Plan, Subscription, SubscriptionStatus
+
+from .models import Notification, NotificationBroadcast
+from .services import notification_stream, run_broadcast, unread_counter
+from .views import _notification_events
+
+User = get_user_model()
+
+
+@override_settings(NOTIFICATION_UNREAD_COUNTER_TTL=300)
+class UnreadCounterTests(APITestCase):
+    """Testes para o contador de notificações não lidas em cache"""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='user@example.com', password='testpass123')
+        self.admin = User.objects.create_superuser(email='admin@example.com', password='testpass123')
+        self._authenticate(self.user)
+    
+    def _authenticate(self, user):
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+    
+    def _create(self, **kwargs):
+        defaults = {
+            'user': self.user,
+            'title': 'Aviso',
+            'message': 'Mensagem',
+            'expires_at': timezone.now() + timedelta(days=1)
+        }
+        defaults.update(kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(**defaults)
+    
+    def _unread_count(self):
+        return self.client.get('/notifications/user/unread-count/').data['unread_count']
+    
+    def test_count_served_from_cache(self):
+        """Testa que a contagem é lida do cache após o primeiro cálculo"""
+        self._create()
+        self._create()
+        self._create(expires_at=timezone.now() - timedelta(minutes=1))
+        self._create(is_read=True)
+        
+        self.assertEqual(self._unread_count(), 2)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._unread_count(), 2)
+        self.assertFalse(any('notifications_notification' in query['sql'] for query in queries.captured_queries))
+    
+    # Cache com incr atômico, como o Redis
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_write_through_updates(self):
+        """Testa que criação e leitura ajustam o contador"""
+        cache.clear()
+        first = self._create()
+        self._create()
+        self.assertEqual(self._unread_count(), 2)
+        
+        self._authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/notifications/admin/create/', {
+                'user': self.user.id,
+                'title': 'Nova',
+                'message': 'Mensagem'
+            })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self._authenticate(self.user)
+        self.assertEqual(cache.get(f'notifications_unread_{self.user.id}'), 3)
+        
+        self.client.put(f'/notifications/user/mark-read/{first.id}/')
+        self.client.put(f'/notifications/user/mark-read/{first.id}/')
+        self.assertEqual(self._unread_count(), 2)
+        
+        self.client.put('/notifications/user/mark-all-read/')
+        self.assertEqual(self._unread_count(), 0)
+        self.assertEqual(unread_counter.reconcile(self.user.id), 0)
+    
+    def test_database_cache_recounts_instead_of_incr(self):
+        """Testa que sem incr atômico (tabela do banco) o contador é descartado e recalculado"""
+        first = self._create(expires_at=timezone.now() + timedelta(days=1))
+        self.assertEqual(self._unread_count(), 1)
+        
+        with patch.object(cache, 'incr') as mock_incr:
+            self._create()
+            self.assertIsNone(cache.get(f'notifications_unread_{self.user.id}'))
+            self.assertEqual(self._unread_count(), 2)
+            
+            self.client.put(f'/notifications/user/mark-read/{first.id}/')
+            self.assertIsNone(cache.get(f'notifications_unread_{self.user.id}'))
+            self.assertEqual(self._unread_count(), 1)
+        
+        key = f'notifications_unread_{self.user.id}'
+        self.assertFalse(any(call.args[0] == key for call in mock_incr.call_args_list))
+    
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_notifications_created_outside_views_are_counted(self):
+        """Testa que notificações criadas fora das views (admin, comandos, serviços) entram no contador"""
+        cache.clear()
+        self.assertEqual(self._unread_count(), 0)
+        
+        self._create()
+        
+        self.assertEqual(cache.get(f'notifications_unread_{self.user.id}'), 1)
+        self.assertEqual(self._unread_count(), 1)
+    
+    def test_counter_expires_with_next_notification(self):
+        """Testa que o contador não sobrevive à expiração da primeira notificação contada"""
+        self._create(expires_at=timezone.now() + timedelta(seconds=30))
+        self._create(expires_at=timezone.now() + timedelta(days=1))
+        
+        with patch('notifications.services.unread_counter.cache') as mock_cache:
+            self.assertEqual(unread_counter.reconcile(self.user.id), 2)
+        
+        key, count, timeout = mock_cache.set.call_args[0]
+        self.assertEqual(count, 2)
+        self.assertLessEqual(timeout, 30)
+    
+    def test_short_lived_notification_invalidates(self):
+        """Testa que notificações que expiram antes da reconciliação descartam o contador"""
+        self.assertEqual(self._unread_count(), 0)
+        self._create(expires_at=timezone.now() + timedelta(seconds=30))
+        
+        self.assertIsNone(cache.get(f'notifications_unread_{self.user.id}'))
+        self.assertEqual(self._unread_count(), 1)
+    
+    def test_delete_invalidates(self):
+        """Testa que a remoção de uma notificação descarta o contador"""
+        notification = self._create()
+        self.assertEqual(self._unread_count(), 1)
+        
+        self._authenticate(self.admin)
+        self.client.delete(f'/notifications/admin/{notification.id}/delete/')
+        self._authenticate(self.user)
+        
+        self.assertEqual(self._unread_count(), 0)
+
+
+
+@override_settings(
+    NOTIFICATION_STREAM_POLL_INTERVAL=0,
+    NOTIFICATION_STREAM_HEARTBEAT=60,
+    NOTIFICATION_STREAM_MAX_DURATION=5
+)
+class NotificationStreamTests(TestCase):
+    """Testes para o stream SSE de notificações"""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='user@example.com', password='testpass123')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+    
+    def _create(self, **kwargs):
+        defaults = {
+            'user': self.user,
+            'title': 'Aviso',
+            'message': 'Mensagem',
+            'expires_at': timezone.now() + timedelta(days=1)
+        }
+        defaults.update(kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(**defaults)
+    
+    async def _next_event(self, events):
+        # Pula heartbeats até o próximo evento
+        while True:
+            chunk = await events.__anext__()
+            if not chunk.startswith(':'):
+                return chunk
+    
+    async def test_requires_authentication(self):
+        """Testa que o stream exige um token válido"""
+        response = await AsyncClient().get('/notifications/user/stream/')
+        self.assertEqual(response.status_code, 401)
+        
+        response = await AsyncClient().get('/notifications/user/stream/', {'token': 'invalido'})
+        self.assertEqual(response.status_code, 401)
+    
+    async def test_stream_with_query_token(self):
+        """Testa que o token em ?token= abre o stream"""
+        response = await AsyncClient().get('/notifications/user/stream/', {'token': self.token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        
+        events = aiter(response.streaming_content)
+        self.assertTrue((await anext(events)).startswith(b'retry:'))
+        self.assertIn(b'event: unread_count', await anext(events))
+        await events.aclose()
+    
+    @override_settings(NOTIFICATION_STREAM_MAX_DURATION=60)
+    def test_wsgi_stream_sends_events_incrementally(self):
+        """Testa que sob WSGI os eventos chegam antes do fim do stream"""
+        start = time.monotonic()
+        response = Client().get('/notifications/user/stream/', {'token': self.token})
+        self.assertEqual(response.status_code, 200)
+        
+        events = iter(response.streaming_content)
+        self.assertTrue(next(events).startswith(b'retry:'))
+        self.assertIn(b'event: unread_count', next(events))
+        
+        self._create(title='Nova')
+        event = next(chunk for chunk in events if not chunk.startswith(b':'))
+        self.assertIn(b'"title": "Nova"', event)
+        # Bem antes de NOTIFICATION_STREAM_MAX_DURATION
+        self.assertLess(time.monotonic() - start, 10)
+        response.close()
+    
+    @override_settings(NOTIFICATION_STREAM_WSGI_MAX_CONNECTIONS=1)
+    def test_wsgi_streams_limited(self):
+        """Testa que sob WSGI os streams além do limite recebem 503 e a vaga volta ao fechar"""
+        first = Client().get('/notifications/user/stream/', {'token': self.token})
+        self.assertEqual(first.status_code, 200)
+    
+        refused = Client().get('/notifications/user/stream/', {'token': self.token})
+        self.assertEqual(refused.status_code, 503)
+        self.assertTrue(refused.content.startswith(b'retry:'))
+        self.assertIn('Retry-After', refused)
+    
+        # Fechado antes do primeiro evento (cliente desconectou)
+        first.close()
+        second = Client().get('/notifications/user/stream/', {'token': self.token})
+        self.assertEqual(second.status_code, 200)
+        second.close()
+    
+    async def test_pushes_new_notifications(self):
+        """Testa que notificações criadas após a conexão são enviadas com o cursor como id"""
+        await sync_to_async(self._create)()
+        events = _notification_events(self.user.id)
+        
+        self.assertTrue((await anext(events)).startswith('retry:'))
+        self.assertIn('"unread_count": 1', await anext(events))
+        
+        notification = await sync_to_async(self._create)(title='Nova')
+        event = await self._next_event(events)
+        self.assertIn(f'id: {notification.id}-0', event)
+        self.assertIn('event: notification', event)
+        self.assertIn('"title": "Nova"', event)
+        self.assertIn('"unread_count": 2', await self._next_event(events))
+        await events.aclose()
+    
+    async def test_resume_from_last_event_id(self):
+        """Testa que a reconexão com Last-Event-ID recebe apenas o que foi perdido"""
+        first = await sync_to_async(self._create)(title='Primeira')
+        await sync_to_async(self._create)(title='Segunda')
+        await sync_to_async(self._create)(title='Expirada', expires_at=timezone.now() - timedelta(minutes=1))
+        
+        events = _notification_events(self.user.id, f'{first.id}-0')
+        await anext(events)
+        event = await anext(events)
+        self.assertIn('"title": "Segunda"', event)
+        self.assertIn('event: unread_count', await anext(events))
+        await events.aclose()
+    
+    @override_settings(NOTIFICATION_STREAM_BATCH_SIZE=2)
+    async def test_backlog_larger_than_batch_delivered(self):
+        """Testa que um atraso maior que o lote é enviado inteiro sem esperar nova publicação"""
+        first = await sync_to_async(self._create)(title='Primeira')
+        for index in range(5):
+            await sync_to_async(self._create)(title=f'Atrasada {index}')
+    
+        events = _notification_events(self.user.id, f'{first.id}-0')
+        titles = []
+        async for chunk in events:
+            if 'event: notification' in chunk:
+                titles.append(json.loads(chunk.split('data: ', 1)[1])['title'])
+            if len(titles) == 5:
+                break
+        await events.aclose()
+    
+        self.assertEqual(titles, [f'Atrasada {index}' for index in range(5)])
+    
+    @override_settings(NOTIFICATION_STREAM_HEARTBEAT=0)
+    async def test_heartbeat(self):
+        """Testa o envio de heartbeat sem novas notificações"""
+        events = _notification_events(self.user.id)
+        await anext(events)
+        await anext(events)
+        self.assertEqual(await anext(events), ': ping\n\n')
+        await events.aclose()
+    
+    def test_publish_changes_version(self):
+        """Testa que a criação de notificação altera a versão observada pelo stream"""
+        version = notification_stream.version(self.user.id)
+        self._create()
+        self.assertNotEqual(notification_stream.version(self.user.id), version)
+        self.assertIsNone(notification_stream.parse_cursor('abc'))
+        self.assertEqual(notification_stream.parse_cursor('3-7'), (3, 7))
+
+
+
+@override_settings(NOTIFICATION_BROADCAST_BATCH_SIZE=2, NOTIFICATION_BROADCAST_SYNC_THRESHOLD=3, BACKGROUND_TASKS_SYNC=True)
+class NotificationBroadcastTests(APITestCase):
+    """Testes para o envio de notificações em massa"""
+    
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(email='admin@example.com', password='testpass123')
+        self.users = [
+            User.objects.create_user(email=f'user{index}@example.com', password='testpass123')
+            for index in range(4)
+        ]
+        User.objects.create_user(email='inactive@example.com', password='testpass123', is_active=False)
+        refresh = RefreshToken.for_user(self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+    
+    def _broadcast(self, **kwargs):
+        data = {'audience': 'all', 'title': 'Manutenção', 'message': 'Sistema indisponível às 22h'}
+        data.update(kwargs)
+        return self.client.post('/notifications/admin/broadcast/', data)
+    
+    def test_requires_superuser(self):
+        """Testa que apenas superusers podem enviar em massa"""
+        refresh = RefreshToken.for_user(self.users[0])
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+        
+        response = self._broadcast()
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_audience_requires_target(self):
+        """Testa que envios a grupo ou plano exigem o alvo"""
+        self.assertEqual(self._broadcast(audience='group').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._broadcast(audience='plan').status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_group_broadcast_runs_inline(self):
+        """Testa que públicos pequenos são enviados na própria requisição"""
+        group = Group.objects.create(name='Beta')
+        group.user_set.add(self.users[0], self.users[1])
+        
+        response = self._broadcast(audience='group', group=group.id)
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.data['sent_count'], 2)
+        self.assertEqual(response.data['progress'], 100)
+        self.assertEqual(
+            set(Notification.objects.values_list('user_id', flat=True)),
+            {self.users[0].id, self.users[1].id}
+        )
+    
+    def test_plan_broadcast_targets_active_subscriptions(self):
+        """Testa que o envio a um plano considera apenas assinaturas ativas"""
+        plan = Plan.objects.create(name='Pro', stripe_price_id='price_pro', price=10)
+        active = SubscriptionStatus.objects.create(name='active')
+        canceled = SubscriptionStatus.objects.create(name='canceled')
+        for index, (user, subscription_status) in enumerate([(self.users[0], active), (self.users[1], canceled)]):
+            Subscription.objects.create(
+                user=user, plan=plan, status=subscription_status,
+                stripe_subscription_id=f'sub_{index}', stripe_customer_id=f'cus_{index}'
+            )
+        
+        response = self._broadcast(audience='plan', plan=plan.id)
+        
+        self.assertEqual(response.data['sent_count'], 1)
+        self.assertEqual(list(Notification.objects.values_list('user_id', flat=True)), [self.users[0].id])
+    
+    def test_large_broadcast_runs_in_background(self):
+        """Testa que públicos grandes são enviados em segundo plano, em lotes, com progresso"""
+        unread_counter.get(self.users[0].id)
+        
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self._broadcast()
+        
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertEqual(Notification.objects.count(), 0)
+        
+        for callback in callbacks:
+            callback()
+        
+        progress = self.client.get(f"/notifications/admin/broadcast/{response.data['id']}/").data
+        self.assertEqual(progress['status'], 'completed')
+        self.assertEqual(progress['total_recipients'], 5)
+        self.assertEqual(progress['sent_count'], 5)
+        self.assertEqual(Notification.objects.count(), 5)
+        self.assertEqual(unread_counter.get(self.users[0].id), 1)
+    
+    def test_resume_does_not_duplicate(self):
+        """Testa que um envio interrompido continua do último usuário processado"""
+        recipients = sorted([self.admin.id] + [user.id for user in self.users])
+        broadcast = NotificationBroadcast.objects.create(
+            audience='all', title='Aviso', message='Mensagem',
+            status=NotificationBroadcast.STATUS_FAILED,
+            sent_count=2, last_user_id=recipients[1]
+        )
+        
+        run_broadcast(broadcast.id)
+        broadcast.refresh_from_db()
+        
+        self.assertEqual(broadcast.status, NotificationBroadcast.STATUS_COMPLETED)
+        self.assertEqual(broadcast.sent_count, 5)
+        self.assertEqual(broadcast.total_recipients, 5)
+        self.assertEqual(sorted(Notification.objects.values_list('user_id', flat=True)), recipients[2:])
+        
+        # Envio concluído não é executado novamente
+        run_broadcast(broadcast.id)
+        self.assertEqual(Notification.objects.count(), 3)
+    
+    @override_settings(NOTIFICATION_BROADCAST_STALE_TIMEOUT=60)
+    def test_stale_running_broadcast_resumed(self):
+        """Testa que um envio "em andamento" sem progresso (worker interrompido) é retomado"""
+        recipients = sorted([self.admin.id] + [user.id for user in self.users])
+        now = timezone.now()
+        broadcast = NotificationBroadcast.objects.create(
+            audience='all', title='Aviso', message='Mensagem',
+            status=NotificationBroadcast.STATUS_RUNNING,
+            sent_count=2, last_user_id=recipients[1],
+            started_at=now, heartbeat_at=now
+        )
+        
+        # Ainda progredindo: não é assumido por outra execução
+        run_broadcast(broadcast.id)
+        self.assertEqual(Notification.objects.count(), 0)
+        
+        NotificationBroadcast.objects.filter(id=broadcast.id).update(heartbeat_at=now - timedelta(minutes=5))
+        run_broadcast(broadcast.id)
+        broadcast.refresh_from_db()
+        
+        self.assertEqual(broadcast.status, NotificationBroadcast.STATUS_COMPLETED)
+        self.assertEqual(broadcast.sent_count, 5)
+        self.assertEqual(sorted(Notification.objects.values_list('user_id', flat=True)), recipients[2:])
+    
+    @override_settings(NOTIFICATION_BROADCAST_BATCH_SIZE=2)
+    def test_superseded_run_stops_without_duplicates(self):
+        """Testa que uma execução substituída por outra desfaz o lote em andamento e encerra"""
+        broadcast = NotificationBroadcast.objects.create(audience='all', title='Aviso', message='Mensagem')
+        
+        def take_over():
+            # Outra execução assume o envio após o primeiro lote
+            NotificationBroadcast.objects.filter(id=broadcast.id).update(started_at=timezone.now() + timedelta(seconds=1))
+        
+        with patch('notifications.services.broadcast.notification_stream.publish_broadcast', side_effect=take_over):
+            run_broadcast(broadcast.id)
+        broadcast.refresh_from_db()
+        
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(broadcast.sent_count, 2)
+        self.assertEqual(broadcast.status, NotificationBroadcast.STATUS_RUNNING)
+
+
+
+class PurgeNotificationsCommandTests(APITestCase):
+    """Testes para o comando de limpeza de notificações"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='testpass123')
+        now = timezone.now()
+        self.kept = [
+            self._create(expires_at=now + timedelta(days=1)),
+            self._create(expires_at=now + timedelta(days=1), is_read=True, read_at=now - timedelta(days=10)),
+        ]
+        self._create(expires_at=now - timedelta(days=1))
+        self._create(expires_at=now - timedelta(days=2))
+        self._create(expires_at=now + timedelta(days=1), is_read=True, read_at=now - timedelta(days=100))
+        self._create(expires_at=now - timedelta(days=1), is_read=True, read_at=now - timedelta(days=100))
+    
+    def _create(self, **kwargs):
+        return Notification.objects.create(user=self.user, title='Aviso', message='Mensagem', **kwargs)
+    
+    def _purge(self, *args):
+        out = StringIO()
+        call_command('purge_notifications', '--batch-size=1', '--sleep=0', *args, stdout=out)
+        return out.getvalue()
+    
+    def test_purges_expired_and_old_read(self):
+        """Testa a remoção em lotes de expiradas e lidas além da retenção"""
+        output = self._purge('--read-retention-days=30')
+        
+        self.assertEqual(set(Notification.objects.values_list('id', flat=True)), {n.id for n in self.kept})
+        self.assertIn('Notificações expiradas: 3 removidas em 3 lote(s)', output)
+        self.assertIn('Notificações lidas antigas: 1 removidas', output)
+        self.assertIn('Total: 4', output)
+    
+    def test_dry_run(self):
+        """Testa que a simulação apenas conta as linhas"""
+        output = self._purge('--read-retention-days=5', '--dry-run')
+        
+        self.assertEqual(Notification.objects.count(), 6)
+        self.assertIn('Notificações lidas antigas: 3 a remover', output)
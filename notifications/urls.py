@@ -4,10 +4,13 @@ from .views import (
     get_unread_count,
     mark_as_read,
     mark_all_as_read,
+    stream_notifications,
     list_all_notifications,
     create_notification,
     update_notification,
     delete_notification,
+    create_broadcast,
+    get_broadcast,
 )
 
 urlpatterns = [
@@ -16,10 +19,13 @@ urlpatterns = [
     path('user/unread-count/', get_unread_count, name='unread_count'),
     path('user/mark-read/<int:notification_id>/', mark_as_read, name='mark_as_read'),
     path('user/mark-all-read/', mark_all_as_read, name='mark_all_read'),
+    path('user/stream/', stream_notifications, name='stream_notifications'),
     
     # Rotas de administração (superuser)
     path('admin/', list_all_notifications, name='list_all_notifications'),
     path('admin/create/', create_notification, name='create_notification'),
     path('admin/<int:notification_id>/', update_notification, name='update_notification'),
     path('admin/<int:notification_id>/delete/', delete_notification, name='delete_notification'),
+    path('admin/broadcast/', create_broadcast, name='create_broadcast'),
+    path('admin/broadcast/<int:broadcast_id>/', get_broadcast, name='get_broadcast'),
 ]
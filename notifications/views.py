@@ -1,12 +1,26 @@
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from .models import Notification
-from .serializers import NotificationSerializer, NotificationCreateSerializer
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from asgiref.sync import sync_to_async
+import asyncio
+import json
+import threading
+import time
+from cloudpharma_backend import background
+from .models import Notification, NotificationBroadcast
+from .serializers import NotificationSerializer, NotificationCreateSerializer, NotificationBroadcastSerializer
+from .services import unread_counter, notification_stream, broadcast_recipients, run_broadcast
 
 
 @api_view(['GET'])
@@ -27,12 +41,8 @@ def get_user_notifications(request):
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
 def get_unread_count(request):
-    """Obter contagem de notificações não lidas"""
-    count = Notification.objects.filter(
-        user=request.user,
-        is_read=False,
-        expires_at__gt=timezone.now()
-    ).count()
+    """Obter contagem de notificações não lidas (contador em cache)"""
+    count = unread_counter.get(request.user.id)
     
     return Response({'unread_count': count})
 
@@ -43,7 +53,10 @@ def get_unread_count(request):
 def mark_as_read(request, notification_id):
     """Marcar notificação como lida"""
     notification = get_object_or_404(Notification, id=notification_id, user=request.user)
+    counted = not notification.is_read and notification.expires_at is not None and not notification.is_expired()
     notification.mark_as_read()
+    if counted:
+        unread_counter.on_read(request.user.id)
     
     return Response({'message': 'Notificação marcada como lida'})
 
@@ -53,11 +66,12 @@ def mark_as_read(request, notification_id):
 @permission_classes([IsAuthenticated])
 def mark_all_as_read(request):
     """Marcar todas as notificações como lidas"""
-    Notification.objects.filter(
+    updated = Notification.objects.filter(
         user=request.user,
         is_read=False,
         expires_at__gt=timezone.now()
     ).update(is_read=True, read_at=timezone.now())
+    unread_counter.on_read(request.user.id, updated)
     
     return Response({'message': 'Todas as notificações foram marcadas como lidas'})
 
@@ -107,6 +121,8 @@ def update_notification(request, notification_id):
     
     if serializer.is_valid():
         serializer.save()
+        # Leitura ou expiração podem ter mudado
+        unread_counter.invalidate(notification.user_id)
         return Response(serializer.data)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -122,5 +138,257 @@ def delete_notification(request, notification_id):
     
     notification = get_object_or_404(Notification, id=notification_id)
     notification.delete()
+    unread_counter.invalidate(notification.user_id)
     
     return Response({'message': 'Notificação deletada com sucesso'}, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def create_broadcast(request):
+    """Enviar notificação para todos os usuários, um grupo ou um plano - apenas para superusers"""
+    if not request.user.is_superuser:
+        return Response({'error': 'Acesso negado. Apenas superusers podem enviar notificações em massa.'}, 
+                       status=status.HTTP_403_FORBIDDEN)
+    
+    serializer = NotificationBroadcastSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    broadcast = serializer.save(created_by=request.user)
+    
+    if broadcast_recipients(broadcast).count() <= settings.NOTIFICATION_BROADCAST_SYNC_THRESHOLD:
+        # Público pequeno: envio na própria requisição
+        run_broadcast(broadcast.id)
+        broadcast.refresh_from_db()
+        return Response(NotificationBroadcastSerializer(broadcast).data, status=status.HTTP_201_CREATED)
+    
+    # Público grande: envio em segundo plano, acompanhado por get_broadcast
+    background.submit(run_broadcast, broadcast.id)
+    return Response(NotificationBroadcastSerializer(broadcast).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def get_broadcast(request, broadcast_id):
+    """Progresso de um envio em massa - apenas para superusers"""
+    if not request.user.is_superuser:
+        return Response({'error': 'Acesso negado. Apenas superusers podem consultar envios em massa.'}, 
+                       status=status.HTTP_403_FORBIDDEN)
+    
+    broadcast = get_object_or_404(NotificationBroadcast, id=broadcast_id)
+    return Response(NotificationBroadcastSerializer(broadcast).data)
+
+
+# Stream de eventos (SSE)
+@require_GET
+def stream_notifications(request):
+    """
+    Stream SSE de novas notificações do usuário logado (substitui o polling)
+
+    Sob WSGI (deploy atual, gunicorn com threads) os eventos são gerados por
+    um iterador síncrono e enviados à medida que são produzidos; cada conexão
+    ocupa uma thread do worker até ser encerrada, então no máximo
+    NOTIFICATION_STREAM_WSGI_MAX_CONNECTIONS streams ficam abertos por
+    processo e os demais recebem 503 (o cliente volta ao polling). Sob ASGI
+    (cloudpharma_backend.asgi:application) o iterador é assíncrono, não
+    ocupa threads enquanto espera e não há limite.
+
+    O token JWT pode ser enviado no header Authorization ou em ?token=, já que
+    o EventSource do navegador não permite headers. A reconexão continua do
+    header Last-Event-ID (ou ?last_event_id=).
+    """
+    user = _authenticate_stream(request)
+    if user is None:
+        return JsonResponse({'error': 'Credenciais de autenticação inválidas ou ausentes.'}, status=401)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if isinstance(request, ASGIRequest):
+        events = _notification_events(user.id, last_event_id)
+    elif _wsgi_streams.acquire():
+        # Um iterador assíncrono seria consumido inteiro pelo handler WSGI antes do envio
+        events = _WSGIStream(_notification_events_sync(user.id, last_event_id))
+    else:
+        # Sem threads livres para mais um stream: o EventSource desiste com o 503 e o cliente usa o polling
+        response = HttpResponse(f"retry: {settings.NOTIFICATION_STREAM_RETRY_MS}\n\n", status=503, content_type='text/event-stream')
+        response['Retry-After'] = int(settings.NOTIFICATION_STREAM_MAX_DURATION)
+        return response
+
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Desativa o buffer de proxies (nginx) para os eventos chegarem imediatamente
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+class _StreamSlots:
+    """
+    Conta os streams WSGI abertos no processo, limitados a NOTIFICATION_STREAM_WSGI_MAX_CONNECTIONS
+
+    O limite fica bem abaixo das threads do gunicorn para que conexões SSE
+    não deixem o restante da API sem threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+
+    def acquire(self):
+        with self._lock:
+            if self.open >= settings.NOTIFICATION_STREAM_WSGI_MAX_CONNECTIONS:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+_wsgi_streams = _StreamSlots()
+
+
+class _WSGIStream:
+    """
+    Iterador do stream WSGI que devolve a vaga ao terminar ou ao ser fechado
+
+    O servidor WSGI chama close() mesmo quando o cliente desconecta antes do
+    primeiro evento, caso em que o finally de um gerador não seria executado.
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.events)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.events.close()
+            _wsgi_streams.release()
+
+
+def _authenticate_stream(request):
+    """
+    Retorna o usuário do token JWT da requisição ou None
+    """
+    authenticator = JWTAuthentication()
+    header = authenticator.get_header(request)
+    raw_token = authenticator.get_raw_token(header) if header else request.GET.get('token')
+    if not raw_token:
+        return None
+
+    try:
+        validated_token = authenticator.get_validated_token(raw_token)
+        return authenticator.get_user(validated_token)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+def _format_event(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, cls=DjangoJSONEncoder)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class _NotificationEventSource:
+    """
+    Estado do stream de um usuário: notificações novas, contagem de não lidas e heartbeats
+
+    Não espera nem dorme; os geradores síncrono (WSGI) e assíncrono (ASGI)
+    chamam open() uma vez e poll() a cada NOTIFICATION_STREAM_POLL_INTERVAL
+    segundos até expired(), ou sem esperar enquanto há lotes pendentes
+    (pending) após um lote cheio (envio em massa, reconexão com atraso). A conexão é encerrada após
+    NOTIFICATION_STREAM_MAX_DURATION segundos; o navegador reconecta sozinho
+    enviando o Last-Event-ID.
+    """
+
+    def __init__(self, user_id, last_event_id=None):
+        self.user_id = user_id
+        self.last_event_id = last_event_id
+        self.deadline = time.monotonic() + settings.NOTIFICATION_STREAM_MAX_DURATION
+        self.pending = False
+
+    def expired(self):
+        return time.monotonic() >= self.deadline
+
+    def open(self):
+        chunks = [f"retry: {settings.NOTIFICATION_STREAM_RETRY_MS}\n\n"]
+
+        # Versão lida antes da busca: uma notificação criada entre as duas será vista no próximo ciclo
+        self.version = notification_stream.version(self.user_id)
+        self.cursor = notification_stream.parse_cursor(self.last_event_id)
+        if self.cursor is None:
+            self.cursor = notification_stream.current_cursor()
+        else:
+            chunks.extend(self._fetch())
+
+        chunks.append(self._unread_count())
+        self.last_sent = time.monotonic()
+        return chunks
+
+    def poll(self):
+        current_version = notification_stream.version(self.user_id)
+        if current_version != self.version or self.pending:
+            self.version = current_version
+            chunks = self._fetch()
+            if chunks:
+                chunks.append(self._unread_count())
+                self.last_sent = time.monotonic()
+                return chunks
+
+        if time.monotonic() - self.last_sent >= settings.NOTIFICATION_STREAM_HEARTBEAT:
+            self.last_sent = time.monotonic()
+            # Comentário SSE: mantém a conexão aberta em proxies e balanceadores
+            return [": ping\n\n"]
+        return []
+
+    def _fetch(self):
+        events, self.cursor, self.pending = notification_stream.fetch(self.user_id, self.cursor)
+        return [
+            _format_event(event, data, notification_stream.format_cursor(event_cursor))
+            for event, data, event_cursor in events
+        ]
+
+    def _unread_count(self):
+        return _format_event('unread_count', {'unread_count': unread_counter.get(self.user_id)})
+
+
+def _notification_events_sync(user_id, last_event_id=None):
+    """
+    Gera os eventos SSE na thread da requisição (WSGI)
+    """
+    source = _NotificationEventSource(user_id, last_event_id)
+    yield from source.open()
+    while not source.expired():
+        if not source.pending:
+            time.sleep(settings.NOTIFICATION_STREAM_POLL_INTERVAL)
+        yield from source.poll()
+
+
+async def _notification_events(user_id, last_event_id=None):
+    """
+    Gera os eventos SSE no event loop (ASGI); o acesso ao banco e ao cache roda em threads
+    """
+    source = _NotificationEventSource(user_id, last_event_id)
+    for chunk in await sync_to_async(source.open)():
+        yield chunk
+    while not source.expired():
+        if not source.pending:
+            await asyncio.sleep(settings.NOTIFICATION_STREAM_POLL_INTERVAL)
+        for chunk in await sync_to_async(source.poll)():
+            yield chunk
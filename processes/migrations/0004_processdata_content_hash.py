@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processes', '0003_alter_processsearch_process_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processdata',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='Hash do Conteúdo'),
+        ),
+    ]
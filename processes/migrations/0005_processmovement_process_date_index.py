@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processes', '0004_processdata_content_hash'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='processmovement',
+            options={'ordering': ['-date', '-id'], 'verbose_name': 'Movimentação do Processo', 'verbose_name_plural': 'Movimentações do Processo'},
+        ),
+        migrations.AddIndex(
+            model_name='processmovement',
+            index=models.Index(fields=['process', '-date', '-id'], name='movement_process_date_idx'),
+        ),
+    ]
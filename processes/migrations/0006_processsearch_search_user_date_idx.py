@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processes', '0005_processmovement_process_date_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='processsearch',
+            index=models.Index(fields=['user', '-search_date'], name='search_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processes', '0006_processsearch_search_user_date_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='processmovement',
+            name='process',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='processes.processdata'),
+        ),
+    ]
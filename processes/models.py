@@ -24,6 +24,10 @@ class ProcessSearch(models.Model):
     
     class Meta:
         ordering = ['-search_date']
+        # Histórico de buscas do usuário (get_user_searches)
+        indexes = [
+            models.Index(fields=['user', '-search_date'], name='search_user_date_idx'),
+        ]
         verbose_name = 'Busca de Processo'
         verbose_name_plural = 'Buscas de Processos'
     
@@ -52,6 +56,7 @@ class ProcessData(models.Model):
     
     # Dados brutos da API
     raw_data = models.JSONField(default=dict, verbose_name='Dados Brutos')
+    content_hash = models.CharField(max_length=64, blank=True, default='', verbose_name='Hash do Conteúdo')
     
     # Metadados
     created_at = models.DateTimeField(auto_now_add=True)
@@ -96,13 +101,18 @@ class ProcessMovement(models.Model):
     """
     Modelo para armazenar movimentações dos processos
     """
-    process = models.ForeignKey(ProcessData, on_delete=models.CASCADE, related_name='movements')
+    # Sem índice próprio: o índice (process, -date, -id) já atende as buscas por processo
+    process = models.ForeignKey(ProcessData, on_delete=models.CASCADE, related_name='movements', db_index=False)
     date = models.DateTimeField(verbose_name='Data')
     description = models.TextField(verbose_name='Descrição')
     movement_type = models.CharField(max_length=100, blank=True, null=True, verbose_name='Tipo de Movimentação')
     
     class Meta:
-        ordering = ['-date']
+        ordering = ['-date', '-id']
+        # Leitura das movimentações de um processo por faixa do índice, já na ordem da listagem
+        indexes = [
+            models.Index(fields=['process', '-date', '-id'], name='movement_process_date_idx'),
+        ]
         verbose_name = 'Movimentação do Processo'
         verbose_name_plural = 'Movimentações do Processo'
     
@@ -0,0 +1,108 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models.fields.tuple_lookups import Tuple, TupleLessThan
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class StandardCursorPagination(CursorPagination):
+    """
+    Paginação por cursor com a resposta no formato padrão da API ({'success', 'data', ...})
+
+    O cursor mantém a posição mesmo com inserções entre páginas e cada página
+    é lida com um filtro pela chave de ordenação, sem OFFSET.
+    """
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    ordering = '-created_at'
+
+    def get_paginated_response(self, data):
+        return Response({
+            'success': True,
+            'data': data,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link()
+        })
+
+
+class SearchCursorPagination(StandardCursorPagination):
+    ordering = '-search_date'
+
+
+class MovementKeysetPagination:
+    """
+    Paginação por chave (date, id) das movimentações de um processo, da mais recente para a mais antiga
+
+    O cursor guarda a última (date, id) da página; a próxima é lida com
+    WHERE (date, id) < cursor ORDER BY date DESC, id DESC LIMIT n, uma faixa
+    do índice (process, -date, -id) independente do tamanho do histórico.
+    A comparação é feita por linha (row value) no PostgreSQL; em bancos sem
+    suporte o Django a expande em date < d OR (date = d AND id < i).
+    """
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            date, pk = cursor
+            queryset = queryset.filter(TupleLessThan(Tuple('date', 'id'), (date, pk)))
+
+        # Um item a mais indica se existe próxima página
+        page = list(queryset.order_by('-date', '-id')[:page_size + 1])
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            date, pk = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            date = parse_datetime(date)
+            if date is None:
+                raise ValueError
+            return date, int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, movement):
+        data = json.dumps([movement.date.isoformat(), movement.id])
+        return base64.urlsafe_b64encode(data.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'success': True,
+            'data': data,
+            'next': self.get_next_link()
+        })
+
+
+class PartyCursorPagination(StandardCursorPagination):
+    ordering = 'id'
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import (
     ProcessSearch, ProcessData, ProcessParty, 
@@ -32,6 +33,11 @@ class ProcessDataSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def get_is_favorite(self, obj):
+        # Listas informam os favoritos do usuário no contexto, evitando uma query por processo
+        favorite_ids = self.context.get('favorite_ids')
+        if favorite_ids is not None:
+            return obj.id in favorite_ids
+        
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return UserProcessFavorite.objects.filter(
@@ -41,6 +47,30 @@ class ProcessDataSerializer(serializers.ModelSerializer):
         return False
 
 
+class ProcessSummarySerializer(ProcessDataSerializer):
+    """
+    Representação compacta de um processo: apenas as últimas movimentações e o total
+    
+    As listas completas são servidas pelos endpoints paginados de movimentações e partes.
+    """
+    movements = serializers.SerializerMethodField()
+    movement_count = serializers.SerializerMethodField()
+    
+    class Meta(ProcessDataSerializer.Meta):
+        fields = ProcessDataSerializer.Meta.fields + ['movement_count']
+    
+    def get_movements(self, obj):
+        # latest_movements é pré-carregado pelas listagens (Prefetch com slice)
+        latest = getattr(obj, 'latest_movements', None)
+        if latest is None:
+            latest = obj.movements.all()[:settings.PROCESS_SUMMARY_MOVEMENTS]
+        return ProcessMovementSerializer(latest, many=True).data
+    
+    def get_movement_count(self, obj):
+        count = getattr(obj, 'movement_count', None)
+        return obj.movements.count() if count is None else count
+
+
 class ProcessSearchSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProcessSearch
@@ -64,6 +94,29 @@ class ProcessSearchRequestSerializer(serializers.Serializer):
         return value
 
 
+class ProcessBatchSearchRequestSerializer(serializers.Serializer):
+    process_numbers = serializers.ListField(
+        child=serializers.CharField(max_length=25),
+        allow_empty=False,
+        help_text="Lista de números de processos no formato: NNNNNNN-DD.AAAA.J.TR.OOOO ou apenas 20 dígitos"
+    )
+    
+    def validate_process_numbers(self, value):
+        import re
+        max_numbers = settings.PROCESS_BATCH_MAX_NUMBERS
+        # Números repetidos são consultados uma única vez
+        value = list(dict.fromkeys(number.strip() for number in value))
+        if len(value) > max_numbers:
+            raise serializers.ValidationError(f"Informe no máximo {max_numbers} números por busca")
+        
+        invalid = [n for n in value if not re.match(r'^(\d{7}-\d{2}\.\d{4}\.\d{1}\.\d{2}\.\d{4}|\d{20})$', n)]
+        if invalid:
+            raise serializers.ValidationError(
+                f"Números inválidos: {', '.join(invalid)}. Use o formato NNNNNNN-DD.AAAA.J.TR.OOOO ou apenas 20 dígitos"
+            )
+        return value
+
+
 class ProcessSearchByPartySerializer(serializers.Serializer):
     party_name = serializers.CharField(max_length=500)
     party_type = serializers.ChoiceField(
@@ -79,12 +132,17 @@ class ProcessSearchByCourtSerializer(serializers.Serializer):
 
 
 class UserProcessFavoriteSerializer(serializers.ModelSerializer):
-    process = ProcessDataSerializer(read_only=True)
+    process = serializers.SerializerMethodField()
     
     class Meta:
         model = UserProcessFavorite
         fields = ['id', 'process', 'created_at']
         read_only_fields = ['id', 'created_at']
+    
+    def get_process(self, obj):
+        # Representação compacta, a menos que a view peça a completa (?expand=movements)
+        serializer_class = self.context.get('process_serializer_class', ProcessSummarySerializer)
+        return serializer_class(obj.process, context=self.context).data
 
 
 class ProcessNotificationSerializer(serializers.ModelSerializer):
@@ -1,13 +1,18 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
-from rest_framework.test import APITestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 import json
+from datetime import timedelta
 
 from .models import ProcessData, ProcessParty, ProcessMovement, ProcessSearch, UserProcessFavorite
-from .services.datajud import DataJudService
+from .views import _process_api_result, _serialize_processes
 
 User = get_user_model()
 
@@ -69,7 +74,6 @@ class ProcessModelTests(TestCase):
         search = ProcessSearch.objects.create(
             user=self.user,
             process_number='12345678901234567890',
-            search_type='number',
             success=True
         )
         
@@ -104,23 +108,19 @@ class ProcessAPITests(APITestCase):
         self.access_token = str(refresh.access_token)
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
     
-    @patch('processes.services.datajud.DataJudService')
+    @patch('processes.views.datajud_service')
     def test_search_process_by_number(self, mock_datajud_service):
         """Testa busca de processo por número"""
         # Configurar mock do DataJud
-        mock_service = MagicMock()
-        mock_service.search_process_by_number.return_value = {
-            'success': True,
-            'data': [{
-                'process_number': '12345678901234567890',
-                'court_name': 'Tribunal de Teste',
-                'case_class': 'Ação de Cobrança',
-                'subject': 'Teste de assunto',
-                'status': 'Ativo',
-                'value': 1000.00
-            }]
+        mock_datajud_service.search_process_by_number.return_value = {
+            'id': 'TJSP_12345678901234567890',
+            'tribunal': 'TJSP',
+            'orgaoJulgador': {'nome': 'Tribunal de Teste'},
+            'classe': {'nome': 'Ação de Cobrança'},
+            'assuntos': [{'nome': 'Teste de assunto'}],
+            'status': 'Ativo',
+            'valor_causa': 1000.00
         }
-        mock_datajud_service.return_value = mock_service
         
         data = {
             'process_number': '12345678901234567890'
@@ -130,8 +130,10 @@ class ProcessAPITests(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue(response.data['success'])
-        self.assertEqual(len(response.data['data']), 1)
-        self.assertEqual(response.data['data'][0]['process_number'], '12345678901234567890')
+        self.assertEqual(response.data['data']['process_number'], '12345678901234567890')
+        self.assertEqual(response.data['data']['case_class'], 'Ação de Cobrança')
+        mock_datajud_service.search_process_by_number.assert_called_once_with('12345678901234567890')
+        self.assertTrue(ProcessSearch.objects.get(user=self.user).success)
     
     def test_search_process_invalid_number(self):
         """Testa busca com número de processo inválido"""
@@ -142,48 +144,47 @@ class ProcessAPITests(APITestCase):
         response = self.client.post('/processes/search/', data)
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertFalse(response.data['success'])
+        self.assertIn('process_number', response.data)
+        self.assertFalse(ProcessSearch.objects.exists())
     
-    @patch('processes.services.datajud.DataJudService')
+    @patch('processes.views.datajud_service')
     def test_search_by_party(self, mock_datajud_service):
         """Testa busca por parte"""
         # Configurar mock do DataJud
-        mock_service = MagicMock()
-        mock_service.search_by_party.return_value = {
-            'success': True,
-            'data': [{
-                'process_number': '12345678901234567890',
-                'court_name': 'Tribunal de Teste',
-                'case_class': 'Ação de Cobrança'
+        mock_datajud_service.search_by_party.return_value = {
+            'processos': [{
+                'numeroProcesso': '12345678901234567890',
+                'tribunal': 'TJSP',
+                'orgaoJulgador': {'nome': 'Tribunal de Teste'},
+                'classe': {'nome': 'Ação de Cobrança'}
             }]
         }
-        mock_datajud_service.return_value = mock_service
         
         data = {
             'party_name': 'João Silva',
-            'limit': 10
+            'party_type': 'autor'
         }
         
         response = self.client.post('/processes/search/by-party/', data)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue(response.data['success'])
-        self.assertEqual(len(response.data['data']), 1)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['data'][0]['process_number'], '12345678901234567890')
+        mock_datajud_service.search_by_party.assert_called_once_with('João Silva', 'autor')
     
-    @patch('processes.services.datajud.DataJudService')
+    @patch('processes.views.datajud_service')
     def test_search_by_court(self, mock_datajud_service):
         """Testa busca por tribunal"""
         # Configurar mock do DataJud
-        mock_service = MagicMock()
-        mock_service.search_processes_by_court.return_value = {
-            'success': True,
-            'data': [{
-                'process_number': '12345678901234567890',
-                'court_name': 'Tribunal de Teste',
-                'case_class': 'Ação de Cobrança'
+        mock_datajud_service.search_processes_by_court.return_value = {
+            'processos': [{
+                'numeroProcesso': '12345678901234567890',
+                'tribunal': 'TJSP',
+                'orgaoJulgador': {'nome': 'Tribunal de Teste'},
+                'classe': {'nome': 'Ação de Cobrança'}
             }]
         }
-        mock_datajud_service.return_value = mock_service
         
         data = {
             'court_code': 'tjsp',
@@ -194,7 +195,9 @@ class ProcessAPITests(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue(response.data['success'])
-        self.assertEqual(len(response.data['data']), 1)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['data'][0]['process_number'], '12345678901234567890')
+        mock_datajud_service.search_processes_by_court.assert_called_once_with('tjsp', 10)
     
     def test_get_courts_list(self):
         """Testa obtenção da lista de tribunais"""
@@ -211,13 +214,11 @@ class ProcessAPITests(APITestCase):
         ProcessSearch.objects.create(
             user=self.user,
             process_number='12345678901234567890',
-            search_type='number',
             success=True
         )
         ProcessSearch.objects.create(
             user=self.user,
             process_number='98765432109876543210',
-            search_type='party',
             success=False,
             error_message='Processo não encontrado'
         )
@@ -338,3 +339,459 @@ class ProcessAPITests(APITestCase):
         
         response = self.client.get('/processes/favorites/')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(
+    BACKGROUND_TASKS_SYNC=True,
+    PROCESS_REFRESH_INTERVAL=3600,
+    PROCESS_REFRESH_INTERVALS={'tjsp': 60}
+)
+class ProcessRefreshTests(APITestCase):
+    """Testes para a atualização em segundo plano dos detalhes de processos"""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User'
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+        
+        self.process = ProcessData.objects.create(
+            process_number='12345678901234567890',
+            process_id='TJRJ_12345678901234567890',
+            court_code='TJRJ',
+            court_name='Tribunal de Teste',
+            status='Ativo',
+            last_update=timezone.now() - timedelta(hours=2)
+        )
+    
+    def _get_details(self):
+        return self.client.get(f'/processes/details/{self.process.id}/')
+    
+    @patch('processes.views.datajud_service')
+    def test_stale_process_served_before_refresh(self, mock_datajud_service):
+        """Testa que o processo desatualizado é servido do banco e atualizado depois da resposta"""
+        mock_datajud_service.get_process_details.return_value = {'status': 'Arquivado'}
+        
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self._get_details()
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['refreshing'])
+        self.assertEqual(response.data['data']['status'], 'Ativo')
+        mock_datajud_service.get_process_details.assert_not_called()
+        
+        for callback in callbacks:
+            callback()
+        
+        mock_datajud_service.get_process_details.assert_called_once_with('TJRJ_12345678901234567890', refresh=True)
+        self.process.refresh_from_db()
+        self.assertEqual(self.process.status, 'Arquivado')
+        self.assertFalse(self._get_details().data['refreshing'])
+    
+    @patch('processes.views.datajud_service')
+    def test_refresh_syncs_parties_and_movements(self, mock_datajud_service):
+        """Testa que a atualização em segundo plano sincroniza partes e movimentações com o novo hash"""
+        api_result = {
+            'status': 'Arquivado',
+            'partes': [{'nome': 'João Silva', 'tipo': 'autor', 'documento': '12345678901', 'advogado': ''}],
+            'movimentacoes': [{'data': '2024-02-01T09:30:00Z', 'descricao': 'Arquivamento', 'tipo': 'Arquivamento'}]
+        }
+        mock_datajud_service.get_process_details.return_value = api_result
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self._get_details()
+        
+        self.assertEqual(list(self.process.movements.values_list('description', flat=True)), ['Arquivamento'])
+        self.assertEqual(list(self.process.parties.values_list('name', flat=True)), ['João Silva'])
+        
+        # Uma busca posterior com o mesmo documento encontra o hash igual e mantém as linhas
+        process = _process_api_result(api_result, self.process.process_number)
+        self.assertEqual(process.movements.count(), 1)
+        self.assertEqual(process.parties.count(), 1)
+    
+    @patch('accounts.services.datajud.DataJudService._make_request')
+    def test_refresh_bypasses_details_cache(self, mock_make_request):
+        """Testa que a atualização consulta o DataJud mesmo com detalhes antigos em cache"""
+        cache.set('datajud_details_TJRJ_12345678901234567890', {'status': 'Ativo'})
+        mock_make_request.return_value = {'status': 'Arquivado'}
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self._get_details()
+        
+        mock_make_request.assert_called_once_with('/processos/TJRJ_12345678901234567890')
+        self.process.refresh_from_db()
+        self.assertEqual(self.process.status, 'Arquivado')
+        self.assertEqual(cache.get('datajud_details_TJRJ_12345678901234567890'), {'status': 'Arquivado'})
+    
+    @patch('processes.views.datajud_service')
+    def test_duplicate_refreshes_coalesced(self, mock_datajud_service):
+        """Testa que requisições simultâneas agendam uma única atualização"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            first = self._get_details()
+            second = self._get_details()
+        
+        self.assertTrue(first.data['refreshing'])
+        self.assertTrue(second.data['refreshing'])
+        self.assertEqual(len(callbacks), 1)
+    
+    @patch('processes.views.datajud_service')
+    def test_refresh_failure_releases_lock(self, mock_datajud_service):
+        """Testa que uma falha na atualização não bloqueia as próximas"""
+        mock_datajud_service.get_process_details.side_effect = Exception('DataJud indisponível')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self._get_details()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self._get_details()
+        
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(mock_datajud_service.get_process_details.call_count, 2)
+    
+    @patch('processes.views.datajud_service')
+    def test_refresh_interval_per_court(self, mock_datajud_service):
+        """Testa o intervalo de atualização configurado por tribunal"""
+        ProcessData.objects.filter(id=self.process.id).update(
+            last_update=timezone.now() - timedelta(minutes=5)
+        )
+        
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self._get_details()
+        self.assertFalse(response.data['refreshing'])
+        self.assertEqual(len(callbacks), 0)
+        
+        ProcessData.objects.filter(id=self.process.id).update(court_code='TJSP')
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self._get_details()
+        self.assertTrue(response.data['refreshing'])
+        self.assertEqual(len(callbacks), 1)
+
+
+class ProcessSyncTests(TestCase):
+    """Testes para a sincronização em lote de partes e movimentações"""
+    
+    def _api_result(self, movements, parties=None):
+        return {
+            'id': 'TJRJ_12345678901234567890',
+            'tribunal': 'TJRJ',
+            'partes': parties if parties is not None else [
+                {'nome': 'João Silva', 'tipo': 'autor', 'documento': '12345678901', 'advogado': 'Dr. A'},
+                {'nome': 'Empresa X', 'tipo': 'reu', 'documento': '', 'advogado': ''},
+            ],
+            'movimentacoes': movements
+        }
+    
+    def _movements(self, count):
+        return [
+            {'data': f'2024-01-{(i % 28) + 1:02d}T10:00:00Z', 'descricao': f'Movimento {i}', 'tipo': 'Despacho'}
+            for i in range(count)
+        ]
+    
+    @override_settings(PROCESS_SYNC_BATCH_SIZE=100)
+    def test_bulk_insert_query_count(self):
+        """Testa que as movimentações são gravadas em lotes"""
+        # savepoint, get_or_create (4), partes (select + insert), movimentações (select + 4 lotes de insert) e release
+        with self.assertNumQueries(13):
+            process = _process_api_result(self._api_result(self._movements(400)), '12345678901234567890')
+        
+        self.assertEqual(process.movements.count(), 400)
+        self.assertEqual(process.parties.count(), 2)
+    
+    def test_resync_applies_diff(self):
+        """Testa que a nova sincronização mantém as linhas inalteradas e aplica apenas as diferenças"""
+        movements = self._movements(5)
+        process = _process_api_result(self._api_result(movements), '12345678901234567890')
+        kept_ids = set(process.movements.filter(
+            description__in=['Movimento 1', 'Movimento 2', 'Movimento 3', 'Movimento 4']
+        ).values_list('id', flat=True))
+        party_id = process.parties.get(name='João Silva').id
+        
+        new_movements = movements[1:] + [
+            {'data': '2024-02-01T09:30:00Z', 'descricao': 'Sentença', 'tipo': 'Julgamento'}
+        ]
+        parties = [{'nome': 'João Silva', 'tipo': 'autor', 'documento': '12345678901', 'advogado': 'Dr. B'}]
+        _process_api_result(self._api_result(new_movements, parties), '12345678901234567890')
+        
+        self.assertEqual(process.movements.count(), 5)
+        self.assertFalse(process.movements.filter(description='Movimento 0').exists())
+        self.assertTrue(process.movements.filter(description='Sentença').exists())
+        self.assertTrue(kept_ids.issubset(set(process.movements.values_list('id', flat=True))))
+        
+        party = process.parties.get()
+        self.assertEqual(party.id, party_id)
+        self.assertEqual(party.lawyer, 'Dr. B')
+    
+    def test_duplicate_movements_preserved(self):
+        """Testa que movimentações repetidas são mantidas na quantidade recebida"""
+        movement = {'data': '2024-01-15T10:00:00Z', 'descricao': 'Juntada', 'tipo': 'Juntada'}
+        process = _process_api_result(self._api_result([movement, movement]), '12345678901234567890')
+        self.assertEqual(process.movements.count(), 2)
+        
+        _process_api_result(self._api_result([movement]), '12345678901234567890')
+        self.assertEqual(process.movements.count(), 1)
+    
+    def test_unchanged_document_only_touches_last_update(self):
+        """Testa que um documento idêntico ao armazenado não regrava partes e movimentações"""
+        api_result = self._api_result(self._movements(10))
+        process = _process_api_result(api_result, '12345678901234567890')
+        first_update = process.last_update
+        
+        # savepoint, get_or_create (select), update de last_update e release
+        with self.assertNumQueries(4):
+            process = _process_api_result(json.loads(json.dumps(api_result)), '12345678901234567890')
+        
+        self.assertGreater(process.last_update, first_update)
+        self.assertEqual(process.movements.count(), 10)
+    
+    def test_changed_document_rewrites(self):
+        """Testa que um documento alterado atualiza o hash e as movimentações"""
+        process = _process_api_result(self._api_result(self._movements(3)), '12345678901234567890')
+        old_hash = process.content_hash
+        
+        process = _process_api_result(self._api_result(self._movements(4)), '12345678901234567890')
+        
+        self.assertNotEqual(process.content_hash, old_hash)
+        self.assertEqual(process.movements.count(), 4)
+
+
+class ProcessBatchSearchAPITests(APITestCase):
+    """Testes para a busca de processos em lote"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User'
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+    
+    @patch('processes.views.datajud_service')
+    def test_batch_search(self, mock_datajud_service):
+        """Testa a busca em lote com status por número"""
+        mock_datajud_service.search_processes_by_numbers.return_value = {
+            '0001234-56.2023.8.26.0001': {'status': 'found', 'data': {'id': 'TJSP_1', 'tribunal': 'TJSP'}},
+            '0001234-56.2023.8.26.0002': {'status': 'not_found'},
+            '0001234-56.2023.4.03.6100': {'status': 'error', 'message': 'Tribunal indisponível'},
+        }
+        
+        response = self.client.post('/processes/search/batch/', {
+            'process_numbers': [
+                '0001234-56.2023.8.26.0001',
+                '0001234-56.2023.8.26.0002',
+                '0001234-56.2023.4.03.6100',
+                '0001234-56.2023.8.26.0001',
+            ]
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual([item['status'] for item in response.data['data']], ['found', 'not_found', 'error'])
+        self.assertEqual(response.data['data'][0]['data']['court_code'], 'TJSP')
+        self.assertIsNone(response.data['data'][1]['data'])
+        self.assertEqual(response.data['data'][2]['message'], 'Tribunal indisponível')
+        mock_datajud_service.search_processes_by_numbers.assert_called_once()
+        
+        self.assertEqual(ProcessSearch.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(ProcessSearch.objects.filter(user=self.user, success=True).count(), 1)
+        self.assertTrue(ProcessData.objects.filter(process_number='0001234-56.2023.8.26.0001').exists())
+    
+    @override_settings(PROCESS_BATCH_MAX_NUMBERS=2)
+    def test_batch_search_limit(self):
+        """Testa o limite de números por busca em lote"""
+        response = self.client.post('/processes/search/batch/', {
+            'process_numbers': ['00012345620238260001', '00012345620238260002', '00012345620238260003']
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_batch_search_invalid_number(self):
+        """Testa busca em lote com número inválido"""
+        response = self.client.post('/processes/search/batch/', {
+            'process_numbers': ['00012345620238260001', '123']
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProcessQueryCountTests(APITestCase):
+    """Testes para o número de queries das listagens de processos"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User'
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+    
+    def _create_processes(self, count, start=0):
+        processes = []
+        for i in range(start, start + count):
+            process = ProcessData.objects.create(
+                process_number=f'{i:020d}',
+                court_name='Tribunal de Teste',
+                case_class='Ação de Cobrança'
+            )
+            ProcessParty.objects.create(process=process, name='João Silva', party_type='autor')
+            ProcessMovement.objects.create(process=process, date=timezone.now(), description='Distribuição')
+            processes.append(process)
+        return processes
+    
+    def _count_queries(self, fn):
+        with CaptureQueriesContext(connection) as context:
+            fn()
+        return len(context.captured_queries)
+    
+    def test_favorites_constant_queries(self):
+        """Testa que a lista de favoritos não faz queries por processo"""
+        for process in self._create_processes(2):
+            UserProcessFavorite.objects.create(user=self.user, process=process)
+        few = self._count_queries(lambda: self.client.get('/processes/favorites/'))
+        
+        for process in self._create_processes(10, start=2):
+            UserProcessFavorite.objects.create(user=self.user, process=process)
+        response = self.client.get('/processes/favorites/')
+        many = self._count_queries(lambda: self.client.get('/processes/favorites/'))
+        
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.data['data']), 12)
+        self.assertTrue(all(item['process']['is_favorite'] for item in response.data['data']))
+        self.assertEqual(len(response.data['data'][0]['process']['movements']), 1)
+    
+    def test_search_results_constant_queries(self):
+        """Testa que a serialização dos resultados de busca não faz queries por processo"""
+        request = APIRequestFactory().get('/processes/search/by-party/')
+        request.user = self.user
+        
+        few = self._create_processes(2)
+        many = self._create_processes(20, start=2)
+        UserProcessFavorite.objects.create(user=self.user, process=many[5])
+        
+        # partes, últimas movimentações, total de movimentações e favoritos
+        with self.assertNumQueries(4):
+            _serialize_processes(few, request)
+        many = list(ProcessData.objects.filter(id__in=[p.id for p in many]).order_by('id'))
+        with self.assertNumQueries(4):
+            data = _serialize_processes(many, request)
+        
+        self.assertEqual([item['is_favorite'] for item in data].count(True), 1)
+        self.assertTrue(data[5]['is_favorite'])
+        self.assertEqual(len(data[0]['parties']), 1)
+
+
+@override_settings(PROCESS_SUMMARY_MOVEMENTS=3)
+class ProcessPayloadTests(APITestCase):
+    """Testes para a representação compacta e as listas paginadas de processos"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User'
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+        
+        self.process = ProcessData.objects.create(
+            process_number='12345678901234567890',
+            court_name='Tribunal de Teste',
+            last_update=timezone.now()
+        )
+        now = timezone.now()
+        ProcessMovement.objects.bulk_create([
+            ProcessMovement(process=self.process, date=now - timedelta(days=i), description=f'Movimento {i}')
+            for i in range(10)
+        ])
+        ProcessParty.objects.bulk_create([
+            ProcessParty(process=self.process, name=f'Parte {i}', party_type='outros')
+            for i in range(5)
+        ])
+        UserProcessFavorite.objects.create(user=self.user, process=self.process)
+    
+    def test_compact_details(self):
+        """Testa que com ?compact=true os detalhes trazem apenas as últimas movimentações e o total"""
+        response = self.client.get(f'/processes/details/{self.process.id}/?compact=true')
+        
+        data = response.data['data']
+        self.assertEqual(data['movement_count'], 10)
+        self.assertEqual([m['description'] for m in data['movements']], ['Movimento 0', 'Movimento 1', 'Movimento 2'])
+    
+    def test_full_details_by_default(self):
+        """Testa que os detalhes continuam com a representação completa por padrão"""
+        response = self.client.get(f'/processes/details/{self.process.id}/')
+        
+        self.assertEqual(len(response.data['data']['movements']), 10)
+        self.assertEqual(len(response.data['data']['parties']), 5)
+    
+    def test_compact_favorites(self):
+        """Testa a representação compacta e a paginação dos favoritos"""
+        response = self.client.get('/processes/favorites/')
+        
+        self.assertTrue(response.data['success'])
+        self.assertIsNone(response.data['next'])
+        process = response.data['data'][0]['process']
+        self.assertEqual(process['movement_count'], 10)
+        self.assertEqual(len(process['movements']), 3)
+        self.assertTrue(process['is_favorite'])
+    
+    def test_movements_pagination(self):
+        """Testa a paginação por cursor das movimentações"""
+        url = f'/processes/details/{self.process.id}/movements/?page_size=4'
+        descriptions = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['data']), 4)
+            descriptions.extend(m['description'] for m in response.data['data'])
+            url = response.data['next']
+        
+        self.assertEqual(descriptions, [f'Movimento {i}' for i in range(10)])
+    
+    def test_parties_pagination(self):
+        """Testa a paginação por cursor das partes"""
+        response = self.client.get(f'/processes/details/{self.process.id}/parties/?page_size=2')
+        
+        self.assertEqual([p['name'] for p in response.data['data']], ['Parte 0', 'Parte 1'])
+        self.assertIsNotNone(response.data['next'])
+    
+    def test_movements_nonexistent_process(self):
+        """Testa movimentações de processo inexistente"""
+        response = self.client.get('/processes/details/99999/movements/')
+        
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_movements_keyset_with_same_date(self):
+        """Testa que movimentações com a mesma data não se repetem nem somem entre páginas"""
+        ProcessMovement.objects.filter(process=self.process).delete()
+        same_date = timezone.now()
+        ProcessMovement.objects.bulk_create([
+            ProcessMovement(process=self.process, date=same_date, description=f'Juntada {i}')
+            for i in range(7)
+        ])
+        
+        url = f'/processes/details/{self.process.id}/movements/?page_size=3'
+        descriptions = []
+        while url:
+            # usuário, processo e a página de movimentações, qualquer que seja a página
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            descriptions.extend(m['description'] for m in response.data['data'])
+            url = response.data['next']
+        
+        self.assertEqual(sorted(descriptions), sorted(f'Juntada {i}' for i in range(7)))
+        self.assertEqual(len(descriptions), 7)
+    
+    def test_movements_invalid_cursor(self):
+        """Testa movimentações com cursor inválido"""
+        response = self.client.get(f'/processes/details/{self.process.id}/movements/?cursor=invalido')
+        
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
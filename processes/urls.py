@@ -4,11 +4,14 @@ from . import views
 urlpatterns = [
     # Busca de processos
     path('search/', views.search_process, name='search_process'),
+    path('search/batch/', views.search_process_batch, name='search_process_batch'),
     path('search/by-party/', views.search_by_party, name='search_by_party'),
     path('search/by-court/', views.search_by_court, name='search_by_court'),
     
     # Detalhes de processos
     path('details/<int:process_id>/', views.get_process_details, name='get_process_details'),
+    path('details/<int:process_id>/movements/', views.get_process_movements, name='get_process_movements'),
+    path('details/<int:process_id>/parties/', views.get_process_parties, name='get_process_parties'),
     
     # Histórico de buscas
     path('searches/', views.get_user_searches, name='get_user_searches'),
@@ -3,17 +3,31 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Count, Prefetch, prefetch_related_objects
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from collections import defaultdict
+from datetime import datetime, time
+import hashlib
+import json
 import logging
 
 from .models import ProcessSearch, ProcessData, ProcessParty, ProcessMovement, UserProcessFavorite
+from .pagination import (
+    StandardCursorPagination, SearchCursorPagination,
+    MovementKeysetPagination, PartyCursorPagination
+)
 from .serializers import (
-    ProcessDataSerializer, ProcessSearchSerializer, ProcessSearchRequestSerializer,
+    ProcessDataSerializer, ProcessSummarySerializer, ProcessSearchSerializer, ProcessSearchRequestSerializer,
+    ProcessBatchSearchRequestSerializer, ProcessMovementSerializer, ProcessPartySerializer,
     ProcessSearchByPartySerializer, ProcessSearchByCourtSerializer,
     UserProcessFavoriteSerializer, ProcessSearchResultSerializer
 )
 from accounts.services.datajud import datajud_service
+from cloudpharma_backend import background
 
 logger = logging.getLogger(__name__)
 
@@ -77,6 +91,94 @@ def search_process(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def search_process_batch(request):
+    """
+    Busca vários processos pelo número
+    
+    Os números são agrupados por tribunal (uma consulta ao DataJud por tribunal)
+    e o resultado traz o status de cada número.
+    """
+    serializer = ProcessBatchSearchRequestSerializer(data=request.data)
+    
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    process_numbers = serializer.validated_data['process_numbers']
+    user = request.user
+    
+    try:
+        # Buscar no DataJud
+        api_results = datajud_service.search_processes_by_numbers(process_numbers)
+        
+        # Processar e salvar os dados encontrados (um savepoint por processo)
+        processes = {}
+        with transaction.atomic():
+            for process_number in process_numbers:
+                result = api_results.get(process_number, {'status': 'error'})
+                if result['status'] != 'found':
+                    continue
+                try:
+                    with transaction.atomic():
+                        processes[process_number] = _process_api_result(result['data'], process_number)
+                except Exception as e:
+                    logger.error(f"Erro ao salvar processo {process_number}: {str(e)}")
+                    api_results[process_number] = {'status': 'error', 'message': str(e)}
+        
+        # Registrar as buscas
+        ProcessSearch.objects.bulk_create([
+            ProcessSearch(
+                user=user,
+                process_number=process_number,
+                success=process_number in processes,
+                error_message=_batch_error_message(api_results.get(process_number))
+            )
+            for process_number in process_numbers
+        ])
+        
+        # Serializar resultados
+        serialized = dict(zip(processes.keys(), _serialize_processes(list(processes.values()), request)))
+        
+        data = []
+        for process_number in process_numbers:
+            result = api_results.get(process_number, {'status': 'error'})
+            item = {
+                'process_number': process_number,
+                'status': result['status'],
+                'data': serialized.get(process_number)
+            }
+            message = _batch_error_message(result)
+            if message:
+                item['message'] = message
+            data.append(item)
+        
+        return Response({
+            'success': True,
+            'data': data,
+            'count': len(processes),
+            'message': f'Encontrados {len(processes)} de {len(process_numbers)} processos'
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        logger.error(f"Erro na busca em lote de {len(process_numbers)} processos: {str(e)}")
+        return Response({
+            'success': False,
+            'message': f'Erro ao buscar processos: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _batch_error_message(result):
+    """
+    Mensagem de erro de um número na busca em lote
+    """
+    if not result or result['status'] == 'error':
+        return (result or {}).get('message') or 'Erro ao buscar processo'
+    if result['status'] == 'not_found':
+        return 'Processo não encontrado'
+    return None
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def search_by_party(request):
@@ -102,15 +204,9 @@ def search_by_party(request):
             processes.append(process)
         
         # Serializar resultados
-        result_serializer = ProcessDataSerializer(
-            processes, 
-            many=True,
-            context={'request': request}
-        )
-        
         return Response({
             'success': True,
-            'data': result_serializer.data,
+            'data': _serialize_processes(processes, request),
             'count': len(processes),
             'message': f'Encontrados {len(processes)} processos'
         }, status=status.HTTP_200_OK)
@@ -148,15 +244,9 @@ def search_by_court(request):
             processes.append(process)
         
         # Serializar resultados
-        result_serializer = ProcessDataSerializer(
-            processes, 
-            many=True,
-            context={'request': request}
-        )
-        
         return Response({
             'success': True,
-            'data': result_serializer.data,
+            'data': _serialize_processes(processes, request),
             'count': len(processes),
             'message': f'Encontrados {len(processes)} processos no tribunal {court_code}'
         }, status=status.HTTP_200_OK)
@@ -174,20 +264,26 @@ def search_by_court(request):
 def get_process_details(request, process_id):
     """
     Obtém detalhes completos de um processo
+    
+    Os dados são servidos do banco; se estiverem desatualizados, a consulta ao
+    DataJud é agendada em segundo plano e refletida nas próximas requisições.
+    Com ?compact=true retorna a representação compacta das listagens.
     """
     try:
         process = get_object_or_404(ProcessData, id=process_id)
         
-        # Atualizar dados se necessário
-        if _should_update_process(process):
-            api_result = datajud_service.get_process_details(process.process_id)
-            _update_process_data(process, api_result)
+        # Agendar atualização se necessário
+        refreshing = _should_update_process(process)
+        if refreshing:
+            _schedule_process_refresh(process)
         
-        serializer = ProcessDataSerializer(process, context={'request': request})
+        serializer_class = ProcessSummarySerializer if _wants_compact(request) else ProcessDataSerializer
+        serializer = serializer_class(process, context={'request': request})
         
         return Response({
             'success': True,
-            'data': serializer.data
+            'data': serializer.data,
+            'refreshing': refreshing
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
@@ -198,19 +294,49 @@ def get_process_details(request, process_id):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_process_movements(request, process_id):
+    """
+    Lista paginada das movimentações de um processo, da mais recente para a mais antiga
+    """
+    process = get_object_or_404(ProcessData, id=process_id)
+    
+    paginator = MovementKeysetPagination()
+    page = paginator.paginate_queryset(ProcessMovement.objects.filter(process=process), request)
+    serializer = ProcessMovementSerializer(page, many=True)
+    
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_process_parties(request, process_id):
+    """
+    Lista paginada das partes de um processo
+    """
+    process = get_object_or_404(ProcessData, id=process_id)
+    
+    paginator = PartyCursorPagination()
+    page = paginator.paginate_queryset(ProcessParty.objects.filter(process=process), request)
+    serializer = ProcessPartySerializer(page, many=True)
+    
+    return paginator.get_paginated_response(serializer.data)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_searches(request):
     """
     Obtém histórico de buscas do usuário
     """
-    searches = ProcessSearch.objects.filter(user=request.user).order_by('-search_date')[:50]
-    serializer = ProcessSearchSerializer(searches, many=True)
+    searches = ProcessSearch.objects.filter(user=request.user)
     
-    return Response({
-        'success': True,
-        'data': serializer.data
-    }, status=status.HTTP_200_OK)
+    paginator = SearchCursorPagination()
+    page = paginator.paginate_queryset(searches, request)
+    serializer = ProcessSearchSerializer(page, many=True)
+    
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['POST'])
@@ -285,13 +411,24 @@ def get_favorites(request):
     """
     Obtém processos favoritos do usuário
     """
-    favorites = UserProcessFavorite.objects.filter(user=request.user).order_by('-created_at')
-    serializer = UserProcessFavoriteSerializer(favorites, many=True)
+    favorites = UserProcessFavorite.objects.filter(user=request.user).select_related('process')
+    
+    paginator = StandardCursorPagination()
+    page = paginator.paginate_queryset(favorites, request)
     
-    return Response({
-        'success': True,
-        'data': serializer.data
-    }, status=status.HTTP_200_OK)
+    expanded = _wants_expanded(request)
+    _prefetch_process_listing([favorite.process for favorite in page], expanded)
+    serializer = UserProcessFavoriteSerializer(
+        page,
+        many=True,
+        context={
+            'request': request,
+            'favorite_ids': {favorite.process_id for favorite in page},
+            'process_serializer_class': ProcessDataSerializer if expanded else ProcessSummarySerializer
+        }
+    )
+    
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['GET'])
@@ -316,9 +453,84 @@ def get_courts_list(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _wants_expanded(request):
+    """
+    Verifica se a requisição pede a lista completa de movimentações (?expand=movements)
+    """
+    expand = request.GET.get('expand', '')
+    return 'movements' in [field.strip() for field in expand.split(',')]
+
+
+def _wants_compact(request):
+    """
+    Verifica se a requisição pede a representação compacta de um único processo (?compact=true)
+    """
+    return request.GET.get('compact', '').lower() in ('1', 'true')
+
+
+def _prefetch_process_listing(processes, expanded):
+    """
+    Carrega em lote as partes e as movimentações de uma lista de processos
+    
+    Na representação compacta são carregadas apenas as últimas movimentações
+    de cada processo (latest_movements) e o total (movement_count).
+    """
+    if not processes:
+        return
+    
+    if expanded:
+        prefetch_related_objects(processes, 'parties', 'movements')
+        return
+    
+    prefetch_related_objects(
+        processes,
+        'parties',
+        Prefetch(
+            'movements',
+            queryset=ProcessMovement.objects.order_by('-date', '-id')[:settings.PROCESS_SUMMARY_MOVEMENTS],
+            to_attr='latest_movements'
+        )
+    )
+    counts = dict(
+        ProcessMovement.objects.filter(process__in=processes)
+        .order_by()
+        .values('process')
+        .annotate(total=Count('id'))
+        .values_list('process', 'total')
+    )
+    for process in processes:
+        process.movement_count = counts.get(process.id, 0)
+
+
+def _serialize_processes(processes, request):
+    """
+    Serializa uma lista de processos com número constante de queries
+    
+    Partes e movimentações são carregadas em lote e os favoritos do usuário
+    são obtidos em uma única query.
+    """
+    expanded = _wants_expanded(request)
+    _prefetch_process_listing(processes, expanded)
+    favorite_ids = set(
+        UserProcessFavorite.objects.filter(
+            user=request.user,
+            process__in=[process.id for process in processes]
+        ).values_list('process_id', flat=True)
+    ) if processes else set()
+    
+    serializer_class = ProcessDataSerializer if expanded else ProcessSummarySerializer
+    return serializer_class(
+        processes,
+        many=True,
+        context={'request': request, 'favorite_ids': favorite_ids}
+    ).data
+
+
 def _process_api_result(api_result, process_number):
     """
     Processa resultado da API e salva no banco de dados
+    
+    Se o DataJud retornou o mesmo documento já armazenado, apenas last_update é gravado.
     """
     with transaction.atomic():
         # Criar ou atualizar ProcessData
@@ -334,13 +546,15 @@ def _process_api_result(api_result, process_number):
                 'distribution_date': _parse_date(api_result.get('dataAjuizamento')),
                 'status': api_result.get('status', ''),
                 'last_update': timezone.now(),
-                'raw_data': api_result
+                'raw_data': api_result,
+                'content_hash': _content_hash(api_result)
             }
         )
         
         if not created:
-            # Atualizar dados existentes
-            _update_process_data(process_data, api_result)
+            # Atualizar dados existentes; partes e movimentações só mudam se o documento mudou
+            if not _update_process_data(process_data, api_result):
+                return process_data
         
         # Processar partes
         _process_parties(process_data, api_result.get('partes', []))
@@ -354,7 +568,19 @@ def _process_api_result(api_result, process_number):
 def _update_process_data(process_data, api_result):
     """
     Atualiza dados de um processo existente
+    
+    Grava o novo content_hash; use apenas por _process_api_result, que
+    sincroniza partes e movimentações na mesma transação.
+    
+    Returns:
+        False se o documento é igual ao armazenado (apenas last_update é gravado)
     """
+    content_hash = _content_hash(api_result)
+    if process_data.content_hash == content_hash:
+        process_data.last_update = timezone.now()
+        process_data.save(update_fields=['last_update'])
+        return False
+    
     process_data.process_id = api_result.get('id', process_data.process_id)
     process_data.court_code = api_result.get('tribunal', process_data.court_code)
     process_data.court_name = api_result.get('nome_tribunal', process_data.court_name)
@@ -365,42 +591,104 @@ def _update_process_data(process_data, api_result):
     process_data.status = api_result.get('status', process_data.status)
     process_data.last_update = timezone.now()
     process_data.raw_data = api_result
+    process_data.content_hash = content_hash
     process_data.save()
+    return True
+
+
+def _content_hash(api_result):
+    """
+    Calcula o hash SHA-256 da forma canônica (chaves ordenadas) do documento do DataJud
+    """
+    canonical = json.dumps(api_result, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
 
 
 def _process_parties(process_data, parties_data):
     """
     Processa e salva partes do processo
     """
-    # Limpar partes existentes
-    ProcessParty.objects.filter(process=process_data).delete()
-    
-    # Criar novas partes
-    for party_data in parties_data:
-        ProcessParty.objects.create(
+    parties = [
+        ProcessParty(
             process=process_data,
             name=party_data.get('nome', ''),
             party_type=party_data.get('tipo', 'outros'),
             document=party_data.get('documento', ''),
             lawyer=party_data.get('advogado', '')
         )
+        for party_data in parties_data
+    ]
+    
+    _sync_related_rows(
+        ProcessParty, process_data, parties,
+        key_fields=('name', 'party_type', 'document'),
+        update_fields=('lawyer',)
+    )
 
 
 def _process_movements(process_data, movements_data):
     """
     Processa e salva movimentações do processo
     """
-    # Limpar movimentações existentes
-    ProcessMovement.objects.filter(process=process_data).delete()
-    
-    # Criar novas movimentações
+    movements = []
     for movement_data in movements_data:
-        ProcessMovement.objects.create(
+        movement_date = _parse_datetime(movement_data.get('data'))
+        if movement_date is None:
+            logger.warning(f"Movimentação sem data ignorada no processo {process_data.process_number}")
+            continue
+        
+        movements.append(ProcessMovement(
             process=process_data,
-            date=movement_data.get('data'),
+            date=movement_date,
             description=movement_data.get('descricao', ''),
             movement_type=movement_data.get('tipo', '')
-        )
+        ))
+    
+    _sync_related_rows(
+        ProcessMovement, process_data, movements,
+        key_fields=('date', 'description', 'movement_type')
+    )
+
+
+def _sync_related_rows(model, process_data, rows, key_fields, update_fields=()):
+    """
+    Sincroniza as linhas relacionadas a um processo com as recebidas do DataJud
+    
+    As linhas são comparadas pela chave (key_fields): as que já existem são
+    mantidas (e atualizadas em update_fields se mudaram), as novas são
+    inseridas e as que não vieram na resposta são removidas, em lotes.
+    """
+    batch_size = settings.PROCESS_SYNC_BATCH_SIZE
+    
+    def row_key(row):
+        return tuple(getattr(row, field) for field in key_fields)
+    
+    existing = defaultdict(list)
+    for row in model.objects.filter(process=process_data):
+        existing[row_key(row)].append(row)
+    
+    to_create = []
+    to_update = []
+    for row in rows:
+        matches = existing.get(row_key(row))
+        if not matches:
+            to_create.append(row)
+            continue
+        
+        current = matches.pop()
+        if any(getattr(current, field) != getattr(row, field) for field in update_fields):
+            for field in update_fields:
+                setattr(current, field, getattr(row, field))
+            to_update.append(current)
+    
+    stale_ids = [row.id for matches in existing.values() for row in matches]
+    for start in range(0, len(stale_ids), batch_size):
+        model.objects.filter(id__in=stale_ids[start:start + batch_size]).delete()
+    
+    if to_create:
+        model.objects.bulk_create(to_create, batch_size=batch_size)
+    if to_update:
+        model.objects.bulk_update(to_update, update_fields, batch_size=batch_size)
 
 
 def _should_update_process(process):
@@ -410,9 +698,48 @@ def _should_update_process(process):
     if not process.last_update:
         return True
     
-    # Atualizar se passou mais de 1 hora
+    # Atualizar se passou o intervalo configurado para o tribunal
     time_diff = timezone.now() - process.last_update
-    return time_diff.total_seconds() > 3600
+    return time_diff.total_seconds() > _get_refresh_interval(process)
+
+
+def _get_refresh_interval(process):
+    """
+    Retorna o intervalo de atualização (segundos) do tribunal do processo
+    """
+    court_code = (process.court_code or '').lower()
+    return settings.PROCESS_REFRESH_INTERVALS.get(court_code, settings.PROCESS_REFRESH_INTERVAL)
+
+
+def _schedule_process_refresh(process):
+    """
+    Agenda a atualização do processo em segundo plano
+    
+    O lock no cache compartilhado evita atualizações duplicadas do mesmo
+    processo entre requisições, workers e instâncias.
+    """
+    lock_key = f"process_refresh_{process.id}"
+    if cache.add(lock_key, True, settings.PROCESS_REFRESH_LOCK_TIMEOUT):
+        background.submit(_refresh_process, process.id, lock_key)
+
+
+def _refresh_process(process_id, lock_key):
+    """
+    Atualiza os dados de um processo a partir do DataJud
+    """
+    try:
+        process = ProcessData.objects.filter(id=process_id).first()
+        # Outra atualização pode ter terminado enquanto esta aguardava na fila
+        if process is None or not _should_update_process(process):
+            return
+        
+        # Sem o cache de detalhes: seu TTL é maior que o intervalo que tornou o processo desatualizado
+        api_result = datajud_service.get_process_details(process.process_id, refresh=True)
+        # Mesmo caminho da busca: o hash só é gravado junto com partes e movimentações
+        _process_api_result(api_result, process.process_number)
+        logger.info(f"Processo {process.process_number} atualizado em segundo plano")
+    finally:
+        cache.delete(lock_key)
 
 
 def _parse_date(date_string):
@@ -429,3 +756,25 @@ def _parse_date(date_string):
         return dt.date()
     except (ValueError, AttributeError):
         return None
+
+
+def _parse_datetime(date_string):
+    """
+    Converte string de data/hora ISO 8601 em datetime com fuso horário
+    """
+    if not date_string:
+        return None
+    
+    try:
+        dt = parse_datetime(date_string)
+        if dt is None:
+            date = parse_date(date_string)
+            if date is None:
+                return None
+            dt = datetime.combine(date, time.min)
+    except (ValueError, TypeError):
+        return None
+    
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
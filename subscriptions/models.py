@@ -42,6 +42,10 @@ class Subscription(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        # Assinatura do usuário por status (ex: a ativa)
+        indexes = [
+            models.Index(fields=['user', 'status'], name='subscription_user_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email}'s {self.plan.name} subscription ({self.status.name})"